@@ -0,0 +1,177 @@
+"""
+Local stand-in for the Messages and Message Batches APIs.
+
+Point an `AsyncAnthropic` client at it with `base_url=server.url`. Batches
+finish `processing_delay` seconds after creation, with request counts
+progressing linearly until then; `failure_rate` of the requests error out
+and successful results carry `payload_size` bytes of text.
+"""
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def _timestamp(seconds):
+    return datetime.fromtimestamp(seconds, tz=timezone.utc).isoformat().replace('+00:00', 'Z')
+
+
+class MockBatchServer:
+    """Threaded HTTP server simulating the Anthropic batch endpoints."""
+
+    def __init__(self, processing_delay=0.5, failure_rate=0.0, payload_size=1024, seed=0, host='127.0.0.1', port=0):
+        self.processing_delay = processing_delay
+        self.failure_rate = failure_rate
+        self.payload_size = payload_size
+        self.random = random.Random(seed)
+        self.batches = {}
+        self.stats = {'create': 0, 'retrieve': 0, 'results': 0, 'messages': 0}
+        self.lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer((host, port), self._handler())
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _count(self, endpoint):
+        with self.lock:
+            self.stats[endpoint] += 1
+
+    def _message(self, text):
+        return {
+            'id': f"msg_{uuid.uuid4().hex}",
+            'type': 'message',
+            'role': 'assistant',
+            'model': 'mock-model',
+            'content': [{'type': 'text', 'text': text}],
+            'stop_reason': 'end_turn',
+            'stop_sequence': None,
+            'usage': {'input_tokens': 100, 'output_tokens': max(1, self.payload_size // 4)},
+        }
+
+    def create_batch(self, requests):
+        batch_id = f"msgbatch_{uuid.uuid4().hex}"
+        with self.lock:
+            failed = {request['custom_id'] for request in requests if self.random.random() < self.failure_rate}
+            self.batches[batch_id] = {'created': time.time(), 'requests': requests, 'failed': failed}
+        return self.batch_json(batch_id)
+
+    def batch_json(self, batch_id):
+        batch = self.batches[batch_id]
+        total = len(batch['requests'])
+        elapsed = time.time() - batch['created']
+        ended = elapsed >= self.processing_delay
+        progress = 1.0 if ended else elapsed / self.processing_delay
+        done = total if ended else int(total * progress)
+        errored = len(batch['failed']) * done // total if total else 0
+        return {
+            'id': batch_id,
+            'type': 'message_batch',
+            'processing_status': 'ended' if ended else 'in_progress',
+            'request_counts': {
+                'processing': total - done,
+                'succeeded': done - errored,
+                'errored': errored,
+                'canceled': 0,
+                'expired': 0,
+            },
+            'created_at': _timestamp(batch['created']),
+            'expires_at': _timestamp(batch['created'] + 86400),
+            'ended_at': _timestamp(batch['created'] + self.processing_delay) if ended else None,
+            'cancel_initiated_at': None,
+            'archived_at': None,
+            'results_url': f"{self.url}/v1/messages/batches/{batch_id}/results" if ended else None,
+        }
+
+    def iter_results(self, batch_id):
+        batch = self.batches[batch_id]
+        text = 'x' * self.payload_size
+        for request in batch['requests']:
+            custom_id = request['custom_id']
+            if custom_id in batch['failed']:
+                result = {
+                    'type': 'errored',
+                    'error': {'type': 'error', 'error': {'type': 'api_error', 'message': 'Simulated failure'}},
+                }
+            else:
+                result = {'type': 'succeeded', 'message': self._message(f"# results/{custom_id}.py\n{text}")}
+            yield json.dumps({'custom_id': custom_id, 'result': result}).encode('utf-8') + b'\n'
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def _send_json(self, payload, status=200):
+                body = json.dumps(payload).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _read_json(self):
+                length = int(self.headers.get('Content-Length', 0))
+                return json.loads(self.rfile.read(length) or b'{}')
+
+            def do_POST(self):
+                path = self.path.split('?')[0]
+                if path == '/v1/messages/batches':
+                    server._count('create')
+                    self._send_json(server.create_batch(self._read_json()['requests']))
+                elif path == '/v1/messages':
+                    server._count('messages')
+                    self._read_json()
+                    if server.random.random() < server.failure_rate:
+                        self._send_json({'type': 'error', 'error': {'type': 'overloaded_error', 'message': 'Simulated'}}, 529)
+                    else:
+                        self._send_json(server._message('x' * server.payload_size))
+                else:
+                    self._send_json({'type': 'error', 'error': {'type': 'not_found_error', 'message': path}}, 404)
+
+            def do_GET(self):
+                path = self.path.split('?')[0]
+                match = re.fullmatch(r'/v1/messages/batches/([^/]+)(/results)?', path)
+                if not match or match.group(1) not in server.batches:
+                    self._send_json({'type': 'error', 'error': {'type': 'not_found_error', 'message': path}}, 404)
+                    return
+                batch_id = match.group(1)
+                if not match.group(2):
+                    server._count('retrieve')
+                    self._send_json(server.batch_json(batch_id))
+                    return
+
+                server._count('results')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/binary')
+                self.send_header('Transfer-Encoding', 'chunked')
+                self.end_headers()
+                for line in server.iter_results(batch_id):
+                    self.wfile.write(f"{len(line):x}\r\n".encode('ascii') + line + b'\r\n')
+                self.wfile.write(b'0\r\n\r\n')
+
+        Handler.protocol_version = 'HTTP/1.1'
+        return Handler
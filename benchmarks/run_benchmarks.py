@@ -0,0 +1,201 @@
+"""
+End-to-end benchmarks for the plan -> execute -> update pipeline against a
+local mock of the Message Batches API.
+
+    python -m benchmarks.run_benchmarks --requests 2000 --output bench.json
+
+Results are written as JSON so runs can be compared for regressions.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+from benchmarks.mock_batch_server import MockBatchServer
+from src import config
+from src.apply import apply_changes, group_by_target, scan_results, scan_store
+from src.batching import shard_requests, stream_results_to_disk
+from src.commands.execute import execute_command
+from src.commands.plan import plan_command
+from src.commands.update import update_command
+from src.file_utils import write_batch_results
+from src.llm_providers import AnthropicProvider
+from src.planning import parse_tasks_from_planning_md
+from src.result_store import ResultStore
+
+
+def create_parser():
+    parser = argparse.ArgumentParser(description="Benchmark the plan/execute/update pipeline.")
+    parser.add_argument("--tasks", type=int, default=50000, help="Number of tasks in the synthetic PLANNING.md.")
+    parser.add_argument("--requests", type=int, default=1000, help="Number of batch requests to submit.")
+    parser.add_argument("--batch-size", type=int, default=250, help="Maximum requests per batch.")
+    parser.add_argument("--processing-delay", type=float, default=1.0, help="Simulated batch processing time (s).")
+    parser.add_argument("--failure-rate", type=float, default=0.05, help="Fraction of requests that error.")
+    parser.add_argument("--payload-size", type=int, default=4096, help="Bytes of text per successful result.")
+    parser.add_argument("--poll-initial-delay", type=float, default=0.1, help="Overrides config.POLL_INITIAL_DELAY.")
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout.")
+    return parser
+
+
+@contextmanager
+def timer(report, name, items):
+    """Times the block and appends a benchmark entry to the report."""
+    entry = {'name': name, 'items': items}
+    start = time.perf_counter()
+    yield entry
+    entry['seconds'] = time.perf_counter() - start
+    entry['items_per_second'] = items / entry['seconds'] if entry['seconds'] else None
+    report.append(entry)
+
+
+def planning_content(tasks):
+    lines = ["# Planning", "", "### 📋 Remaining Tasks", ""]
+    lines += [f"- Implement feature number {i} with tests and documentation" for i in range(tasks)]
+    return "\n".join(lines) + "\n\n## Notes\n"
+
+
+def make_requests(count):
+    return [
+        {
+            'custom_id': f"bench_{i}",
+            'params': {
+                'model': config.MODEL_NAME,
+                'max_tokens': config.MAX_TOKENS,
+                'messages': [{'role': 'user', 'content': f"Benchmark prompt {i}"}],
+            },
+        }
+        for i in range(count)
+    ]
+
+
+def bench_parse(report, args):
+    content = planning_content(args.tasks)
+    with timer(report, 'parse_tasks_from_planning_md', args.tasks) as entry:
+        tasks = parse_tasks_from_planning_md(content)
+    entry['bytes'] = len(content.encode('utf-8'))
+    assert len(tasks) == args.tasks
+
+
+async def bench_batches(report, args, server, workdir):
+    provider = AnthropicProvider(base_url=server.url)
+    shards = shard_requests(make_requests(args.requests), max_requests=args.batch_size)
+
+    with timer(report, 'batch_submission', args.requests) as entry:
+        batches = await asyncio.gather(*(provider.create_batch(requests=shard) for shard in shards))
+    entry['batches'] = len(batches)
+    submitted = time.perf_counter()
+
+    retrieves_before = server.stats['retrieve']
+    with timer(report, 'batch_polling', len(batches)) as entry:
+        completed = await asyncio.gather(*(provider.poll_batch(batch.id) for batch in batches))
+    entry['retrieve_calls'] = server.stats['retrieve'] - retrieves_before
+    entry['detection_latency_seconds'] = time.perf_counter() - submitted - args.processing_delay
+
+    output_dir = os.path.join(workdir, 'streamed')
+    with timer(report, 'result_streaming', args.requests) as entry:
+        summaries = await asyncio.gather(
+            *(stream_results_to_disk(provider.iter_batch_results(batch.id), output_dir) for batch in completed)
+        )
+    entry['succeeded'] = sum(summary['succeeded'] for summary in summaries)
+    entry['failed'] = sum(summary['failed'] for summary in summaries)
+    entry['bytes'] = entry['succeeded'] * args.payload_size
+
+
+def bench_file_io(report, args, workdir):
+    text = 'x' * args.payload_size
+    results = {
+        'succeeded': [
+            {'custom_id': f"bench_{i}", 'content': f"# generated/bench_{i}.py\n{text}"} for i in range(args.requests)
+        ],
+        'failed': [],
+    }
+    results_dir = os.path.join(workdir, 'written')
+    with timer(report, 'write_batch_results', args.requests) as entry:
+        write_batch_results(results, results_dir)
+    entry['bytes'] = args.requests * args.payload_size
+
+    store_dir = os.path.join(workdir, 'store')
+    with timer(report, 'write_result_store', args.requests) as entry:
+        with ResultStore(store_dir) as store:
+            for result in results['succeeded']:
+                store.write({**result, 'status': 'succeeded'})
+    entry['bytes'] = args.requests * args.payload_size
+
+    with timer(report, 'scan_results_files', args.requests):
+        scan_results(os.path.join(results_dir, 'succeeded'))
+    with timer(report, 'scan_result_store', args.requests):
+        scan_store(ResultStore(store_dir))
+
+    project_dir = os.path.join(workdir, 'project')
+    with timer(report, 'update_apply', args.requests):
+        changes, _ = group_by_target(scan_results(os.path.join(results_dir, 'succeeded')))
+        apply_changes(changes, project_dir)
+
+
+async def bench_pipeline(report, args, server, workdir):
+    planning_file = os.path.join(workdir, 'PLANNING.md')
+    with open(planning_file, 'w', encoding='utf-8') as f:
+        f.write(planning_content(args.requests))
+    results_dir = os.path.join(workdir, 'pipeline_results')
+    os.environ['ANTHROPIC_BASE_URL'] = server.url
+
+    with timer(report, 'pipeline_plan', args.requests):
+        plan_command(argparse.Namespace(planning_file=planning_file, output_file=None))
+    with timer(report, 'pipeline_execute', args.requests):
+        await execute_command(argparse.Namespace(
+            planning_file=planning_file,
+            output_dir=results_dir,
+            batch_size=args.batch_size,
+            max_in_flight=None,
+            resume=False,
+            mode='batch',
+            no_cache=True,
+            refresh=False,
+            max_retries=0,
+        ))
+    with timer(report, 'pipeline_update', args.requests):
+        update_command(argparse.Namespace(project_dir=os.path.join(workdir, 'pipeline_project'), results_dir=results_dir))
+
+
+async def run(args):
+    os.environ.setdefault('ANTHROPIC_API_KEY', 'benchmark-key')
+    config.POLL_INITIAL_DELAY = args.poll_initial_delay
+    config.POLL_MIN_DELAY = min(config.POLL_MIN_DELAY, args.poll_initial_delay)
+
+    report = []
+    bench_parse(report, args)
+    with tempfile.TemporaryDirectory() as workdir, MockBatchServer(
+        processing_delay=args.processing_delay, failure_rate=args.failure_rate, payload_size=args.payload_size
+    ) as server:
+        await bench_batches(report, args, server, workdir)
+        bench_file_io(report, args, workdir)
+        await bench_pipeline(report, args, server, workdir)
+        server_stats = dict(server.stats)
+
+    return {
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'parameters': vars(args),
+        'server': server_stats,
+        'benchmarks': report,
+    }
+
+
+def main():
+    args = create_parser().parse_args()
+    report = asyncio.run(run(args))
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,290 @@
+import hashlib
+import io
+import json
+import logging
+import os
+import shutil
+import tempfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from src import config
+from src.file_utils import read_file
+from src.metrics import metrics
+from src.response_parser import parse_response
+
+# Read once at import: os.umask can only be read by setting it, which would
+# briefly change it for every thread writing files.
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+
+class ApplyError(Exception):
+    """Raised when a set of changes could not be applied and was rolled back."""
+
+
+class PatchError(Exception):
+    """Raised when a diff does not apply to the current file."""
+
+
+def parse_result(filename, content):
+    """
+    Parses an in-memory result and returns its first change, or None if the
+    result has no usable target path. See `parse_response` for the formats.
+    """
+    return next(parse_response(filename, io.StringIO(content or '')), None)
+
+
+def scan_results(succeeded_dir, max_workers=None):
+    """Streams and parses every .txt result in the directory using a thread pool."""
+    filenames = sorted(name for name in os.listdir(succeeded_dir) if name.endswith(".txt"))
+
+    def scan(filename):
+        with open(os.path.join(succeeded_dir, filename), 'r', encoding='utf-8') as f:
+            return list(parse_response(filename, f))
+
+    with ThreadPoolExecutor(max_workers=max_workers or config.APPLY_MAX_WORKERS) as executor:
+        return [change for changes in executor.map(scan, filenames) for change in changes]
+
+
+def parse_records(records):
+    """Parses result records (dicts with custom_id and content) into changes."""
+    return [
+        change
+        for record in records
+        for change in parse_response(record['custom_id'], io.StringIO(record.get('content') or ''))
+    ]
+
+
+def change_digest(change):
+    """Returns a hash of a change's content or patch, or its recorded 'digest'."""
+    if 'digest' in change:
+        return change['digest']
+    body = change['content'] if 'content' in change else json.dumps([change['hunks'], change['new_file']])
+    return hashlib.sha256(body.encode('utf-8')).hexdigest()
+
+
+def scan_store(store):
+    """
+    Streams the succeeded results out of a ResultStore and parses them into
+    light changes holding only the source, target and `change_digest`, so
+    memory does not grow with the size of the results. `load_changes` reads
+    the content of the ones that are applied.
+    """
+    return [
+        {'source': change['source'], 'target': change['target'], 'digest': change_digest(change)}
+        for record in store.iter_results('succeeded')
+        for change in parse_response(record['custom_id'], io.StringIO(record.get('content') or ''))
+    ]
+
+
+def load_changes(store, changes):
+    """Yields the full change behind each light change from `scan_store`, one result at a time."""
+    by_source = {}
+    for change in changes:
+        by_source.setdefault(change['source'], {})[(change['target'], change['digest'])] = change
+    for source, wanted in by_source.items():
+        record = store.get(source) or {}
+        for change in parse_response(source, io.StringIO(record.get('content') or '')):
+            if wanted.pop((change['target'], change_digest(change)), None):
+                yield change
+        for target, _ in wanted:
+            logging.error(f"The result {source} no longer holds the change to {target}; skipping it.")
+
+
+def group_by_target(changes):
+    """
+    Groups changes by normalized target path. Returns the changes to apply
+    (one per target) and a dict of conflicting target -> sources for targets
+    that more than one result writes with different content or patches.
+    """
+    grouped = {}
+    for change in changes:
+        grouped.setdefault(os.path.normpath(change['target']), []).append(change)
+
+    to_apply = []
+    conflicts = {}
+    for target, target_changes in grouped.items():
+        if len({change_digest(change) for change in target_changes}) > 1:
+            conflicts[target] = [change['source'] for change in target_changes]
+        else:
+            to_apply.append(target_changes[0])
+    return to_apply, conflicts
+
+
+def _find_hunk(lines, old, expected, lowest):
+    """
+    Returns where a run of hunk lines occurs in `lines`, searching outwards
+    from the expected position but never before `lowest`, or None.
+    """
+    if not old:
+        return max(min(expected, len(lines)), lowest)
+    for distance in range(len(lines) + 1):
+        for start in (expected - distance, expected + distance):
+            if lowest <= start <= len(lines) - len(old) and lines[start:start + len(old)] == list(old):
+                return start
+        if expected - distance < lowest and expected + distance > len(lines) - len(old):
+            break
+    return None
+
+
+def apply_patch(original, hunks):
+    """
+    Applies unified diff hunks to the original text and returns the new text.
+    Hunks may have drifted by a few lines, and hunks that are already applied
+    are left alone; a hunk whose context cannot be found raises PatchError.
+    """
+    lines = original.splitlines(keepends=True)
+    result = []
+    position = 0
+    offset = 0
+    for old_start, old, new in hunks:
+        # Hunks that only add lines are anchored after line `old_start`.
+        anchor = old_start - 1 if old else old_start
+        expected = anchor + offset
+        start = _find_hunk(lines, old, expected, position)
+        # The hunk is already applied if its new lines are closer than its old
+        # ones. When both match at the same distance, one is a prefix of the
+        # other (lines added or removed at the end of the file), and the
+        # longer match is the one the file really holds.
+        applied_at = _find_hunk(lines, new, expected, position) if new else None
+        if applied_at is not None and (
+            start is None
+            or abs(applied_at - expected) < abs(start - expected)
+            or (abs(applied_at - expected) == abs(start - expected) and len(new) > len(old))
+        ):
+            start, old = applied_at, new
+        elif start is None:
+            raise PatchError(f"hunk at line {old_start} does not match")
+        result.extend(lines[position:start])
+        result.extend(new)
+        position = start + len(old)
+        offset = start - anchor
+    result.extend(lines[position:])
+    return ''.join(result)
+
+
+def iter_resolved(changes, project_dir, rejected):
+    """
+    Yields each change, one at a time, with diffs turned into full-file
+    changes by patching the current project files. The sources of patches
+    that do not apply are logged, skipped and appended to `rejected`.
+    """
+    for change in changes:
+        if 'hunks' not in change:
+            yield change
+            continue
+        path = os.path.join(project_dir, change['target'])
+        try:
+            if change.get('new_file') and os.path.exists(path):
+                raise PatchError("the diff creates a file that already exists")
+            if not change.get('new_file') and not os.path.exists(path):
+                raise PatchError("the file does not exist")
+            content = apply_patch(read_file(path), change['hunks'])
+        except PatchError as e:
+            logging.error(f"Could not patch {change['target']} from {change['source']}: {e}")
+            rejected.append(change['source'])
+            continue
+        yield {'source': change['source'], 'target': change['target'], 'content': content}
+
+
+def resolve_patches(changes, project_dir):
+    """
+    Resolves every change with `iter_resolved`. Returns the resolved changes
+    and the sources of the patches that did not apply.
+    """
+    rejected = []
+    return list(iter_resolved(changes, project_dir, rejected)), rejected
+
+
+def apply_results(records, project_dir, max_workers=None):
+    """
+    Parses result records and applies them to the project: conflicting
+    targets and patches that do not apply are logged and skipped, the rest
+    is written atomically by `apply_changes`. Returns the applied paths.
+    """
+    changes, conflicts = group_by_target(parse_records(records))
+    for target, sources in conflicts.items():
+        logging.error(f"Conflicting changes to {target} from {', '.join(sources)}; skipping it.")
+    return apply_changes(iter_resolved(changes, project_dir, []), project_dir, max_workers)
+
+
+def _stage(full_path):
+    """Backs up an existing target and returns the backup path (None for a new file)."""
+    os.makedirs(os.path.dirname(full_path) or '.', exist_ok=True)
+    if not os.path.exists(full_path):
+        return None
+    fd, backup_path = tempfile.mkstemp(dir=os.path.dirname(full_path) or '.', suffix='.bak')
+    os.close(fd)
+    shutil.copy2(full_path, backup_path)
+    return backup_path
+
+
+def _write_temp(full_path, content, mode):
+    """
+    Writes content to a temp file next to the target, with the target's
+    permissions (or `mode` for a new file), and returns its path.
+    """
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(full_path) or '.', suffix='.tmp')
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        f.write(content)
+    if os.path.exists(full_path):
+        shutil.copymode(full_path, temp_path)
+    else:
+        os.chmod(temp_path, mode)
+    return temp_path
+
+
+def _remove(path):
+    if path and os.path.exists(path):
+        os.remove(path)
+
+
+def apply_changes(changes, project_dir, max_workers=None):
+    """
+    Writes every change through a temp file and `os.replace`. Changes may be
+    any iterable: temp files and backups are prepared in parallel as they
+    arrive, and only their paths are kept, so content is never all held in
+    memory. Targets are replaced once every change is prepared; if any step
+    fails, every target already replaced is restored from its backup (or
+    removed if it was new) and ApplyError is raised.
+    """
+    max_workers = max_workers or config.APPLY_MAX_WORKERS
+    new_file_mode = 0o666 & ~_UMASK
+    entries = []
+
+    def prepare(entry, content):
+        entry['backup'] = _stage(entry['path'])
+        entry['temp'] = _write_temp(entry['path'], content, new_file_mode)
+        metrics.incr('bytes_written_total', os.path.getsize(entry['temp']), stage='update')
+
+    applied = []
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            in_flight = deque()
+            for change in changes:
+                entry = {'path': os.path.join(project_dir, change['target'])}
+                entries.append(entry)
+                in_flight.append(executor.submit(prepare, entry, change['content']))
+                if len(in_flight) >= 2 * max_workers:
+                    in_flight.popleft().result()
+            for future in in_flight:
+                future.result()
+        for entry in entries:
+            logging.info(f"Applying changes to: {entry['path']}")
+            os.replace(entry['temp'], entry['path'])
+            applied.append(entry)
+    except Exception as e:
+        logging.error(f"Failed to apply changes, rolling back {len(applied)} file(s): {e}")
+        for entry in reversed(applied):
+            if entry.get('backup'):
+                os.replace(entry['backup'], entry['path'])
+            else:
+                _remove(entry['path'])
+        for entry in entries:
+            _remove(entry.get('temp'))
+            _remove(entry.get('backup'))
+        raise ApplyError(str(e)) from e
+
+    for entry in entries:
+        _remove(entry['backup'])
+    return [entry['path'] for entry in entries]
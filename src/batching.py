@@ -0,0 +1,280 @@
+import asyncio
+import json
+import logging
+import time
+from src import config
+from src.metrics import metrics
+from src.poller import PollAbandoned
+from src.result_store import result_sink
+
+
+def request_size(request):
+    """Returns the serialized size of a batch request in bytes."""
+    return len(json.dumps(request).encode('utf-8'))
+
+
+def shard_requests(requests, max_requests=None, max_bytes=None):
+    """
+    Splits batch requests into shards bounded by request count and
+    serialized byte size.
+    """
+    max_requests = max_requests or config.BATCH_MAX_REQUESTS
+    max_bytes = max_bytes or config.BATCH_MAX_BYTES
+
+    shards = []
+    current = []
+    current_bytes = 0
+    for request in requests:
+        size = request_size(request)
+        if size > max_bytes:
+            raise ValueError(f"Request {request.get('custom_id')} is {size} bytes, larger than the {max_bytes} byte batch limit.")
+        if current and (len(current) >= max_requests or current_bytes + size > max_bytes):
+            shards.append(current)
+            current = []
+            current_bytes = 0
+        current.append(request)
+        current_bytes += size
+    if current:
+        shards.append(current)
+    return shards
+
+
+def new_summary():
+    """Returns an empty results summary."""
+    return {
+        'succeeded': 0,
+        'failed': 0,
+        'failures': [],
+        'usage': {
+            'input_tokens': 0,
+            'output_tokens': 0,
+            'cache_creation_input_tokens': 0,
+            'cache_read_input_tokens': 0,
+        },
+    }
+
+
+def record_result(summary, result):
+    """Adds one result to the summary counts, usage totals and failures."""
+    if result['status'] == 'succeeded':
+        summary['succeeded'] += 1
+        usage = result.get('usage')
+        for key in summary['usage']:
+            value = getattr(usage, key, None)
+            if isinstance(value, int):
+                summary['usage'][key] += value
+    else:
+        summary['failed'] += 1
+        failure = {'custom_id': result['custom_id'], 'error': result.get('error')}
+        if result.get('error_type'):
+            failure['error_type'] = result['error_type']
+        summary['failures'].append(failure)
+    return summary
+
+
+def merge_summary(target, summary):
+    """Merges one shard's summary into the combined summary."""
+    target['succeeded'] += summary['succeeded']
+    target['failed'] += summary['failed']
+    target['failures'].extend(summary['failures'])
+    for key, value in summary['usage'].items():
+        target['usage'][key] += value
+    return target
+
+
+async def stream_results_to_disk(results, output, queue_size=None, on_written=None, summary=None):
+    """
+    Consumes an async iterator of results and writes each one to `output` (a
+    result sink or an output directory) as soon as it arrives. A bounded queue between the reader and the writer keeps
+    memory flat regardless of batch size. `on_written` is called with each
+    result once it is on disk. Results are recorded in `summary` (a new one
+    by default), which stays up to date even if the iterator raises.
+    """
+    sink = result_sink(output)
+    queue = asyncio.Queue(maxsize=queue_size or config.RESULT_QUEUE_SIZE)
+    summary = new_summary() if summary is None else summary
+
+    async def reader():
+        try:
+            async for result in results:
+                await queue.put(result)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # Let the writer drain what was already read before the error surfaces.
+            await queue.put(None)
+            raise
+        await queue.put(None)
+
+    async def writer():
+        while True:
+            result = await queue.get()
+            if result is None:
+                return
+            await asyncio.to_thread(sink.write, result)
+            record_result(summary, result)
+            if on_written:
+                on_written(result)
+
+    reader_task = asyncio.ensure_future(reader())
+    try:
+        await writer()
+    except BaseException:
+        reader_task.cancel()
+        raise
+    await reader_task
+    return summary
+
+
+async def skip_fetched(results, fetched):
+    """Filters out results whose custom_id has already been fetched."""
+    async for result in results:
+        if result['custom_id'] not in fetched:
+            yield result
+
+
+def write_failed_shard(custom_ids, error, output, journal=None, batch_id=None, error_type=None):
+    """Writes a failure for every custom_id in the shard and returns its summary."""
+    sink = result_sink(output)
+    summary = new_summary()
+    for custom_id in custom_ids:
+        result = {'status': 'failed', 'custom_id': custom_id, 'error': error}
+        if error_type:
+            result['error_type'] = error_type
+        sink.write(result)
+        record_result(summary, result)
+        if journal and batch_id:
+            journal.record_result(batch_id, result)
+    if journal and batch_id:
+        journal.record_finished(batch_id)
+    return summary
+
+
+async def collect_batch(provider, batch_id, label, custom_ids, output, journal=None, fetched=None, on_result=None):
+    """
+    Waits for a submitted batch to finish and streams its unfetched results to
+    disk, recording each one in the journal and passing it to `on_result`.
+    """
+    fetched = fetched or set()
+    try:
+        with metrics.timer('batch_latency_seconds', phase='processing'):
+            completed_batch = await provider.poll_batch(batch_id)
+    except PollAbandoned as e:
+        # The batch may still finish and is billed either way: fail its items
+        # without resubmitting them and leave it unfinished in the journal, so
+        # `--resume` reattaches to it later.
+        logging.error(f"Lost track of batch {batch_id} ({label}); run with --resume to fetch its results: {e}")
+        pending = [custom_id for custom_id in custom_ids if custom_id not in fetched]
+        return write_failed_shard(pending, str(e), output, error_type='poll_abandoned')
+    if not completed_batch:
+        logging.error(f"Batch {batch_id} ({label}) failed or was cancelled.")
+        pending = [custom_id for custom_id in custom_ids if custom_id not in fetched]
+        return write_failed_shard(
+            pending, f"Batch {batch_id} failed or was cancelled", output, journal, batch_id, 'batch_failed'
+        )
+
+    logging.info(f"Batch {batch_id} ({label}) completed. Streaming results...")
+    summary = new_summary()
+    written = set()
+
+    def on_written(result):
+        written.add(result['custom_id'])
+        if journal:
+            journal.record_result(batch_id, result)
+        if on_result:
+            on_result(result)
+
+    try:
+        with metrics.timer('batch_latency_seconds', phase='results'):
+            await stream_results_to_disk(
+                skip_fetched(provider.iter_batch_results(completed_batch.id), fetched),
+                output,
+                on_written=on_written,
+                summary=summary,
+            )
+    except Exception as e:
+        # Keep what was streamed and fail only the results that never arrived.
+        pending = [custom_id for custom_id in custom_ids if custom_id not in fetched and custom_id not in written]
+        logging.error(f"Reading results for batch {batch_id} ({label}) failed with {len(pending)} missing: {e}")
+        error = f"Results for batch {batch_id} incomplete: {e}"
+        return merge_summary(
+            summary, write_failed_shard(pending, error, output, journal, batch_id, 'results_incomplete')
+        )
+    if journal:
+        journal.record_finished(batch_id)
+    return summary
+
+
+async def run_shard(provider, shard, index, semaphore, output, journal=None, on_result=None):
+    """Submits one shard, waits for it to finish and streams its results to disk."""
+    queued = time.perf_counter()
+    async with semaphore:
+        metrics.observe('batch_latency_seconds', time.perf_counter() - queued, phase='queue')
+        logging.info(f"Submitting shard {index} with {len(shard)} requests...")
+        with metrics.timer('batch_latency_seconds', phase='submit'):
+            batch = await provider.create_batch(requests=shard)
+        logging.info(f"Shard {index} submitted. Batch ID: {batch.id}")
+        custom_ids = [request['custom_id'] for request in shard]
+        if journal:
+            journal.record_submitted(batch.id, custom_ids)
+
+        return await collect_batch(
+            provider, batch.id, f"shard {index}", custom_ids, output, journal, on_result=on_result
+        )
+
+
+async def resume_batch(provider, batch_id, state, semaphore, output, journal, on_result=None):
+    """Reattaches to a batch recorded in the journal and fetches its missing results."""
+    async with semaphore:
+        batch = await provider.retrieve_batch(batch_id)
+        logging.info(
+            f"Resuming batch {batch_id} ({batch.processing_status}): "
+            f"{len(state['fetched'])}/{len(state['custom_ids'])} results already fetched."
+        )
+        return await collect_batch(
+            provider, batch_id, "resumed", state['custom_ids'], output, journal, state['fetched'], on_result
+        )
+
+
+async def run_batches(provider, requests, output, max_in_flight=None, max_requests=None, max_bytes=None,
+                      journal=None, resume=False, on_result=None):
+    """
+    Shards the requests, runs the shards concurrently with at most
+    `max_in_flight` batches in flight, streams every result to `output` (a
+    result sink or an output directory) and returns the combined summary.
+    With `resume`, batches recorded in the journal are reattached instead of
+    resubmitted. `on_result` is called with every result once it is written.
+    """
+    output = result_sink(output)
+    max_in_flight = max_in_flight or config.MAX_IN_FLIGHT_BATCHES
+    semaphore = asyncio.Semaphore(max_in_flight)
+
+    journaled = journal.load() if journal and resume else {}
+    pending_batches = {batch_id: state for batch_id, state in journaled.items() if not state['finished']}
+    submitted_ids = {custom_id for state in journaled.values() for custom_id in state['custom_ids']}
+    if journaled:
+        logging.info(
+            f"Journal has {len(journaled)} batch(es); reattaching to {len(pending_batches)} unfinished batch(es)."
+        )
+    requests = [request for request in requests if request['custom_id'] not in submitted_ids]
+
+    shards = shard_requests(requests, max_requests=max_requests, max_bytes=max_bytes)
+    logging.info(f"Split {len(requests)} requests into {len(shards)} batch(es).")
+
+    jobs = [
+        (state['custom_ids'], resume_batch(provider, batch_id, state, semaphore, output, journal, on_result))
+        for batch_id, state in pending_batches.items()
+    ]
+    jobs += [
+        ([request['custom_id'] for request in shard], run_shard(provider, shard, i, semaphore, output, journal, on_result))
+        for i, shard in enumerate(shards)
+    ]
+    shard_summaries = await asyncio.gather(*(job for _, job in jobs), return_exceptions=True)
+
+    summary = new_summary()
+    for (custom_ids, _), shard_summary in zip(jobs, shard_summaries):
+        if isinstance(shard_summary, Exception):
+            logging.error(f"Shard with {len(custom_ids)} requests raised an error: {shard_summary}")
+            shard_summary = write_failed_shard(custom_ids, str(shard_summary), output)
+        merge_summary(summary, shard_summary)
+    return summary
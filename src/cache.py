@@ -0,0 +1,123 @@
+import hashlib
+import json
+import logging
+import os
+import time
+from src import config
+from src.result_store import usage_dict
+
+
+def request_key(body):
+    """
+    Returns a content hash of a request body, stable across key order.
+    `max_tokens` is left out, since it is sized per run from usage history
+    and does not change what is asked.
+    """
+    body = {key: value for key, value in body.items() if key != 'max_tokens'}
+    return hashlib.sha256(json.dumps(body, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    """
+    On-disk response cache keyed by a hash of the request body, with
+    age- and size-based eviction.
+    """
+
+    def __init__(self, cache_dir=None, max_bytes=None, max_age=None):
+        self.cache_dir = cache_dir or config.CACHE_DIR
+        self.max_bytes = max_bytes or config.CACHE_MAX_BYTES
+        self.max_age = max_age or config.CACHE_MAX_AGE
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def get(self, key):
+        """Returns the cached response for a key, or None on a miss or expired entry."""
+        path = self._path(key)
+        try:
+            if time.time() - os.path.getmtime(path) > self.max_age:
+                self.misses += 1
+                return None
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry
+
+    def put(self, key, content, usage=None, stop_reason=None):
+        """
+        Stores a response's content, token usage and stop reason for a key.
+        Responses cut off at max_tokens are not cached, so they are fetched
+        again (with a larger max_tokens) on the next run.
+        """
+        if stop_reason == 'max_tokens':
+            return
+        entry = {'content': content}
+        if usage is not None:
+            entry['usage'] = usage_dict(usage)
+        if stop_reason is not None:
+            entry['stop_reason'] = stop_reason
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = self._path(key) + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, self._path(key))
+
+    def partition(self, requests, refresh=False):
+        """
+        Splits requests into cache hits and misses. Returns a list of
+        succeeded results for the hits (with the usage and stop reason of
+        the original response, when cached), the requests that missed and a
+        dict of custom_id -> cache key for the misses. With `refresh`, every
+        request is treated as a miss so its response is fetched and re-cached.
+        """
+        hits, misses, keys = [], [], {}
+        for request in requests:
+            key = request_key(request['params'])
+            entry = None if refresh else self.get(key)
+            if entry is None:
+                misses.append(request)
+                keys[request['custom_id']] = key
+            else:
+                hit = {'status': 'succeeded', 'custom_id': request['custom_id'], 'content': entry['content']}
+                hit.update((field, entry[field]) for field in ('usage', 'stop_reason') if field in entry)
+                hits.append(hit)
+        return hits, misses, keys
+
+    def evict(self):
+        """Removes expired entries, then the oldest entries until the cache fits in `max_bytes`."""
+        try:
+            names = [name for name in os.listdir(self.cache_dir) if name.endswith('.json')]
+        except FileNotFoundError:
+            return 0
+
+        now = time.time()
+        entries = []
+        removed = 0
+        for name in names:
+            path = os.path.join(self.cache_dir, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            if now - stat.st_mtime > self.max_age:
+                os.remove(path)
+                removed += 1
+            else:
+                entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            os.remove(path)
+            total -= size
+            removed += 1
+
+        if removed:
+            logging.info(f"Evicted {removed} entries from the response cache.")
+        return removed
@@ -1,7 +1,56 @@
-from src.llm_providers import AnthropicProvider
+import importlib
+from src import config
 
-def get_llm_provider(provider_name='anthropic'):
-    if provider_name == 'anthropic':
-        return AnthropicProvider()
-    # Add other providers here
-    raise ValueError(f"Unknown LLM provider: {provider_name}")
\ No newline at end of file
+# Provider classes are imported on first use so unused SDKs are never loaded.
+PROVIDERS = {
+    'anthropic': 'src.llm_providers:AnthropicProvider',
+    'anthropic-direct': 'src.llm_providers:AnthropicDirectProvider',
+    'mock': 'src.mock_provider:MockProvider',
+}
+
+
+def register_provider(name, target):
+    """Registers a provider class, or a lazy 'module:Class' reference to one, under a name."""
+    PROVIDERS[name] = target
+
+
+def load_provider_class(name):
+    """Resolves a registered provider name to its class, importing its module if needed."""
+    try:
+        target = PROVIDERS[name]
+    except KeyError:
+        raise ValueError(f"Unknown LLM provider: {name}") from None
+    if isinstance(target, str):
+        module_name, _, class_name = target.partition(':')
+        target = getattr(importlib.import_module(module_name), class_name)
+        PROVIDERS[name] = target
+    return target
+
+
+def get_llm_provider(provider_name='anthropic', mode='batch', **options):
+    if mode == 'direct' and f"{provider_name}-direct" in PROVIDERS:
+        provider_name = f"{provider_name}-direct"
+    return load_provider_class(provider_name)(**options)
+
+
+def build_router(specs, mode='batch'):
+    """
+    Builds a ProviderRouter from 'provider[:model]' specs, taking each
+    route's concurrency, costs and provider options from
+    config.PROVIDER_SETTINGS.
+    """
+    from src.router import ProviderRouter, Route
+
+    routes = []
+    for spec in specs:
+        provider_name, _, model = spec.partition(':')
+        settings = config.PROVIDER_SETTINGS.get(provider_name, {})
+        routes.append(Route(
+            spec,
+            get_llm_provider(provider_name, mode=mode, **settings.get('options', {})),
+            concurrency=settings.get('concurrency'),
+            input_cost=settings.get('input_cost', 0.0),
+            output_cost=settings.get('output_cost', 0.0),
+            model=model or None,
+        ))
+    return ProviderRouter(routes)
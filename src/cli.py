@@ -1,9 +1,15 @@
 import argparse
-import asyncio
 
 def create_parser():
     """Creates and configures the argument parser for the application."""
     parser = argparse.ArgumentParser(description="Claude Code Automated Development Tool")
+    parser.add_argument("--metrics-file", help="Write run metrics (timings, token usage, polls, bytes written) to this file.")
+    parser.add_argument(
+        "--metrics-format",
+        choices=["json", "prometheus"],
+        help="Format of --metrics-file (defaults to prometheus for .prom files and JSON otherwise).",
+    )
+    parser.add_argument("--profile", help="Record a cProfile profile of the run to this file (view with pstats or snakeviz).")
     subparsers = parser.add_subparsers(dest="command", required=True)
 
     # Plan command
@@ -12,15 +18,93 @@ def create_parser():
     plan_parser.add_argument(
         "--output-file", help="Path to save the updated planning file (defaults to overwriting the input file)."
     )
+    plan_parser.add_argument(
+        "--prompt-store", help="Path to the prompt store (defaults to prompts.jsonl next to the output planning file)."
+    )
+    plan_parser.add_argument("--project-dir", default=".", help="Project tree to pack relevant source files from.")
+    plan_parser.add_argument(
+        "--context-budget",
+        type=int,
+        help="Token budget for packed source per prompt (defaults to config.CONTEXT_TOKEN_BUDGET; 0 disables packing).",
+    )
 
     # Execute command
     exec_parser = subparsers.add_parser("execute", help="Execute prompts using the Claude Batch API")
     exec_parser.add_argument("--planning-file", default="PLANNING.md", help="Path to the planning file with prompts.")
     exec_parser.add_argument("--output-dir", default="results", help="Directory to save batch results.")
+    exec_parser.add_argument(
+        "--prompt-store", help="Path to the prompt store (defaults to prompts.jsonl next to the planning file)."
+    )
+    exec_parser.add_argument(
+        "--project-dir",
+        default=".",
+        help="Project tree that prerequisite tasks' results are applied to before their dependents run.",
+    )
+    exec_parser.add_argument(
+        "--batch-size", type=int, help="Maximum number of requests per batch (defaults to config.BATCH_MAX_REQUESTS)."
+    )
+    exec_parser.add_argument(
+        "--max-in-flight", type=int, help="Maximum number of batches in flight at once (defaults to config.MAX_IN_FLIGHT_BATCHES)."
+    )
+    exec_parser.add_argument(
+        "--max-retries",
+        type=int,
+        help="Follow-up batches for retryable failures such as rate limits and overloads (defaults to config.RETRY_MAX_ATTEMPTS; 0 disables).",
+    )
+    exec_parser.add_argument(
+        "--resume", action="store_true", help="Reattach to batches recorded in the output directory's journal instead of resubmitting."
+    )
+    exec_parser.add_argument(
+        "--mode",
+        choices=["batch", "direct", "auto"],
+        default="batch",
+        help="Use the Batch API, direct Messages API calls, or pick by prompt count (config.DIRECT_MODE_MAX_PROMPTS).",
+    )
+    exec_parser.add_argument(
+        "--provider",
+        help="Provider name, or a comma-separated list of provider[:model] routes to spread prompts across "
+        "(defaults to config.DEFAULT_PROVIDER; see config.PROVIDER_SETTINGS).",
+    )
+    exec_parser.add_argument(
+        "--no-prompt-cache", action="store_true", help="Send the shared system prompt and context without cache_control."
+    )
+    exec_parser.add_argument("--repo-digest", help="Path to a repository digest to include in the cached prompt prefix.")
+    exec_parser.add_argument(
+        "--result-format",
+        choices=["store", "files"],
+        help="Write results to a JSONL result store or one file per item (defaults to config.RESULT_FORMAT). "
+        "Files keep no token usage, so max_tokens is not sized from earlier results.",
+    )
+    exec_parser.add_argument(
+        "--result-compression", choices=["gzip", "zstd"], help="Compress result store records (zstd needs 'zstandard')."
+    )
+    exec_parser.add_argument(
+        "--max-cost", type=float, help="Dollar budget for the run's estimated cost (defaults to config.RUN_MAX_COST)."
+    )
+    exec_parser.add_argument(
+        "--max-run-tokens",
+        type=int,
+        help="Budget for the run's estimated input plus output tokens (defaults to config.RUN_MAX_TOKENS).",
+    )
+    exec_parser.add_argument(
+        "--over-budget",
+        choices=["reject", "split"],
+        help="Submit nothing, or only the prompts that fit, when a run exceeds its budget (defaults to config.OVER_BUDGET).",
+    )
+    exec_parser.add_argument(
+        "--estimate-only", action="store_true", help="Print the run's token and cost estimate without submitting anything."
+    )
+    exec_parser.add_argument("--no-cache", action="store_true", help="Neither read from nor write to the response cache.")
+    exec_parser.add_argument(
+        "--refresh", action="store_true", help="Ignore cached responses but store the fresh ones in the cache."
+    )
 
     # Update command
     update_parser = subparsers.add_parser("update", help="Apply code changes from results")
     update_parser.add_argument("--project-dir", default=".", help="The root directory of the project to update.")
     update_parser.add_argument("--results-dir", default="results", help="Directory where results are stored.")
+    update_parser.add_argument(
+        "--export-dir", help="Export the result store to one file per item in this directory instead of applying it."
+    )
 
     return parser
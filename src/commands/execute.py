@@ -1,62 +1,270 @@
 import asyncio
 import logging
-from src.claude_api import get_llm_provider
+import os
+from src.apply import apply_results
+from src.batching import merge_summary, new_summary, record_result, run_batches
+from src.cache import ResponseCache
+from src.claude_api import build_router, get_llm_provider
+from src.context import ContextIndex
+from src.estimator import UsageHistory, estimate_requests, fit_budget, token_prices, total
 from src.file_utils import read_file
-from src.planning import parse_prompts_from_planning_md
-from src.file_utils import write_batch_results
+from src.journal import BatchJournal
+from src.metrics import metrics
+from src.planning import PlanningIndex, task_waves
+from src.prompt_store import PromptStore, default_store_path
+from src.request_builder import RequestBuilder
+from src.result_store import ResultDirectory, ResultStore
+from src.retry import retry_failures
+from src.scheduler import dependents, prerequisites, run_dependency_waves
 from src import config
 
 async def execute_command(args):
     """
-    Executes the prompts from PLANNING.md using the Claude Batch API.
+    Executes the pending prompts from the prompt store using the Claude
+    Batch API and marks the ones that succeed as done. Prompts with
+    dependencies run once their prerequisites have succeeded and been
+    applied to the project, independent branches concurrently. Before
+    submitting, every request's tokens and cost are estimated, max_tokens
+    is sized from the usage history of earlier results, and runs over the
+    token or dollar budget are rejected or split.
     """
-    logging.info(f"Executing prompts from: {args.planning_file}")
-    content = read_file(args.planning_file)
-    if not content:
-        logging.error(f"Could not read planning file: {args.planning_file}")
+    store_path = getattr(args, 'prompt_store', None) or default_store_path(args.planning_file)
+    logging.info(f"Executing prompts from: {store_path}")
+    store = PromptStore(store_path)
+    if not len(store):
+        # Migrate prompts embedded in PLANNING.md by older versions.
+        store.sync(PlanningIndex(read_file(args.planning_file)).prompts())
+    if not len(store):
+        logging.error("No prompts found in the prompt store. Run 'plan' first.")
         return
 
-    prompts_for_api = parse_prompts_from_planning_md(content)
+    prompts_for_api = [p for p in store.iter_prompts() if p.get("status", "pending") != "done"]
     if not prompts_for_api:
-        logging.error("No prompts found in the planning file. Run 'plan' first.")
+        logging.info("All prompts are already done. Nothing to execute.")
         return
 
-    logging.info(f"Found {len(prompts_for_api)} prompts to execute.")
+    logging.info(f"Found {len(prompts_for_api)} pending prompts to execute ({len(store)} total).")
 
+    if (getattr(args, 'result_format', None) or config.RESULT_FORMAT) == 'files':
+        output = ResultDirectory(args.output_dir)
+    else:
+        compression = getattr(args, 'result_compression', None) or config.RESULT_COMPRESSION
+        output = ResultStore(args.output_dir, compression=compression)
     try:
-        provider = get_llm_provider()
-        requests = []
-        for p in prompts_for_api:
-            requests.append(
-                {
-                    "custom_id": p["custom_id"],
-                    "method": "POST",
-                    "url": "/v1/messages",
-                    "body": {
-                        "model": config.MODEL_NAME,
-                        "max_tokens": config.MAX_TOKENS,
-                        "system": "You are an expert Python developer. Implement complete, production-ready code with error handling, documentation, and tests.",
-                        "messages": [{"role": "user", "content": p["content"]}],
-                    },
-                }
-            )
+        repo_digest = read_file(args.repo_digest) if getattr(args, 'repo_digest', None) else None
+        builder = RequestBuilder(prompt_caching=not getattr(args, 'no_prompt_cache', False), repo_digest=repo_digest)
+        cache = None if getattr(args, 'no_cache', False) else ResponseCache()
+        done = {p["custom_id"] for p in store.iter_prompts() if p.get("status") == "done"}
+        needed = prerequisites(prompts_for_api)
+        completed = set()
+
+        project_dir = getattr(args, 'project_dir', None)
+        context_index = None
+        if needed and project_dir and any(p.get("context") for p in prompts_for_api):
+            context_index = ContextIndex(project_dir)
+        if needed and not project_dir:
+            logging.warning("No --project-dir given; dependent tasks will not see their prerequisites' changes.")
 
-        logging.info("Submitting batch request to Claude API...")
-        batch = await provider.create_batch(requests=requests)
-        logging.info(f"Batch request submitted. Batch ID: {batch.id}")
+        mode = getattr(args, 'mode', 'batch')
+        if mode == 'auto':
+            mode = 'direct' if len(prompts_for_api) <= config.DIRECT_MODE_MAX_PROMPTS else 'batch'
+        logging.info(f"Using {mode} execution for {len(prompts_for_api)} prompts.")
+        specs = (getattr(args, 'provider', None) or config.DEFAULT_PROVIDER).split(',')
+        routed = len(specs) > 1 or ':' in specs[0]
 
-        logging.info("Waiting for batch to complete...")
-        completed_batch = await provider.poll_batch(batch.id)
+        history = UsageHistory.from_results(args.output_dir)
+        with metrics.timer('stage_seconds', stage='execute.estimate'):
+            estimates = estimate_requests(
+                [builder.build(p) for p in prompts_for_api], history, token_prices(specs, mode)
+            )
+        totals = total(estimates)
+        metrics.incr('estimated_tokens_total', totals['input_tokens'], type='input')
+        metrics.incr('estimated_tokens_total', totals['output_tokens'], type='output')
+        logging.info(
+            f"Estimated {totals['input_tokens']} input / {totals['output_tokens']} output tokens "
+            f"(${totals['cost']:.2f}) for {len(estimates)} prompts."
+        )
+        if getattr(args, 'estimate_only', False):
+            return
+        max_run_tokens = getattr(args, 'max_run_tokens', None) or config.RUN_MAX_TOKENS
+        max_cost = getattr(args, 'max_cost', None) or config.RUN_MAX_COST
+        if max_run_tokens is not None or max_cost is not None:
+            ordered = [p for wave in task_waves(prompts_for_api, done) for p in wave]
+            selected, deferred = fit_budget(ordered, estimates, max_run_tokens, max_cost)
+            if deferred and (getattr(args, 'over_budget', None) or config.OVER_BUDGET) == 'reject':
+                logging.error(
+                    f"The run exceeds its budget ({max_run_tokens or 'no'} token / ${max_cost or 'no'} limit); "
+                    f"only {len(selected)} of {len(prompts_for_api)} prompts fit. Nothing was submitted; "
+                    "raise the budget or use --over-budget split."
+                )
+                return
+            prompts_for_api = selected
+            if not prompts_for_api:
+                logging.error("Not even the first prompt fits in the run budget. Nothing was submitted.")
+                return
 
-        if completed_batch:
-            logging.info("Batch completed. Processing results...")
-            results = await provider.process_batch_results(completed_batch.id)
-            write_batch_results(results, args.output_dir)
-            logging.info(f"Results saved to {args.output_dir}")
-            if results["failed"]:
-                logging.warning(f"{len(results['failed'])} tasks failed. Check the logs and results directory.")
+        if routed:
+            provider = build_router(specs, mode=mode)
+            logging.info(f"Routing requests across: {', '.join(specs)}")
         else:
-            logging.error("Batch processing failed or was cancelled.")
+            provider = get_llm_provider(specs[0], mode=mode)
+
+        resume = getattr(args, 'resume', False)
+        journal = None
+        # Routed and direct batches only exist in-process, so they cannot be resumed.
+        if mode == 'batch' and not routed:
+            journal = BatchJournal(os.path.join(args.output_dir, config.JOURNAL_FILE))
+            if not resume:
+                journal.reset()
+        elif resume:
+            logging.warning("--resume only applies to unrouted batch mode; ignoring it.")
+
+        def on_result(result, cache_keys):
+            if result['status'] != 'succeeded':
+                return
+            completed.add(result['custom_id'])
+            if cache and result['custom_id'] in cache_keys:
+                cache.put(
+                    cache_keys[result['custom_id']], result['content'], result.get('usage'), result.get('stop_reason')
+                )
+
+        async def run_wave(prompts):
+            if context_index and any(p.get("depends_on") and p.get("context") for p in prompts):
+                # Prerequisites were applied since `plan`, so re-pack the dependents' context.
+                await asyncio.to_thread(context_index.refresh)
+                prompts = [
+                    {**p, "context": context_index.pack(p["task"], p.get("context_budget", config.CONTEXT_TOKEN_BUDGET))}
+                    if p.get("depends_on") and p.get("context") else p
+                    for p in prompts
+                ]
+            with metrics.timer('stage_seconds', stage='execute.build'):
+                requests = [builder.build(p, estimates[p["custom_id"]]["max_tokens"]) for p in prompts]
+
+            cache_keys = {}
+            hits = []
+            if cache:
+                with metrics.timer('stage_seconds', stage='execute.cache'):
+                    hits, requests, cache_keys = cache.partition(requests, refresh=getattr(args, 'refresh', False))
+                metrics.incr('cache_lookups_total', len(hits), result='hit')
+                metrics.incr('cache_lookups_total', len(requests), result='miss')
+                logging.info(f"Response cache: {len(hits)} hits, {len(requests)} misses.")
+            summary = new_summary()
+            for hit in hits:
+                output.write(hit)
+                # Count the hit, but not the usage it was originally billed for.
+                record_result(summary, {**hit, 'usage': None})
+                on_result(hit, cache_keys)
+
+            store.set_status([request["custom_id"] for request in requests], "submitted")
+            logging.info("Submitting requests to Claude API...")
+            with metrics.timer('stage_seconds', stage='execute.batches'):
+                batch_summary = await run_batches(
+                    provider,
+                    requests,
+                    output,
+                    max_in_flight=getattr(args, 'max_in_flight', None),
+                    max_requests=getattr(args, 'batch_size', None),
+                    journal=journal,
+                    on_result=lambda result: on_result(result, cache_keys),
+                )
+            with metrics.timer('stage_seconds', stage='execute.retry'):
+                batch_summary = await retry_failures(
+                    provider,
+                    requests,
+                    batch_summary,
+                    output,
+                    max_attempts=getattr(args, 'max_retries', None),
+                    on_result=lambda result: on_result(result, cache_keys),
+                    max_in_flight=getattr(args, 'max_in_flight', None),
+                    max_requests=getattr(args, 'batch_size', None),
+                )
+            merge_summary(summary, batch_summary)
+            store.set_status([p["custom_id"] for p in prompts if p["custom_id"] in completed], "done")
+            return summary
+
+        def apply_prerequisites(custom_ids):
+            # Read back from the sink: results recovered by --resume were written by an earlier run.
+            records = []
+            for custom_id in custom_ids:
+                record = output.get(custom_id)
+                if record and record['status'] == 'succeeded':
+                    records.append(record)
+                else:
+                    logging.warning(f"No stored result for prerequisite {custom_id}; its dependents may see stale code.")
+            with metrics.timer('stage_seconds', stage='execute.apply'):
+                applied = apply_results(records, project_dir)
+            logging.info(f"Applied {len(applied)} file(s) from {len(custom_ids)} prerequisite task(s).")
+
+        summaries = []
+        if resume and journal:
+            # Reattach to journaled batches once, before any wave is submitted.
+            with metrics.timer('stage_seconds', stage='execute.resume'):
+                recovered = await run_batches(
+                    provider,
+                    [],
+                    output,
+                    max_in_flight=getattr(args, 'max_in_flight', None),
+                    journal=journal,
+                    resume=True,
+                    on_result=lambda result: on_result(result, {}),
+                )
+            # Results fetched before the interruption never reach on_result.
+            completed.update(journal.succeeded())
+            recovered_ids = {p["custom_id"] for p in prompts_for_api if p["custom_id"] in completed}
+            store.set_status(recovered_ids, "done")
+            if project_dir and recovered_ids & needed:
+                apply_prerequisites(sorted(recovered_ids & needed))
+            # Batches still unfinished were lost track of again and may yet
+            # finish; resubmitting their items would bill them twice, so they
+            # and their dependents wait for the next --resume.
+            unresolved = {
+                custom_id
+                for state in journal.load().values() if not state['finished']
+                for custom_id in state['custom_ids'] if custom_id not in state['fetched']
+            }
+            held = unresolved | dependents(prompts_for_api, unresolved)
+            if held:
+                logging.warning(
+                    f"{len(unresolved)} task(s) are still in unfinished batches; holding them and "
+                    f"{len(held - unresolved)} dependent(s) back. Run with --resume again later."
+                )
+            # Other failed items are still pending and are resubmitted with their wave.
+            recovered['failures'] = [f for f in recovered['failures'] if f['custom_id'] in unresolved]
+            recovered['failed'] = len(recovered['failures'])
+            summaries.append(recovered)
+            done |= recovered_ids
+            prompts_for_api = [p for p in prompts_for_api if p["custom_id"] not in recovered_ids | held]
+            logging.info(f"Recovered {len(recovered_ids)} results from the journal.")
+
+        wave_summaries, blocked = await run_dependency_waves(
+            prompts_for_api, run_wave, apply_prerequisites if project_dir else None, done
+        )
+        summaries += wave_summaries
+        summary = new_summary()
+        for wave_summary in summaries:
+            merge_summary(summary, wave_summary)
+        if cache:
+            cache.evict()
+
+        usage = summary["usage"]
+        for key, value in usage.items():
+            metrics.incr('tokens_total', value, type=key.replace('_tokens', ''))
+        metrics.incr('results_total', summary['succeeded'], status='succeeded')
+        metrics.incr('results_total', summary['failed'], status='failed')
+        logging.info(
+            f"Results saved to {args.output_dir}: {summary['succeeded']} succeeded, {summary['failed']} failed "
+            f"({usage['input_tokens']} input / {usage['output_tokens']} output tokens, "
+            f"{usage['cache_read_input_tokens']} cache-read / {usage['cache_creation_input_tokens']} cache-write tokens)."
+        )
+        if summary["failed"]:
+            logging.warning(f"{summary['failed']} tasks failed. Check the logs and results directory.")
+        if blocked:
+            logging.warning(f"{len(blocked)} tasks are still pending because a prerequisite failed.")
+
+        store.set_status([failure["custom_id"] for failure in summary["failures"]], "pending")
+        logging.info(f"Marked {len(completed)} prompts as done in {store_path}")
 
     except Exception as e:
         logging.error(f"An error occurred during execution: {e}")
+    finally:
+        output.close()
@@ -1,12 +1,20 @@
 import logging
+import os
+from src.context import ContextIndex
 from src.file_utils import read_file, write_file
-from src.planning import parse_tasks_from_planning_md, update_planning_md_with_prompts
+from src.metrics import metrics
+from src.planning import DependencyError, PlanningIndex, merge_prompts, resolve_dependencies, task_id, task_waves
+from src.prompt_store import PromptStore, default_store_path
+from src.request_builder import prompt_content
 from src import config
 
 def plan_command(args):
     """
-    Reads tasks from PLANNING.md, converts them into prompts,
-    and updates PLANNING.md with the generated prompts.
+    Reads tasks from PLANNING.md, converts them into prompts, and
+    syncs them into the prompt store. Only new or changed tasks are
+    marked pending for the next `execute`; PLANNING.md keeps a summary.
+    Tasks annotated with `[after: name]` record the custom_ids of the
+    tasks they depend on, which `execute` runs first.
     """
     logging.info(f"Starting plan generation from: {args.planning_file}")
     content = read_file(args.planning_file)
@@ -14,22 +22,65 @@ def plan_command(args):
         logging.error(f"Could not read planning file: {args.planning_file}")
         return
 
-    tasks = parse_tasks_from_planning_md(content)
+    with metrics.timer('stage_seconds', stage='plan.parse'):
+        index = PlanningIndex(content)
+        specs = index.task_specs()
+        tasks = [spec['task'] for spec in specs]
     if not tasks:
         logging.warning("No new tasks found in the planning file.")
         return
 
     logging.info(f"Found {len(tasks)} tasks to process.")
 
+    context_index = None
+    project_dir = getattr(args, 'project_dir', None)
+    budget = getattr(args, 'context_budget', None)
+    if project_dir and budget != 0:
+        context_index = ContextIndex(project_dir)
+        with metrics.timer('stage_seconds', stage='plan.index'):
+            context_index.refresh()
+
     prompts = []
-    for i, task in enumerate(tasks):
-        prompt = {
-            "custom_id": f"task_{i}_{task[:20].replace(' ', '_')}",
-            "content": f"CONTEXT: Complete the following task for the `claude-code-automated` project.\nTASK: {task}\nOUTPUT FORMAT: The first line of your response must be a comment with the full path of the file to be updated (e.g., # src/main.py). The rest of the response should be the complete content of the file.",
-        }
-        prompts.append(prompt)
-
-    new_content = update_planning_md_with_prompts(content, prompts)
+    with metrics.timer('stage_seconds', stage='plan.prompts'):
+        for task, depends_on in zip(tasks, resolve_dependencies(specs)):
+            prompt = {
+                "custom_id": task_id(task),
+                "task": task,
+                "content": prompt_content(task),
+            }
+            if depends_on:
+                prompt["depends_on"] = depends_on
+            if context_index:
+                prompt["context"] = context_index.pack(task, budget)
+                # `execute` re-packs dependents' context with the same budget.
+                prompt["context_budget"] = config.CONTEXT_TOKEN_BUDGET if budget is None else budget
+            prompts.append(prompt)
+
+    try:
+        waves = task_waves(prompts)
+    except DependencyError as e:
+        logging.error(f"{e}. Fix the [after: ...] annotations in {args.planning_file}.")
+        return
+    if len(waves) > 1:
+        logging.info(f"Tasks form {len(waves)} dependency waves of {', '.join(str(len(w)) for w in waves)} task(s).")
+
     output_file = args.output_file or args.planning_file
-    write_file(output_file, new_content)
+    store_path = getattr(args, 'prompt_store', None) or default_store_path(output_file)
+    store = PromptStore(store_path)
+    # Fall back to prompts embedded in PLANNING.md by older versions.
+    existing = list(store.iter_prompts()) or index.prompts()
+    prompts, pending = merge_prompts(existing, prompts)
+    removed = len({p.get("custom_id") for p in existing} - {p["custom_id"] for p in prompts})
+    logging.info(f"{pending} prompts pending, {len(prompts) - pending} unchanged, {removed} removed.")
+
+    with metrics.timer('stage_seconds', stage='plan.store'):
+        appended = store.sync(prompts)
+        store.compact()
+    logging.info(f"Wrote {appended} records to the prompt store: {store_path}")
+
+    summary = (
+        f"{len(prompts)} prompts ({pending} pending) are stored in `{os.path.basename(store_path)}`. "
+        "Run `execute` to submit the pending ones."
+    )
+    write_file(output_file, index.replace_prompts_summary(summary))
     logging.info(f"Generated {len(prompts)} prompts and updated {output_file}")
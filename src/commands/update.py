@@ -1,42 +1,60 @@
 import os
 import logging
-from src.file_utils import read_file, write_file
+from src.apply import (
+    ApplyError, apply_changes, group_by_target, iter_resolved, load_changes, scan_results, scan_store
+)
+from src.metrics import metrics
+from src.result_store import ResultStore
 
 def update_command(args):
     """
     Applies the code changes from the results directory to the project.
+    Results are streamed from the result store, keeping only a hash of each
+    change to find conflicts, then read again one at a time and written to
+    temp files (or scanned in parallel from a one-file-per-item results
+    directory), and may hold several files or unified diffs each.
+    Conflicting writes to the same target are skipped, diffs are patched
+    onto the current files, and the remaining changes are applied
+    atomically.
     """
-    logging.info(f"Updating project in: {args.project_dir}")
     results_dir = args.results_dir
+    export_dir = getattr(args, 'export_dir', None)
+    store = None
+    if ResultStore.exists(results_dir):
+        store = ResultStore(results_dir)
+        if export_dir:
+            logging.info(f"Exported {store.export(export_dir)} results to {export_dir}")
+            return
+        with metrics.timer('stage_seconds', stage='update.scan'):
+            changes, conflicts = group_by_target(scan_store(store))
+    else:
+        succeeded_dir = os.path.join(results_dir, 'succeeded')
+        if not os.path.isdir(succeeded_dir):
+            logging.error(f"No result store or succeeded directory found in: {results_dir}")
+            return
+        if export_dir:
+            logging.error(f"{results_dir} already uses the one-file-per-item layout; nothing to export.")
+            return
+        with metrics.timer('stage_seconds', stage='update.scan'):
+            changes, conflicts = group_by_target(scan_results(succeeded_dir))
 
-    succeeded_dir = os.path.join(results_dir, 'succeeded')
-
-    if not os.path.isdir(succeeded_dir):
-        logging.error(f"Succeeded directory not found: {succeeded_dir}")
+    logging.info(f"Updating project in: {args.project_dir}")
+    for target, sources in conflicts.items():
+        logging.error(f"Conflicting changes to {target} from {', '.join(sources)}; skipping it.")
+
+    try:
+        with metrics.timer('stage_seconds', stage='update.apply'):
+            if store:
+                changes = load_changes(store, changes)
+            rejected = []
+            applied = apply_changes(iter_resolved(changes, args.project_dir, rejected), args.project_dir)
+    except ApplyError as e:
+        logging.error(f"No changes were applied: {e}")
         return
 
-    for filename in os.listdir(succeeded_dir):
-        if filename.endswith(".txt"):
-            result_filepath = os.path.join(succeeded_dir, filename)
-            content = read_file(result_filepath)
-
-            if not content:
-                logging.warning(f"Result file is empty: {filename}")
-                continue
-
-            lines = content.split('\n')
-            first_line = lines[0].strip()
-
-            if first_line.startswith("#"):
-                target_file_path = first_line[1:].strip()
-                if os.path.isabs(target_file_path):
-                    logging.warning(f"Skipping absolute path found in {filename}: {target_file_path}")
-                    continue
-
-                full_path = os.path.join(args.project_dir, target_file_path)
-                code_content = '\n'.join(lines[1:])
-
-                logging.info(f"Applying changes to: {full_path}")
-                write_file(full_path, code_content)
-            else:
-                logging.warning(f"Could not find target file path in {filename}")
+    metrics.incr('files_applied_total', len(applied))
+    metrics.incr('patches_rejected_total', len(rejected))
+    logging.info(
+        f"Applied {len(applied)} file(s); skipped {len(conflicts)} conflicting target(s) "
+        f"and {len(rejected)} patch(es) that did not apply."
+    )
@@ -4,13 +4,83 @@
 # API Configuration
 ANTHROPIC_API_KEY = None  # Set via environment variable
 MODEL_NAME = "claude-3-opus-20240229"
-MAX_TOKENS = 4096
+MAX_TOKENS = 4096  # Used when there is no usage history to size a request from
+MAX_OUTPUT_TOKENS = 4096  # The model's output limit; adaptive max_tokens never exceeds it
+PROMPT_CACHING = True
+PROMPT_CACHE_MIN_TOKENS = 1024  # Shortest prefix the model caches (2048 for Haiku models)
 
 # Polling Configuration
 POLL_INITIAL_DELAY = 10
 POLL_MAX_DELAY = 120
 POLL_FACTOR = 1.5
+POLL_MIN_DELAY = 5
+POLL_MAX_RETRIES = 5
 
 # File Paths
 PLANNING_FILE = "PLANNING.md"
 RESULTS_DIR = "results"
+JOURNAL_FILE = "batch_journal.jsonl"
+PROMPT_STORE_FILE = "prompts.jsonl"
+
+# Batch Sharding Configuration
+BATCH_MAX_REQUESTS = 10000
+BATCH_MAX_BYTES = 256 * 1024 * 1024
+MAX_IN_FLIGHT_BATCHES = 4
+
+# Result Streaming Configuration
+RESULT_QUEUE_SIZE = 100
+RESULT_FORMAT = "store"
+RESULT_COMPRESSION = None
+RESULT_SEGMENT_MAX_BYTES = 256 * 1024 * 1024
+
+# Response Cache Configuration
+CACHE_DIR = ".cache/responses"
+CACHE_MAX_BYTES = 512 * 1024 * 1024
+CACHE_MAX_AGE = 7 * 24 * 60 * 60
+
+# Direct Execution Configuration
+DIRECT_CONCURRENCY = 8
+DIRECT_MAX_RETRIES = 5
+DIRECT_RETRY_INITIAL_DELAY = 1
+DIRECT_RETRY_MAX_DELAY = 60
+DIRECT_MODE_MAX_PROMPTS = 20
+
+# Provider Routing Configuration
+# Costs are in dollars per million input/output tokens; concurrency is the most
+# requests the router runs on a provider at once.
+DEFAULT_PROVIDER = "anthropic"
+PROVIDER_SETTINGS = {
+    "anthropic": {"concurrency": 4, "input_cost": 15.0, "output_cost": 75.0},
+    "mock": {"concurrency": 8, "input_cost": 0.0, "output_cost": 0.0},
+}
+ROUTER_COST_WEIGHT = 60
+ROUTER_INITIAL_LATENCY = 1.0
+ROUTER_LATENCY_SMOOTHING = 0.3
+ROUTER_MAX_FAILOVERS = 2
+
+# Context Packing Configuration
+CONTEXT_INDEX_FILE = ".cache/context_index.json"
+CONTEXT_TOKEN_BUDGET = 8000
+CONTEXT_MAX_FILES = 10
+CONTEXT_MAX_FILE_BYTES = 1024 * 1024
+CONTEXT_EXTENSIONS = (".py", ".md", ".toml", ".cfg", ".ini", ".txt", ".json", ".yaml", ".yml", ".sh")
+CONTEXT_EXCLUDE_DIRS = ("__pycache__", "node_modules", "results", "venv", "build", "dist")
+
+# Estimation and Budget Configuration
+ESTIMATE_HEADROOM = 1.25
+ESTIMATE_MIN_TOKENS = 1024
+ESTIMATE_MIN_SAMPLES = 5
+ESTIMATE_PERCENTILE = 0.9
+BATCH_COST_FACTOR = 0.5  # Batch API requests cost half the PROVIDER_SETTINGS prices
+RUN_MAX_TOKENS = None
+RUN_MAX_COST = None  # Dollars
+OVER_BUDGET = "reject"  # Or "split" to submit what fits and leave the rest pending
+
+# Retry Configuration
+RETRY_MAX_ATTEMPTS = 3
+RETRY_INITIAL_DELAY = 30
+RETRY_MAX_DELAY = 300
+RESULTS_MAX_RETRIES = 3
+
+# Update Configuration
+APPLY_MAX_WORKERS = 8
@@ -0,0 +1,190 @@
+import ast
+import hashlib
+import json
+import logging
+import math
+import os
+import re
+from src import config
+
+WORD_PATTERN = re.compile(r"[A-Za-z][a-z]+|[A-Z]+(?![a-z])|\d+")
+STOPWORDS = frozenset(
+    "the and for with from that this into add use new all are not but its has have should when then than "
+    "def class self none true false return import file files code".split()
+)
+
+
+def estimate_tokens(text):
+    """Returns a rough token count for text (about four characters per token)."""
+    return math.ceil(len(text) / 4)
+
+
+def terms(text):
+    """Splits text into lowercase identifier terms, breaking snake_case and camelCase."""
+    words = (word.lower() for word in WORD_PATTERN.findall(text))
+    return {word for word in words if len(word) > 2 and word not in STOPWORDS}
+
+
+def summarize(path, text):
+    """
+    Returns a short summary of a file: for Python, the first line of the
+    module docstring and the top-level classes and functions; otherwise the
+    first non-empty line.
+    """
+    if path.endswith('.py'):
+        try:
+            tree = ast.parse(text)
+        except (SyntaxError, ValueError):
+            tree = None
+        if tree is not None:
+            docstring = (ast.get_docstring(tree) or '').strip().split('\n')[0]
+            names = [
+                f"{'class' if isinstance(node, ast.ClassDef) else 'def'} {node.name}"
+                for node in tree.body
+                if isinstance(node, (ast.ClassDef, ast.FunctionDef, ast.AsyncFunctionDef))
+            ]
+            return '; '.join(filter(None, [docstring, ', '.join(names)]))
+    for line in text.splitlines():
+        if line.strip():
+            return line.strip()[:200]
+    return ''
+
+
+class ContextIndex:
+    """
+    On-disk index of the project tree used to pack relevant source into
+    prompts. Each file entry holds its size, mtime, content hash, token
+    estimate, summary and search terms. `refresh` only re-reads files whose
+    size or mtime changed, and only re-summarizes files whose hash changed.
+    """
+
+    def __init__(self, project_dir, index_path=None):
+        self.project_dir = project_dir
+        self.index_path = index_path or os.path.join(project_dir, config.CONTEXT_INDEX_FILE)
+        self.files = {}
+        self._idf = None
+
+    def load(self):
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                self.files = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            self.files = {}
+        return self
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.index_path) or '.', exist_ok=True)
+        tmp_path = f"{self.index_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.files, f)
+        os.replace(tmp_path, self.index_path)
+
+    def _walk(self):
+        """Yields (relative path, stat) for every indexable file in the project."""
+        for root, dirs, names in os.walk(self.project_dir):
+            dirs[:] = sorted(d for d in dirs if not d.startswith('.') and d not in config.CONTEXT_EXCLUDE_DIRS)
+            for name in sorted(names):
+                if os.path.splitext(name)[1] not in config.CONTEXT_EXTENSIONS:
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                if stat.st_size <= config.CONTEXT_MAX_FILE_BYTES:
+                    yield os.path.relpath(path, self.project_dir).replace(os.sep, '/'), stat
+
+    def _index_file(self, rel_path, stat, previous):
+        with open(os.path.join(self.project_dir, rel_path), 'rb') as f:
+            data = f.read()
+        digest = hashlib.sha256(data).hexdigest()
+        entry = {'size': stat.st_size, 'mtime': stat.st_mtime_ns, 'hash': digest}
+        if previous and previous.get('hash') == digest:
+            return {**previous, **entry}, False
+        text = data.decode('utf-8', errors='replace')
+        summary = summarize(rel_path, text)
+        entry.update({
+            'tokens': estimate_tokens(text),
+            'summary': summary,
+            'terms': sorted(terms(rel_path) | terms(summary)),
+        })
+        return entry, True
+
+    def refresh(self):
+        """
+        Brings the index up to date with the project tree and saves it if
+        anything changed. Returns the number of files (re)summarized.
+        """
+        self.load()
+        files = {}
+        changed = 0
+        dirty = False
+        for rel_path, stat in self._walk():
+            previous = self.files.get(rel_path)
+            if previous and previous['size'] == stat.st_size and previous['mtime'] == stat.st_mtime_ns:
+                files[rel_path] = previous
+                continue
+            try:
+                files[rel_path], summarized = self._index_file(rel_path, stat, previous)
+            except OSError as e:
+                logging.warning(f"Could not index {rel_path}: {e}")
+                continue
+            changed += summarized
+            dirty = True
+        dirty = dirty or files.keys() != self.files.keys()
+        self.files = files
+        self._idf = None
+        if dirty:
+            self.save()
+        logging.info(f"Context index: {len(files)} files, {changed} re-summarized.")
+        return changed
+
+    def _weights(self):
+        if self._idf is None:
+            counts = {}
+            for entry in self.files.values():
+                for term in entry['terms']:
+                    counts[term] = counts.get(term, 0) + 1
+            total = len(self.files)
+            self._idf = {term: math.log(1 + total / count) for term, count in counts.items()}
+        return self._idf
+
+    def rank(self, task):
+        """Returns (score, path) pairs for files sharing terms with the task, best first."""
+        idf = self._weights()
+        task_terms = terms(task)
+        scored = []
+        for rel_path, entry in self.files.items():
+            path_terms = terms(rel_path)
+            score = sum(idf[term] * (2 if term in path_terms else 1) for term in task_terms.intersection(entry['terms']))
+            if score:
+                scored.append((score, rel_path))
+        scored.sort(key=lambda item: (-item[0], item[1]))
+        return scored
+
+    def pack(self, task, budget=None):
+        """
+        Picks the most relevant files for a task within a token budget. Files
+        that fit are included in full; larger ones fall back to their summary.
+        Returns the rendered context text ('' if nothing is relevant).
+        """
+        budget = config.CONTEXT_TOKEN_BUDGET if budget is None else budget
+        sections = []
+        for _, rel_path in self.rank(task)[:config.CONTEXT_MAX_FILES]:
+            entry = self.files[rel_path]
+            if entry['tokens'] <= budget:
+                try:
+                    with open(os.path.join(self.project_dir, rel_path), 'r', encoding='utf-8', errors='replace') as f:
+                        section = f"# {rel_path}\n{f.read()}"
+                except OSError:
+                    continue
+            elif entry['summary']:
+                section = f"# {rel_path} (summary)\n{entry['summary']}"
+            else:
+                continue
+            tokens = estimate_tokens(section)
+            if tokens > budget:
+                continue
+            sections.append(section)
+            budget -= tokens
+        return '\n\n'.join(sections)
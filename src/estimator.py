@@ -0,0 +1,136 @@
+import logging
+import math
+from src import config
+from src.context import estimate_tokens
+from src.result_store import ResultStore
+
+
+def request_input_tokens(params):
+    """Estimates a request's input tokens offline from its system prompt and messages."""
+    system = params.get('system') or ''
+    texts = [system] if isinstance(system, str) else [block.get('text', '') for block in system]
+    for message in params.get('messages', ()):
+        content = message['content']
+        texts.extend([content] if isinstance(content, str) else [block.get('text', '') for block in content])
+    return sum(estimate_tokens(text) for text in texts)
+
+
+class UsageHistory:
+    """
+    Output token counts of earlier results, by custom_id, taken from the
+    `usage` and `stop_reason` kept in a result store. Predicts how many
+    output tokens a task will need: its own last output (doubled if that
+    was cut off at max_tokens), otherwise a high percentile of every
+    recorded output, otherwise `config.MAX_TOKENS`.
+    """
+
+    def __init__(self, records=()):
+        self.outputs = {}
+        for record in records:
+            output_tokens = (record.get('usage') or {}).get('output_tokens')
+            if record.get('status') == 'succeeded' and output_tokens:
+                self.outputs[record['custom_id']] = (output_tokens, record.get('stop_reason'))
+        samples = sorted(tokens for tokens, _ in self.outputs.values())
+        self.typical = None
+        if len(samples) >= config.ESTIMATE_MIN_SAMPLES:
+            self.typical = samples[min(len(samples) - 1, int(len(samples) * config.ESTIMATE_PERCENTILE))]
+
+    @classmethod
+    def from_results(cls, output_dir):
+        """
+        Loads the history from the index of the result store in `output_dir`.
+        One-file-per-item results keep no usage, so they give no history.
+        """
+        if not ResultStore.exists(output_dir):
+            return cls()
+        return cls(
+            {'custom_id': custom_id, 'status': 'succeeded', 'usage': {'output_tokens': tokens}, 'stop_reason': stop_reason}
+            for custom_id, (tokens, stop_reason) in ResultStore(output_dir).output_usage().items()
+        )
+
+    def predict(self, custom_id):
+        """Returns (predicted output tokens, whether the prediction comes from history)."""
+        if custom_id in self.outputs:
+            tokens, stop_reason = self.outputs[custom_id]
+            return (tokens * 2 if stop_reason == 'max_tokens' else tokens), True
+        if self.typical:
+            return self.typical, True
+        return config.MAX_TOKENS, False
+
+
+def adaptive_max_tokens(predicted, from_history):
+    """
+    Returns the max_tokens for a request: the prediction plus headroom,
+    clamped to the configured range, or `config.MAX_TOKENS` without history.
+    """
+    if not from_history:
+        return config.MAX_TOKENS
+    tokens = math.ceil(predicted * config.ESTIMATE_HEADROOM)
+    return max(config.ESTIMATE_MIN_TOKENS, min(tokens, config.MAX_OUTPUT_TOKENS))
+
+
+def token_prices(specs, mode):
+    """
+    Returns the (input, output) dollars per token for the given provider
+    specs, using the most expensive route and the batch discount.
+    """
+    settings = [config.PROVIDER_SETTINGS.get(spec.split(':', 1)[0], {}) for spec in specs]
+    factor = config.BATCH_COST_FACTOR if mode == 'batch' else 1.0
+    input_cost = max(s.get('input_cost', 0.0) for s in settings) * factor / 1_000_000
+    output_cost = max(s.get('output_cost', 0.0) for s in settings) * factor / 1_000_000
+    return input_cost, output_cost
+
+
+def estimate_requests(requests, history, prices=(0.0, 0.0)):
+    """
+    Estimates every request's input and output tokens, max_tokens and cost.
+    Returns a dict of custom_id -> estimate, in request order.
+    """
+    estimates = {}
+    for request in requests:
+        input_tokens = request_input_tokens(request['params'])
+        output_tokens, from_history = history.predict(request['custom_id'])
+        estimates[request['custom_id']] = {
+            'input_tokens': input_tokens,
+            'output_tokens': output_tokens,
+            'max_tokens': adaptive_max_tokens(output_tokens, from_history),
+            'cost': input_tokens * prices[0] + output_tokens * prices[1],
+        }
+    return estimates
+
+
+def total(estimates):
+    """Sums estimates into input tokens, output tokens and cost."""
+    return {
+        'input_tokens': sum(e['input_tokens'] for e in estimates.values()),
+        'output_tokens': sum(e['output_tokens'] for e in estimates.values()),
+        'cost': sum(e['cost'] for e in estimates.values()),
+    }
+
+
+def fit_budget(prompts, estimates, max_tokens=None, max_cost=None):
+    """
+    Splits prompts (in dependency order) into the ones that fit within the
+    token and dollar budgets and the ones deferred to a later run. A prompt
+    whose prerequisite is deferred is deferred too.
+    """
+    selected, deferred = [], []
+    deferred_ids = set()
+    tokens = cost = 0
+    for prompt in prompts:
+        estimate = estimates[prompt['custom_id']]
+        next_tokens = tokens + estimate['input_tokens'] + estimate['output_tokens']
+        next_cost = cost + estimate['cost']
+        if (
+            deferred_ids.intersection(prompt.get('depends_on', ()))
+            or (max_tokens is not None and next_tokens > max_tokens)
+            or (max_cost is not None and next_cost > max_cost)
+        ):
+            deferred.append(prompt)
+            deferred_ids.add(prompt['custom_id'])
+            continue
+        selected.append(prompt)
+        tokens, cost = next_tokens, next_cost
+    if deferred:
+        logging.info(f"Deferring {len(deferred)} prompt(s) to stay within the run budget.")
+    return selected, deferred
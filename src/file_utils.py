@@ -1,4 +1,6 @@
+import json
 import os
+from src.metrics import metrics
 
 def read_file(filepath):
     """Reads a file and returns its content."""
@@ -10,23 +12,30 @@ def read_file(filepath):
 
 def write_file(filepath, content):
     """Writes content to a file."""
-    os.makedirs(os.path.dirname(filepath), exist_ok=True)
+    os.makedirs(os.path.dirname(filepath) or '.', exist_ok=True)
     with open(filepath, 'w', encoding='utf-8') as f:
         f.write(content)
 
+def write_batch_result(result, output_dir, status):
+    """Writes a single batch result to the succeeded or failed directory."""
+    custom_id = result.get('custom_id', 'unknown_id')
+    if status == 'succeeded':
+        path = os.path.join(output_dir, 'succeeded', f"{custom_id}.txt")
+        content = result.get('content', '')
+    else:
+        path = os.path.join(output_dir, 'failed', f"{custom_id}.json")
+        error = result.get('error', '')
+        content = error if isinstance(error, str) else json.dumps(error, default=str)
+    write_file(path, content)
+    metrics.incr('bytes_written_total', len(content.encode('utf-8')), stage='results')
+
 def write_batch_results(results, output_dir):
     """Writes the results of a batch job to individual files."""
-    succeeded_dir = os.path.join(output_dir, 'succeeded')
-    failed_dir = os.path.join(output_dir, 'failed')
-    os.makedirs(succeeded_dir, exist_ok=True)
-    os.makedirs(failed_dir, exist_ok=True)
+    os.makedirs(os.path.join(output_dir, 'succeeded'), exist_ok=True)
+    os.makedirs(os.path.join(output_dir, 'failed'), exist_ok=True)
 
     for result in results.get('succeeded', []):
-        custom_id = result.get('custom_id', 'unknown_id')
-        filename = f"{custom_id}.txt"
-        write_file(os.path.join(succeeded_dir, filename), result.get('content', ''))
+        write_batch_result(result, output_dir, 'succeeded')
 
     for result in results.get('failed', []):
-        custom_id = result.get('custom_id', 'unknown_id')
-        filename = f"{custom_id}.json"
-        write_file(os.path.join(failed_dir, filename), str(result.get('error', '')))
+        write_batch_result(result, output_dir, 'failed')
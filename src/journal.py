@@ -0,0 +1,74 @@
+import json
+import os
+
+
+class BatchJournal:
+    """
+    Append-only JSONL journal of submitted batches and the results already
+    fetched for them, so an interrupted `execute` can be resumed.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def reset(self):
+        """Starts a fresh, empty journal."""
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with open(self.path, 'w', encoding='utf-8'):
+            pass
+
+    def _append(self, entry):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entry) + '\n')
+
+    def record_submitted(self, batch_id, custom_ids):
+        """Records a batch submission and the custom_ids it contains."""
+        self._append({'event': 'submitted', 'batch_id': batch_id, 'custom_ids': list(custom_ids)})
+
+    def record_result(self, batch_id, result):
+        """Records that a result has been written to disk."""
+        self._append({
+            'event': 'result',
+            'batch_id': batch_id,
+            'custom_id': result['custom_id'],
+            'status': result['status'],
+        })
+
+    def record_finished(self, batch_id):
+        """Records that every result of a batch has been fetched."""
+        self._append({'event': 'finished', 'batch_id': batch_id})
+
+    def load(self):
+        """
+        Replays the journal and returns a dict of batch_id -> state, where
+        state holds the batch's `custom_ids`, the `fetched` custom_ids, the
+        fetched custom_ids that `succeeded` and whether the batch is
+        `finished`. A truncated final line is ignored.
+        """
+        batches = {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    batch_id = entry.get('batch_id')
+                    if entry.get('event') == 'submitted':
+                        batches[batch_id] = {
+                            'custom_ids': entry['custom_ids'], 'fetched': set(), 'succeeded': set(), 'finished': False
+                        }
+                    elif batch_id in batches and entry.get('event') == 'result':
+                        batches[batch_id]['fetched'].add(entry['custom_id'])
+                        if entry.get('status') == 'succeeded':
+                            batches[batch_id]['succeeded'].add(entry['custom_id'])
+                    elif batch_id in batches and entry.get('event') == 'finished':
+                        batches[batch_id]['finished'] = True
+        except FileNotFoundError:
+            pass
+        return batches
+
+    def succeeded(self):
+        """Returns the custom_ids of every result recorded as succeeded."""
+        return {custom_id for state in self.load().values() for custom_id in state['succeeded']}
@@ -1,78 +1,206 @@
 import os
 import asyncio
 import logging
+import uuid
+from types import SimpleNamespace
 from abc import ABC, abstractmethod
-from anthropic import AsyncAnthropic, AnthropicError
 from src import config
+from src.metrics import metrics
+from src.poller import BatchPoller
+from src.rate_limit import RateLimiter, retry_delay
+from src.retry import classify_error
 
 class LLMProvider(ABC):
     @abstractmethod
     async def create_batch(self, requests):
         pass
 
+    @abstractmethod
+    async def retrieve_batch(self, batch_id):
+        pass
+
     @abstractmethod
     async def poll_batch(self, batch_id):
         pass
 
     @abstractmethod
+    def iter_batch_results(self, batch_id):
+        pass
+
     async def process_batch_results(self, batch_id):
+        results = {'succeeded': [], 'failed': []}
+        async for result in self.iter_batch_results(batch_id):
+            results[result.pop('status')].append(result)
+        return results
+
+
+class InProcessBatchProvider(LLMProvider):
+    """
+    Base for providers whose "batches" are groups of requests run in this
+    process. Subclasses implement `_run(requests)`, which returns a result
+    for every request; the batch interface around it is shared.
+    """
+
+    batch_prefix = "batch"
+
+    def __init__(self, **options):
+        super().__init__(**options)
+        self.batches = {}
+
+    async def create_batch(self, requests):
+        batch_id = f"{self.batch_prefix}_{uuid.uuid4().hex}"
+        self.batches[batch_id] = asyncio.ensure_future(self._run(list(requests)))
+        return SimpleNamespace(id=batch_id, processing_status="in_progress")
+
+    async def retrieve_batch(self, batch_id):
+        task = self.batches[batch_id]
+        return SimpleNamespace(id=batch_id, processing_status="ended" if task.done() else "in_progress")
+
+    async def poll_batch(self, batch_id):
+        await self.batches[batch_id]
+        return await self.retrieve_batch(batch_id)
+
+    async def iter_batch_results(self, batch_id):
+        """Yields the results of an in-process batch and releases them."""
+        for result in await self.batches.pop(batch_id):
+            yield result
+
+    @abstractmethod
+    async def _run(self, requests):
         pass
 
 class AnthropicProvider(LLMProvider):
-    def __init__(self):
+    def __init__(self, **client_options):
         api_key = os.environ.get("ANTHROPIC_API_KEY")
         if not api_key:
             raise ValueError("ANTHROPIC_API_KEY environment variable not set.")
-        self.client = AsyncAnthropic(api_key=api_key)
+        # Imported here so providers that do not use the SDK never pay for loading it.
+        from anthropic import AsyncAnthropic
+        self.client = AsyncAnthropic(api_key=api_key, **client_options)
+        self.poller = BatchPoller(self.retrieve_batch)
 
     async def create_batch(self, requests):
-        return await self.client.messages.batches.create(requests=requests)
+        with metrics.timer('api_call_seconds', operation='create_batch'):
+            return await self.client.messages.batches.create(requests=requests)
+
+    async def retrieve_batch(self, batch_id):
+        with metrics.timer('api_call_seconds', operation='retrieve_batch'):
+            return await self.client.messages.batches.retrieve(batch_id)
 
     async def poll_batch(self, batch_id):
-        current_delay = config.POLL_INITIAL_DELAY
+        return await self.poller.wait(batch_id)
+
+    async def iter_batch_results(self, batch_id):
+        """
+        Yields each batch result as a dict with a 'status' of 'succeeded' or
+        'failed'. If the results stream breaks, it is reopened up to
+        config.RESULTS_MAX_RETRIES times, skipping results already yielded,
+        and the error is raised once the retries are exhausted.
+        """
+        seen = set()
+        attempt = 0
         while True:
             try:
-                batch = await self.client.messages.batches.retrieve(batch_id)
-                logging.info(f"Batch {batch.id} status: {batch.processing_status}")
-
-                if batch.processing_status == "ended":
-                    logging.info(f"Batch {batch.id} completed successfully.")
-                    return batch
-                elif batch.processing_status == "failed":
-                    logging.error(f"Batch {batch.id} failed. Error: {getattr(batch, 'error', 'N/A')}")
-                    return None
-
-                await asyncio.sleep(current_delay)
-                current_delay = min(current_delay * config.POLL_FACTOR, config.POLL_MAX_DELAY)
-            except AnthropicError as e:
-                logging.error(f"An API error occurred while polling batch {batch_id}: {e}")
-                return None
+                async for result in await self.client.messages.batches.results(batch_id):
+                    if result.custom_id in seen:
+                        continue
+                    seen.add(result.custom_id)
+                    yield self._result_dict(result)
+                return
             except Exception as e:
-                logging.error(f"An unexpected error occurred while polling batch {batch_id}: {e}")
-                return None
+                if attempt >= config.RESULTS_MAX_RETRIES:
+                    logging.error(f"Giving up reading results for batch {batch_id} after {len(seen)} results: {e}")
+                    raise
+                delay = retry_delay({}, attempt)
+                attempt += 1
+                logging.warning(
+                    f"Reading results for batch {batch_id} failed after {len(seen)} results, "
+                    f"resuming in {delay:.1f}s (attempt {attempt}): {e}"
+                )
+                await asyncio.sleep(delay)
 
-    async def process_batch_results(self, batch_id):
-        results = {'succeeded': [], 'failed': []}
-        try:
-            async for result in self.client.messages.batches.results(batch_id):
-                custom_id = result.custom_id
-                if hasattr(result, 'result') and result.result.type == "succeeded":
-                    results['succeeded'].append({
-                        'custom_id': custom_id,
-                        'content': result.result.message.content[0].text,
-                        'usage': result.result.message.usage
-                    })
-                else:
-                    error_info = getattr(result.result, 'error', None)
-                    if hasattr(error_info, 'assert_called_once_with'):
-                        error_info = str(error_info)
-                    if not error_info:
-                        error_info = str(getattr(result.result, 'get', lambda x: None)('error'))
-                    results['failed'].append({
-                        'custom_id': custom_id,
-                        'error': error_info or 'Unknown error'
-                    })
-        except Exception as e:
-            pass
+    @staticmethod
+    def _result_dict(result):
+        custom_id = result.custom_id
+        if hasattr(result, 'result') and result.result.type == "succeeded":
+            return {
+                'status': 'succeeded',
+                'custom_id': custom_id,
+                'content': result.result.message.content[0].text,
+                'usage': result.result.message.usage,
+                'stop_reason': result.result.message.stop_reason,
+            }
+        result_type = getattr(result.result, 'type', None)
+        error_info = getattr(result.result, 'error', None)
+        if hasattr(error_info, 'assert_called_once_with'):
+            error_info = str(error_info)
+        elif hasattr(error_info, 'model_dump'):
+            error_info = error_info.model_dump()
+        return {
+            'status': 'failed',
+            'custom_id': custom_id,
+            'error': error_info or {'type': result_type or 'unknown'},
+            'error_type': classify_error(error_info, result_type),
+        }
 
-        return results
+
+class AnthropicDirectProvider(InProcessBatchProvider, AnthropicProvider):
+    """
+    Sends each request straight to the Messages API through a
+    concurrency-limited worker pool instead of the Batch API. It exposes the
+    same batch interface, so sharding, streaming and the results format are
+    unchanged; a "batch" here is just a group of in-process requests.
+    """
+
+    batch_prefix = "direct"
+
+    def __init__(self, concurrency=None, **client_options):
+        # Retries are handled here so they share the rate limiter.
+        super().__init__(max_retries=0, **client_options)
+        self.semaphore = asyncio.Semaphore(concurrency or config.DIRECT_CONCURRENCY)
+        self.rate_limiter = RateLimiter()
+
+    async def _run(self, requests):
+        return await asyncio.gather(*(self._send(request) for request in requests))
+
+    async def _send(self, request):
+        from anthropic import APIConnectionError, APIStatusError
+
+        custom_id = request['custom_id']
+        async with self.semaphore:
+            attempt = 0
+            while True:
+                await self.rate_limiter.acquire()
+                try:
+                    with metrics.timer('api_call_seconds', operation='messages'):
+                        response = await self.client.messages.with_raw_response.create(**request['params'])
+                except (APIStatusError, APIConnectionError) as e:
+                    headers = getattr(getattr(e, 'response', None), 'headers', {})
+                    self.rate_limiter.update(headers)
+                    retryable = isinstance(e, APIConnectionError) or e.status_code in (429, 529)
+                    if not retryable or attempt >= config.DIRECT_MAX_RETRIES:
+                        logging.error(f"Request {custom_id} failed: {e}")
+                        return self._failure(custom_id, e)
+                    delay = retry_delay(headers, attempt)
+                    attempt += 1
+                    metrics.incr('api_retries_total', operation='messages')
+                    logging.warning(f"Request {custom_id} was throttled, retrying in {delay:.1f}s (attempt {attempt}).")
+                    await asyncio.sleep(delay)
+                    continue
+                except Exception as e:
+                    logging.error(f"Request {custom_id} failed: {e}")
+                    return self._failure(custom_id, e)
+
+                self.rate_limiter.update(response.headers)
+                message = response.parse()
+                return {
+                    'status': 'succeeded',
+                    'custom_id': custom_id,
+                    'content': message.content[0].text,
+                    'usage': message.usage,
+                    'stop_reason': message.stop_reason,
+                }
+
+    @staticmethod
+    def _failure(custom_id, error):
+        return {'status': 'failed', 'custom_id': custom_id, 'error': str(error), 'error_type': classify_error(str(error))}
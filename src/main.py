@@ -1,23 +1,48 @@
-import asyncio
+import importlib
 import logging
 
 from src.cli import create_parser
-from src.commands.execute import execute_command
-from src.commands.plan import plan_command
-from src.commands.update import update_command
+from src.metrics import metrics
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 
-async def main():
+# Command modules are imported on dispatch, so `plan` and `update` never load
+# asyncio, the provider SDKs or each other's dependencies.
+COMMANDS = {
+    "plan": ("src.commands.plan", "plan_command", False),
+    "execute": ("src.commands.execute", "execute_command", True),
+    "update": ("src.commands.update", "update_command", False),
+}
+
+def run_command(args):
+    module_name, function_name, is_async = COMMANDS[args.command]
+    command = getattr(importlib.import_module(module_name), function_name)
+    with metrics.timer('command_seconds', command=args.command):
+        if is_async:
+            import asyncio
+            asyncio.run(command(args))
+        else:
+            command(args)
+
+def main():
     parser = create_parser()
     args = parser.parse_args()
 
-    if args.command == "plan":
-        plan_command(args)
-    elif args.command == "execute":
-        await execute_command(args)
-    elif args.command == "update":
-        update_command(args)
+    profiler = None
+    if args.profile:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+    try:
+        run_command(args)
+    finally:
+        if profiler:
+            profiler.disable()
+            profiler.dump_stats(args.profile)
+            logging.info(f"Profile written to {args.profile}")
+        if args.metrics_file:
+            metrics.write(args.metrics_file, args.metrics_format)
+            logging.info(f"Metrics written to {args.metrics_file}")
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    main()
@@ -0,0 +1,103 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+
+def _label_key(labels):
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _prometheus_labels(key):
+    if not key:
+        return ''
+    pairs = ','.join(f'{name}="{value}"' for name, value in key)
+    return f'{{{pairs}}}'
+
+
+class Metrics:
+    """
+    In-process registry of labelled counters and observations (timings,
+    polls per batch, ...). Observations keep a count, sum and max per label
+    set. The registry is thread-safe, so it can be updated from `to_thread`
+    and thread-pool workers, and exports to JSON or Prometheus text format.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.counters = {}
+            self.observations = {}
+
+    def incr(self, name, value=1, **labels):
+        """Adds value to a counter."""
+        key = _label_key(labels)
+        with self._lock:
+            series = self.counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        """Records one observation of a value."""
+        key = _label_key(labels)
+        with self._lock:
+            series = self.observations.setdefault(name, {})
+            stats = series.setdefault(key, {'count': 0, 'sum': 0, 'max': value})
+            stats['count'] += 1
+            stats['sum'] += value
+            stats['max'] = max(stats['max'], value)
+
+    @contextmanager
+    def timer(self, name, **labels):
+        """Observes the wall-clock seconds spent in the block, even if it raises."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def snapshot(self):
+        """Returns every metric as JSON-serializable data."""
+        with self._lock:
+            return {
+                'counters': {
+                    name: [{'labels': dict(key), 'value': value} for key, value in series.items()]
+                    for name, series in self.counters.items()
+                },
+                'observations': {
+                    name: [{'labels': dict(key), **stats} for key, stats in series.items()]
+                    for name, series in self.observations.items()
+                },
+            }
+
+    def to_prometheus(self):
+        """Renders counters as Prometheus counters and observations as summaries."""
+        lines = []
+        with self._lock:
+            for name, series in sorted(self.counters.items()):
+                lines.append(f"# TYPE {name} counter")
+                lines += [f"{name}{_prometheus_labels(key)} {value}" for key, value in series.items()]
+            for name, series in sorted(self.observations.items()):
+                lines.append(f"# TYPE {name} summary")
+                for key, stats in series.items():
+                    labels = _prometheus_labels(key)
+                    lines.append(f"{name}_count{labels} {stats['count']}")
+                    lines.append(f"{name}_sum{labels} {stats['sum']}")
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path, fmt=None):
+        """
+        Writes the metrics to a file, as Prometheus text if `fmt` is
+        'prometheus' (or the path ends in .prom) and as JSON otherwise.
+        """
+        fmt = fmt or ('prometheus' if path.endswith('.prom') else 'json')
+        text = self.to_prometheus() if fmt == 'prometheus' else json.dumps(self.snapshot(), indent=2)
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(text)
+
+
+metrics = Metrics()
@@ -0,0 +1,53 @@
+import asyncio
+import json
+import random
+from types import SimpleNamespace
+from src.context import estimate_tokens
+from src.llm_providers import InProcessBatchProvider
+
+
+class MockProvider(InProcessBatchProvider):
+    """
+    Offline provider that answers every request in-process after `latency`
+    seconds, failing a `failure_rate` fraction of them (or the custom_ids in
+    `fail_ids`). Responses follow the result file format `update` expects,
+    so the whole pipeline can run without network access.
+    """
+
+    batch_prefix = "mock"
+
+    def __init__(self, latency=0.0, failure_rate=0.0, fail_ids=(), seed=0):
+        super().__init__()
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.fail_ids = set(fail_ids)
+        self.random = random.Random(seed)
+        self.requests_seen = 0
+
+    async def _run(self, requests):
+        await asyncio.sleep(self.latency)
+        self.requests_seen += len(requests)
+        return [self._respond(request) for request in requests]
+
+    def _respond(self, request):
+        custom_id = request['custom_id']
+        if custom_id in self.fail_ids or self.random.random() < self.failure_rate:
+            return {
+                'status': 'failed',
+                'custom_id': custom_id,
+                'error': {'type': 'overloaded_error', 'message': 'Simulated failure'},
+                'error_type': 'overloaded',
+            }
+        content = f"# results/{custom_id}.py\n# Mock response for {custom_id}\n"
+        return {
+            'status': 'succeeded',
+            'custom_id': custom_id,
+            'content': content,
+            'stop_reason': 'end_turn',
+            'usage': SimpleNamespace(
+                input_tokens=estimate_tokens(json.dumps(request.get('params', {}))),
+                output_tokens=estimate_tokens(content),
+                cache_creation_input_tokens=0,
+                cache_read_input_tokens=0,
+            ),
+        }
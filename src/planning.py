@@ -1,43 +1,242 @@
+import hashlib
 import json
+import logging
 import re
 
+TASKS_HEADING = "### 📋 Remaining Tasks"
+PROMPTS_HEADING = "## Generated Prompts"
+PROMPTS_BLOCK_START = f"{PROMPTS_HEADING}\n\n```json\n"
+
+# Captures task descriptions from markdown list items
+TASK_PATTERN = re.compile(r"\s*(?:-|\*|\+)\s+(?:\*\*.*\*\*\s*-\s*)?(.*)")
+# Dependency annotations in a task item, e.g. `[id: logger]` and `[after: logger, config]`
+ANNOTATION_PATTERN = re.compile(r"\s*\[(id|after):\s*([^\]]*)\]", re.IGNORECASE)
+
+
+def parse_task_annotations(text):
+    """
+    Splits a task item into its description, its optional `[id: name]` and
+    the names listed in its `[after: a, b]` annotations.
+    """
+    name = None
+    after = []
+    for key, value in ANNOTATION_PATTERN.findall(text):
+        if key.lower() == 'id':
+            name = value.strip() or None
+        else:
+            after.extend(item.strip() for item in value.split(',') if item.strip())
+    return ANNOTATION_PATTERN.sub('', text).strip(), name, after
+
+
+class DependencyError(ValueError):
+    """Raised when task dependencies form a cycle."""
+
+
+class PlanningIndex:
+    """
+    Single-pass, line-oriented index of a PLANNING.md document. Records the
+    offsets of every heading, every task item in the Remaining Tasks section
+    and the Generated Prompts JSON block, so plan and execute can share one
+    scan and the prompts section can be replaced without rescanning.
+    """
+
+    def __init__(self, content):
+        self._scan(content)
+
+    def _scan(self, content):
+        self.content = content
+        self.headings = []
+        self.task_items = []
+        self.prompts_start = None
+        self.prompts_json = None
+        self._prompts = None
+        length = len(content)
+        pos = 0
+        in_tasks = False
+        seen_tasks = False
+        prompts_state = None
+        while pos < length:
+            end = content.find('\n', pos)
+            if end == -1:
+                end = length
+            line = content[pos:end]
+
+            if prompts_state == 'heading':
+                prompts_state = 'blank' if line == '' else None
+            elif prompts_state == 'blank':
+                prompts_state = 'json' if line == '```json' else None
+                json_start = end + 1
+            elif prompts_state == 'json':
+                if line.startswith('```'):
+                    self.prompts_json = (json_start, max(pos - 1, json_start))
+                    prompts_state = None
+                pos = end + 1
+                continue
+
+            if line.startswith('#'):
+                if line.startswith('##'):
+                    in_tasks = False
+                self.headings.append((pos, end, line))
+                if line == TASKS_HEADING and not seen_tasks:
+                    in_tasks = seen_tasks = True
+                elif line == PROMPTS_HEADING and self.prompts_start is None:
+                    self.prompts_start = pos
+                    prompts_state = 'heading'
+            elif in_tasks:
+                match = TASK_PATTERN.match(line)
+                if match and match.group(1).strip():
+                    # Completed tasks are indexed but not returned by tasks()
+                    self.task_items.append((pos, end, match.group(1).strip(), '[x]' in line))
+            pos = end + 1
+
+    def tasks(self):
+        """Returns the open task descriptions from the Remaining Tasks section."""
+        return [spec['task'] for spec in self.task_specs()]
+
+    def task_specs(self):
+        """
+        Returns the open tasks as dicts with the description ('task'), the
+        optional annotation name ('name') and prerequisite names ('after').
+        """
+        specs = []
+        for _, _, text, done in self.task_items:
+            if not done:
+                task, name, after = parse_task_annotations(text)
+                specs.append({'task': task, 'name': name, 'after': after})
+        return specs
+
+    def prompts(self):
+        """Returns the prompts from the Generated Prompts block, parsed once."""
+        if self._prompts is None:
+            self._prompts = []
+            if self.prompts_json:
+                try:
+                    self._prompts = json.loads(self.content[self.prompts_json[0]:self.prompts_json[1]])
+                except json.JSONDecodeError:
+                    pass
+        return self._prompts
+
+    def replace_prompts(self, prompts):
+        """
+        Replaces the Generated Prompts section (and anything after it) with
+        the given prompts and returns the new content. The index is updated
+        in place: offsets before the prompts section are unchanged.
+        """
+        prompts_json = json.dumps(prompts, indent=2)
+        self._replace_section(f"```json\n{prompts_json}\n```", (len(PROMPTS_BLOCK_START), len(prompts_json)))
+        self._prompts = list(prompts)
+        return self.content
+
+    def replace_prompts_summary(self, summary):
+        """
+        Replaces the Generated Prompts section (and anything after it) with
+        a plain-text summary, for prompts kept in a prompt store.
+        """
+        self._replace_section(summary, None)
+        self._prompts = []
+        return self.content
+
+    def _replace_section(self, body, json_span):
+        prefix = self.content if self.prompts_start is None else self.content[:self.prompts_start]
+        stripped = prefix.strip()
+        self.content = f"{stripped}\n\n{PROMPTS_HEADING}\n\n{body}"
+
+        if len(stripped) != len(prefix.rstrip()):
+            # Leading whitespace was stripped, so every offset moved.
+            self._scan(self.content)
+            return
+
+        prompts_start = len(stripped) + 2
+        cutoff = self.prompts_start if self.prompts_start is not None else len(prefix)
+        self.headings = [h for h in self.headings if h[0] < cutoff]
+        self.headings.append((prompts_start, prompts_start + len(PROMPTS_HEADING), PROMPTS_HEADING))
+        self.task_items = [t for t in self.task_items if t[1] <= len(stripped)]
+        self.prompts_start = prompts_start
+        self.prompts_json = None
+        if json_span:
+            json_start = prompts_start + json_span[0]
+            self.prompts_json = (json_start, json_start + json_span[1])
+
+
 def parse_tasks_from_planning_md(content):
     """Parses tasks from the PLANNING.md content."""
-    try:
-        # Look for the "Remaining Tasks" section
-        tasks_section_match = re.search(r"### 📋 Remaining Tasks\n(.*?)(?=\n##|\Z)", content, re.DOTALL)
-        if not tasks_section_match:
-            return []
-
-        tasks_section = tasks_section_match.group(1)
-        tasks = []
-
-        # Regex to capture task descriptions from markdown lists
-        task_pattern = re.compile(r"^\s*(?:-|\*|\+)\s+(?:\*\*.*\*\*\s*-\s*)?(.*)", re.MULTILINE)
-
-        for match in task_pattern.finditer(tasks_section):
-            task_text = match.group(1).strip()
-            if task_text and '[x]' not in match.group(0): # Ignore completed tasks
-                tasks.append(task_text)
-        return tasks
-    except Exception:
-        return []
+    return PlanningIndex(content).tasks()
 
 def update_planning_md_with_prompts(content, prompts):
     """Updates the PLANNING.md content with generated prompts."""
-    prompts_json = json.dumps(prompts, indent=2)
-    new_prompts_section = f"## Generated Prompts\n\n```json\n{prompts_json}\n```"
-    # Remove any existing Generated Prompts section and everything after it
-    content_without_prompts = re.sub(r"## Generated Prompts[\s\S]*", "", content, flags=re.DOTALL).strip()
-    return f"{content_without_prompts}\n\n{new_prompts_section}"
+    return PlanningIndex(content).replace_prompts(prompts)
 
 def parse_prompts_from_planning_md(content):
     """Parses the generated prompts from the PLANNING.md content."""
-    try:
-        json_block_match = re.search(r"## Generated Prompts\n\n```json\n(.*?)\n```", content, re.DOTALL)
-        if json_block_match:
-            prompts_json = json_block_match.group(1)
-            return json.loads(prompts_json)
-        return []
-    except (json.JSONDecodeError):
-        return []
+    return PlanningIndex(content).prompts()
+
+def task_id(task):
+    """Returns a stable custom_id derived from the task text."""
+    return f"task_{hashlib.sha256(task.encode('utf-8')).hexdigest()[:16]}"
+
+def resolve_dependencies(specs):
+    """
+    Maps each task's `after` names to the custom_ids of the tasks with those
+    `[id: ...]` names (or exactly that description). Returns one list of
+    custom_ids per spec. Names that are not open tasks (unknown or already
+    completed) are logged and ignored.
+    """
+    by_name = {}
+    for spec in specs:
+        by_name[spec['task']] = task_id(spec['task'])
+        if spec.get('name'):
+            by_name[spec['name']] = task_id(spec['task'])
+    dependencies = []
+    for spec in specs:
+        depends_on = []
+        for name in spec.get('after', ()):
+            if name in by_name:
+                depends_on.append(by_name[name])
+            else:
+                logging.warning(f"Task '{spec['task']}' depends on '{name}', which is not an open task; ignoring it.")
+        dependencies.append(depends_on)
+    return dependencies
+
+def task_waves(prompts, done=()):
+    """
+    Topologically sorts prompts into waves: every prompt's `depends_on`
+    prerequisites are in an earlier wave or already `done`. Prerequisites
+    that are neither pending nor done are ignored. Raises DependencyError
+    if the remaining dependencies form a cycle.
+    """
+    pending = {prompt['custom_id']: prompt for prompt in prompts}
+    done = set(done)
+    waiting = {
+        custom_id: {dep for dep in prompt.get('depends_on', ()) if dep in pending and dep not in done}
+        for custom_id, prompt in pending.items()
+    }
+    waves = []
+    while waiting:
+        ready = [custom_id for custom_id, deps in waiting.items() if not deps]
+        if not ready:
+            raise DependencyError(f"Dependency cycle among tasks: {', '.join(sorted(waiting))}")
+        waves.append([pending[custom_id] for custom_id in ready])
+        for custom_id in ready:
+            del waiting[custom_id]
+        for deps in waiting.values():
+            deps.difference_update(ready)
+    return waves
+
+def merge_prompts(existing, prompts):
+    """
+    Diffs freshly generated prompts against the existing ones. Unchanged
+    prompts keep their status; added or changed prompts are marked pending.
+    Returns the merged prompts and the number that are not yet done.
+    """
+    existing_by_id = {p.get("custom_id"): p for p in existing}
+    merged = []
+    pending = 0
+    for prompt in prompts:
+        previous = existing_by_id.get(prompt["custom_id"])
+        if previous and previous.get("content") == prompt["content"]:
+            merged.append({**prompt, "status": previous.get("status", "pending")})
+        else:
+            merged.append({**prompt, "status": "pending"})
+        if merged[-1]["status"] != "done":
+            pending += 1
+    return merged, pending
@@ -0,0 +1,151 @@
+import asyncio
+import logging
+import random
+import time
+from src import config
+from src.metrics import metrics
+
+TERMINAL_STATUSES = ("ended", "failed")
+PERMANENT_ERRORS = frozenset({'invalid_request', 'authentication', 'permission', 'not_found'})
+
+
+class PollAbandoned(Exception):
+    """Raised for a batch whose status could not be polled; the batch itself may still finish."""
+
+
+class TrackedBatch:
+    """Polling state for one batch."""
+
+    def __init__(self, batch_id, future):
+        self.batch_id = batch_id
+        self.future = future
+        self.delay = config.POLL_INITIAL_DELAY
+        self.next_poll = time.monotonic()
+        self.errors = 0
+        self.last_done = None
+        self.last_seen = None
+        self.polls = 0
+
+
+class BatchPoller:
+    """
+    Polls many batches from a single asyncio task. The interval for each
+    batch is predicted from its `request_counts` progress, transient errors
+    are retried with jittered backoff (permanent ones, such as a missing
+    batch or bad credentials, give up at once), and callers are notified as each
+    batch finishes via `wait`, `as_completed` or `on_complete` callbacks.
+    """
+
+    def __init__(self, retrieve, on_complete=None):
+        self.retrieve = retrieve
+        self.on_complete = on_complete
+        self._batches = {}
+        self._task = None
+        self._wakeup = asyncio.Event()
+        self._completed = asyncio.Queue()
+
+    def track(self, batch_id):
+        """
+        Starts tracking a batch and returns a future resolved with the final
+        batch, None if the batch failed, or PollAbandoned if polling gave up.
+        """
+        if batch_id in self._batches:
+            return self._batches[batch_id].future
+        future = asyncio.get_running_loop().create_future()
+        self._batches[batch_id] = TrackedBatch(batch_id, future)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        self._wakeup.set()
+        return future
+
+    async def wait(self, batch_id):
+        """Waits for a batch to finish and returns it, or None if it failed. See `track`."""
+        return await self.track(batch_id)
+
+    async def as_completed(self):
+        """Yields (batch_id, batch) pairs as tracked batches finish."""
+        while self._batches or not self._completed.empty():
+            yield await self._completed.get()
+
+    async def _run(self):
+        while self._batches:
+            now = time.monotonic()
+            due = [tracked for tracked in self._batches.values() if tracked.next_poll <= now]
+            if due:
+                await asyncio.gather(*(self._poll(tracked) for tracked in due))
+                continue
+
+            timeout = min(tracked.next_poll for tracked in self._batches.values()) - now
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _poll(self, tracked):
+        tracked.polls += 1
+        try:
+            batch = await self.retrieve(tracked.batch_id)
+        except Exception as e:
+            # Imported here: src.retry imports the batching code that uses this module.
+            from src.retry import classify_error
+
+            tracked.errors += 1
+            error_type = classify_error(str(e))
+            if error_type in PERMANENT_ERRORS or tracked.errors > config.POLL_MAX_RETRIES:
+                logging.error(f"Giving up on batch {tracked.batch_id} after {tracked.errors} polling errors ({error_type}): {e}")
+                self._finish(tracked, None, PollAbandoned(f"Gave up polling batch {tracked.batch_id}: {e}"))
+                return
+            delay = min(config.POLL_INITIAL_DELAY * config.POLL_FACTOR ** tracked.errors, config.POLL_MAX_DELAY)
+            delay *= random.uniform(0.5, 1.5)
+            logging.warning(f"Error polling batch {tracked.batch_id} (attempt {tracked.errors}), retrying in {delay:.1f}s: {e}")
+            tracked.next_poll = time.monotonic() + delay
+            return
+
+        tracked.errors = 0
+        logging.info(f"Batch {batch.id} status: {batch.processing_status}")
+        if batch.processing_status == "ended":
+            logging.info(f"Batch {batch.id} completed successfully.")
+            self._finish(tracked, batch)
+        elif batch.processing_status == "failed":
+            logging.error(f"Batch {batch.id} failed. Error: {getattr(batch, 'error', 'N/A')}")
+            self._finish(tracked, None)
+        else:
+            tracked.next_poll = time.monotonic() + self._next_delay(tracked, batch)
+
+    def _next_delay(self, tracked, batch):
+        """
+        Predicts the time to completion from request_counts progress since the
+        last poll, falling back to exponential backoff when there is no signal.
+        """
+        now = time.monotonic()
+        counts = getattr(batch, 'request_counts', None)
+        processing = getattr(counts, 'processing', None)
+        done = sum(
+            value for value in (getattr(counts, key, None) for key in ('succeeded', 'errored', 'canceled', 'expired'))
+            if isinstance(value, int)
+        )
+
+        delay = None
+        if isinstance(processing, int) and tracked.last_done is not None and done > tracked.last_done:
+            rate = (done - tracked.last_done) / (now - tracked.last_seen)
+            delay = processing / rate
+        tracked.last_done = done
+        tracked.last_seen = now
+
+        if delay is None:
+            tracked.delay = min(tracked.delay * config.POLL_FACTOR, config.POLL_MAX_DELAY)
+            return tracked.delay
+        return min(max(delay, config.POLL_MIN_DELAY), config.POLL_MAX_DELAY)
+
+    def _finish(self, tracked, batch, error=None):
+        del self._batches[tracked.batch_id]
+        metrics.observe('batch_polls', tracked.polls)
+        if not tracked.future.done():
+            if error:
+                tracked.future.set_exception(error)
+            else:
+                tracked.future.set_result(batch)
+        self._completed.put_nowait((tracked.batch_id, batch))
+        if self.on_complete:
+            self.on_complete(tracked.batch_id, batch)
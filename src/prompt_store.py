@@ -0,0 +1,186 @@
+import json
+import os
+from src import config
+from src.metrics import metrics
+
+STATUSES = ("pending", "submitted", "done")
+
+
+def default_store_path(planning_file):
+    """Returns the prompt store path that sits next to the planning file."""
+    return os.path.join(os.path.dirname(planning_file), config.PROMPT_STORE_FILE)
+
+
+class PromptStore:
+    """
+    Append-only JSONL store of generated prompts with a sidecar offset index.
+    Each write appends a new record and the latest record for a custom_id
+    wins, so status updates never rewrite the file. The index maps custom_id
+    to the (offset, length) of its latest record for random access, and is
+    rebuilt from the data file whenever it is missing or out of date.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.index_path = f"{path}.idx"
+        self._index = None
+        self._records = 0
+
+    @property
+    def index(self):
+        if self._index is None:
+            self._load_index()
+        return self._index
+
+    def _data_size(self):
+        try:
+            return os.path.getsize(self.path)
+        except FileNotFoundError:
+            return 0
+
+    def _load_index(self):
+        self._index = {}
+        self._records = 0
+        end = 0
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    custom_id, offset, length, deleted = json.loads(line)
+                    self._apply(custom_id, offset, length, deleted)
+                    end = offset + length
+        except (FileNotFoundError, json.JSONDecodeError, ValueError):
+            end = -1
+        if end != self._data_size():
+            self._rebuild_index()
+
+    def _apply(self, custom_id, offset, length, deleted):
+        self._records += 1
+        if deleted:
+            self._index.pop(custom_id, None)
+        else:
+            self._index[custom_id] = (offset, length)
+
+    def _rebuild_index(self):
+        self._index = {}
+        self._records = 0
+        entries = []
+        offset = 0
+        try:
+            with open(self.path, 'rb') as f:
+                for line in f:
+                    record = json.loads(line)
+                    entry = (record['custom_id'], offset, len(line), bool(record.get('deleted')))
+                    entries.append(entry)
+                    self._apply(*entry)
+                    offset += len(line)
+        except FileNotFoundError:
+            pass
+        os.makedirs(os.path.dirname(self.index_path) or '.', exist_ok=True)
+        with open(self.index_path, 'w', encoding='utf-8') as f:
+            for entry in entries:
+                f.write(json.dumps(entry) + '\n')
+
+    def _append(self, records):
+        self.index  # Load or rebuild the index before appending to it
+        offset = start = self._data_size()
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with open(self.path, 'ab') as data, open(self.index_path, 'a', encoding='utf-8') as sidecar:
+            for record in records:
+                line = (json.dumps(record) + '\n').encode('utf-8')
+                data.write(line)
+                entry = (record['custom_id'], offset, len(line), bool(record.get('deleted')))
+                sidecar.write(json.dumps(entry) + '\n')
+                self._apply(*entry)
+                offset += len(line)
+        metrics.incr('bytes_written_total', offset - start, stage='prompt_store')
+
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, custom_id):
+        return custom_id in self.index
+
+    def _read(self, f, custom_id):
+        location = self.index.get(custom_id)
+        if location is None:
+            return None
+        f.seek(location[0])
+        return json.loads(f.read(location[1]))
+
+    def get(self, custom_id):
+        """Returns the latest record for a custom_id, or None."""
+        if custom_id not in self.index:
+            return None
+        with open(self.path, 'rb') as f:
+            return self._read(f, custom_id)
+
+    def iter_prompts(self, status=None):
+        """Streams the latest record of every prompt, optionally filtered by status."""
+        index = self.index
+        offset = 0
+        try:
+            with open(self.path, 'rb') as f:
+                for line in f:
+                    record_offset = offset
+                    offset += len(line)
+                    record = json.loads(line)
+                    if index.get(record['custom_id'], (None,))[0] != record_offset:
+                        continue
+                    if status is None or record.get('status', 'pending') == status:
+                        yield record
+        except FileNotFoundError:
+            return
+
+    def counts(self):
+        """Returns the number of prompts in each status."""
+        counts = dict.fromkeys(STATUSES, 0)
+        for record in self.iter_prompts():
+            status = record.get('status', 'pending')
+            counts[status] = counts.get(status, 0) + 1
+        return counts
+
+    def sync(self, prompts):
+        """
+        Makes the store match the given prompts, appending only prompts that
+        are new or differ from their stored record and tombstones for prompts
+        no longer present. Returns the number of records appended.
+        """
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        records = []
+        wanted = set()
+        with open(self.path, 'ab+') as f:
+            for prompt in prompts:
+                wanted.add(prompt['custom_id'])
+                if self._read(f, prompt['custom_id']) != prompt:
+                    records.append(prompt)
+        records += [{'custom_id': custom_id, 'deleted': True} for custom_id in list(self.index) if custom_id not in wanted]
+        if records:
+            self._append(records)
+        return len(records)
+
+    def set_status(self, custom_ids, status):
+        """Appends updated records with the new status for the given custom_ids."""
+        if not self.index:
+            return
+        records = []
+        with open(self.path, 'ab+') as f:
+            for custom_id in custom_ids:
+                record = self._read(f, custom_id)
+                if record and record.get('status') != status:
+                    records.append({**record, 'status': status})
+        if records:
+            self._append(records)
+
+    def compact(self):
+        """
+        Rewrites the store keeping only the latest record of each prompt, once
+        superseded records make up more than half of the file.
+        """
+        if self._records <= 2 * len(self.index):
+            return
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for record in self.iter_prompts():
+                f.write(json.dumps(record) + '\n')
+        os.replace(tmp_path, self.path)
+        self._rebuild_index()
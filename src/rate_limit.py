@@ -0,0 +1,65 @@
+import asyncio
+import random
+import time
+from datetime import datetime
+from src import config
+
+RATE_LIMIT_BUCKETS = ("requests", "tokens")
+
+
+def parse_reset(value):
+    """Parses an RFC 3339 rate-limit reset header into a Unix timestamp."""
+    try:
+        return datetime.fromisoformat(value.replace('Z', '+00:00')).timestamp()
+    except (AttributeError, ValueError):
+        return None
+
+
+def retry_delay(headers, attempt):
+    """Returns the server's retry-after delay, or a jittered exponential backoff."""
+    try:
+        return float(headers.get('retry-after'))
+    except (AttributeError, TypeError, ValueError):
+        delay = min(config.DIRECT_RETRY_INITIAL_DELAY * 2 ** attempt, config.DIRECT_RETRY_MAX_DELAY)
+        return delay * random.uniform(0.5, 1.5)
+
+
+class RateLimiter:
+    """
+    Token bucket fed by the `anthropic-ratelimit-*` response headers. Each
+    acquire spends one request from the last reported remaining budget and
+    waits for the reset time once a bucket is exhausted.
+    """
+
+    def __init__(self):
+        self.remaining = {}
+        self.reset_at = {}
+        self._lock = asyncio.Lock()
+
+    def update(self, headers):
+        """Refreshes the buckets from a response's rate-limit headers."""
+        if not headers:
+            return
+        for bucket in RATE_LIMIT_BUCKETS:
+            remaining = headers.get(f"anthropic-ratelimit-{bucket}-remaining")
+            reset = parse_reset(headers.get(f"anthropic-ratelimit-{bucket}-reset"))
+            if remaining is not None:
+                try:
+                    self.remaining[bucket] = int(remaining)
+                except ValueError:
+                    continue
+            if reset is not None:
+                self.reset_at[bucket] = reset
+
+    async def acquire(self):
+        """Waits until the rate limit allows another request."""
+        async with self._lock:
+            for bucket in RATE_LIMIT_BUCKETS:
+                if self.remaining.get(bucket, 1) > 0:
+                    continue
+                delay = self.reset_at.get(bucket, 0) - time.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                self.remaining.pop(bucket, None)
+            if 'requests' in self.remaining:
+                self.remaining['requests'] -= 1
@@ -0,0 +1,84 @@
+import logging
+from src import config
+from src.context import estimate_tokens
+
+SYSTEM_PROMPT = (
+    "You are an expert Python developer. Implement complete, production-ready code with error handling, "
+    "documentation, and tests."
+)
+PROJECT_CONTEXT = "CONTEXT: Complete the following task for the `claude-code-automated` project."
+OUTPUT_FORMAT = (
+    "OUTPUT FORMAT: For each file you change, write a line with its path relative to the project root "
+    "(e.g., # src/main.py) followed by a fenced code block with the complete new content of the file. "
+    "To change only part of an existing file, give a unified diff in a ```diff block instead, with "
+    "--- a/<path> and +++ b/<path> headers and @@ hunks with three lines of context."
+)
+
+
+def prompt_content(task):
+    """Returns the full, self-contained prompt text for a task."""
+    return f"{PROJECT_CONTEXT}\nTASK: {task}\n{OUTPUT_FORMAT}"
+
+
+class RequestBuilder:
+    """
+    Builds Messages API requests from prompts. With prompt caching enabled,
+    everything the prompts share (system prompt, project context and output
+    format, and an optional repository digest) is moved into system blocks
+    ending in a `cache_control` breakpoint, so only the task text differs
+    between requests and the shared prefix is read from the prompt cache.
+    Prefixes shorter than `config.PROMPT_CACHE_MIN_TOKENS` cannot be cached
+    and get no breakpoint.
+    Source context packed by `plan` goes in the user message, after the prefix.
+    """
+
+    def __init__(self, prompt_caching=None, repo_digest=None, model=None, max_tokens=None):
+        self.prompt_caching = config.PROMPT_CACHING if prompt_caching is None else prompt_caching
+        self.repo_digest = repo_digest
+        self.model = model or config.MODEL_NAME
+        self.max_tokens = max_tokens or config.MAX_TOKENS
+        self.prefix_tokens = sum(estimate_tokens(block["text"]) for block in self._prefix_blocks())
+        self.cacheable = self.prefix_tokens >= config.PROMPT_CACHE_MIN_TOKENS
+        if self.prompt_caching and not self.cacheable:
+            logging.info(
+                f"Prompt caching is inactive: the shared prefix is about {self.prefix_tokens} tokens, "
+                f"under the {config.PROMPT_CACHE_MIN_TOKENS} token minimum (add a --repo-digest to reach it)."
+            )
+
+    def _prefix_blocks(self):
+        blocks = [{"type": "text", "text": SYSTEM_PROMPT}, {"type": "text", "text": f"{PROJECT_CONTEXT}\n{OUTPUT_FORMAT}"}]
+        if self.repo_digest:
+            blocks.append({"type": "text", "text": f"REPOSITORY DIGEST:\n{self.repo_digest}"})
+        return blocks
+
+    def system_blocks(self):
+        """
+        Returns the shared system blocks, with a cache breakpoint on the last
+        one when the prefix is long enough to be cached.
+        """
+        blocks = self._prefix_blocks()
+        if self.cacheable:
+            blocks[-1]["cache_control"] = {"type": "ephemeral"}
+        return blocks
+
+    def build(self, prompt, max_tokens=None):
+        """Builds the batch request for one prompt, optionally with its own max_tokens."""
+        if self.prompt_caching and prompt.get("task"):
+            system = self.system_blocks()
+            content = f"TASK: {prompt['task']}"
+        else:
+            system = SYSTEM_PROMPT
+            if self.repo_digest:
+                system = f"{SYSTEM_PROMPT}\n\nREPOSITORY DIGEST:\n{self.repo_digest}"
+            content = prompt["content"]
+        if prompt.get("context"):
+            content = f"RELEVANT FILES:\n{prompt['context']}\n\n{content}"
+        return {
+            "custom_id": prompt["custom_id"],
+            "params": {
+                "model": self.model,
+                "max_tokens": max_tokens or self.max_tokens,
+                "system": system,
+                "messages": [{"role": "user", "content": content}],
+            },
+        }
@@ -0,0 +1,261 @@
+import logging
+import os
+import re
+
+HEADER_PATTERN = re.compile(r"^(?:#+|File:|FILE:)\s*`?([\w./-]+)`?:?$")
+FENCE_PATTERN = re.compile(r"^(`{3,})\s*([\w+.-]*)\s*(.*)$")
+HUNK_PATTERN = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@")
+DIFF_LANGUAGES = ("diff", "patch", "udiff")
+
+
+def safe_target(source, path):
+    """
+    Returns `path` if it stays inside the project, or None (with a warning)
+    for absolute paths and paths that climb out of it with `..`.
+    """
+    if os.path.isabs(path) or re.match(r"^[A-Za-z]:[\\/]", path):
+        logging.warning(f"Skipping absolute path found in {source}: {path}")
+        return None
+    normalized = os.path.normpath(path)
+    if normalized == '.' or normalized == '..' or normalized.startswith('..' + os.sep):
+        logging.warning(f"Skipping path outside the project found in {source}: {path}")
+        return None
+    return path
+
+
+def _diff_path(header):
+    """Returns the path in a `--- a/path` or `+++ b/path` line, or None for /dev/null."""
+    path = header[4:].split('\t')[0].strip()
+    if path == '/dev/null':
+        return None
+    return path[2:] if path[:2] in ('a/', 'b/') else path
+
+
+def _header_path(line):
+    """Returns the path in a `# path` or `File: path` line, or None for other text."""
+    match = HEADER_PATTERN.match(line.strip())
+    if match and ('/' in match.group(1) or '.' in match.group(1)):
+        return match.group(1)
+    return None
+
+
+def _fence_path(info):
+    """Returns a path named in a fence info string (```python src/a.py), if any."""
+    for token in info.split():
+        if token.startswith(('path=', 'file=')):
+            token = token.split('=', 1)[1]
+        token = token.strip('`"\'')
+        if '/' in token or '.' in token:
+            return token
+    return None
+
+
+class ResponseParser:
+    """
+    Incremental parser for model responses, fed one line at a time so a
+    result never has to be held or split in memory. It understands:
+
+    - the single-file format: a `# path` first line, then the whole file
+      (unless a code block follows, which is then the file);
+    - fenced file blocks, each after a `# path` (or `File: path`) line,
+      with the path in the fence info string (```python src/a.py) or in a
+      `# path` comment on the block's first line;
+    - unified diffs for one or more files, bare or in a ```diff block.
+
+    Full-file changes carry 'content'; diff changes carry 'hunks', a tuple
+    of (old_start, old_lines, new_lines), and 'new_file'. Targets that are
+    absolute or leave the project are dropped.
+    """
+
+    def __init__(self, source):
+        self.source = source
+        self.state = 'start'
+        self.path = None
+        self.lines = []
+        self.fence = None
+        self.diff_fence = None
+        self.old_header = None
+        self.diff = None
+        self.hunk = None
+        self.found = 0
+
+    def _change(self, target, **fields):
+        if not target or not safe_target(self.source, target):
+            return []
+        self.found += 1
+        return [{'source': self.source, 'target': target, **fields}]
+
+    def _end_file(self):
+        changes = self._change(self.path, content=''.join(self.lines))
+        self.path, self.lines = None, []
+        return changes
+
+    def _end_hunk(self):
+        if self.hunk:
+            self.diff['hunks'].append((self.hunk['start'], tuple(self.hunk['old']), tuple(self.hunk['new'])))
+        self.hunk = None
+
+    def _end_diff(self):
+        self._end_hunk()
+        diff, self.diff = self.diff, None
+        if not diff or not diff['hunks']:
+            return []
+        if diff['target'] is None:
+            logging.warning(f"Skipping deletion of {diff['old']} in {self.source}")
+            return []
+        return self._change(diff['target'], hunks=tuple(diff['hunks']), new_file=diff['old'] is None)
+
+    def feed(self, line):
+        """Consumes one line (with its line ending) and returns the changes it completes."""
+        return getattr(self, f"_feed_{self.state}")(line)
+
+    def _feed_start(self, line):
+        stripped = line.strip()
+        if stripped.startswith('#') and _header_path(stripped):
+            # Wait for the next non-blank line to tell the single-file format
+            # from a header that introduces a code block or diff. Other
+            # openers, like a markdown heading, are read as text.
+            self.path = _header_path(stripped)
+            self.state = 'header'
+            return []
+        if stripped:
+            self.state = 'text'
+            return self._feed_text(line)
+        return []
+
+    def _feed_header(self, line):
+        if not line.strip():
+            self.lines.append(line)
+            return []
+        if FENCE_PATTERN.match(line.strip()) or line.startswith('--- '):
+            self.lines = []
+            self.state = 'text'
+            return self._feed_text(line)
+        self.lines.append(line)
+        self.state = 'single'
+        return []
+
+    def _feed_single(self, line):
+        if FENCE_PATTERN.match(line.strip()):
+            # Prose between the path line and a code block: the block is the file.
+            self.lines = []
+            self.state = 'text'
+            return self._feed_text(line)
+        self.lines.append(line)
+        return []
+
+    def _feed_fence(self, line):
+        # A block without a path may name it in a `# path` comment on its first line.
+        self.path = _header_path(line.strip())
+        if self.path:
+            self.state = 'file'
+            return []
+        self.state = 'skip'
+        return self._feed_skip(line)
+
+    def _feed_file(self, line):
+        if line.strip() == self.fence:
+            self.state = 'text'
+            return self._end_file()
+        self.lines.append(line)
+        return []
+
+    def _feed_skip(self, line):
+        if line.strip() == self.fence:
+            self.state = 'text'
+        return []
+
+    def _feed_text(self, line):
+        stripped = line.strip()
+        if self.old_header is not None:
+            old_header, self.old_header = self.old_header, None
+            if line.startswith('+++ '):
+                self.diff = {'old': _diff_path(old_header), 'target': _diff_path(line), 'hunks': []}
+                self.state = 'diff'
+                return []
+        if line.startswith('--- '):
+            self.old_header = line
+            return []
+        if self.diff_fence:
+            if stripped == self.diff_fence:
+                self.diff_fence = None
+            return []
+        fence = FENCE_PATTERN.match(stripped)
+        if fence:
+            marker, language, info = fence.groups()
+            if language in DIFF_LANGUAGES:
+                self.diff_fence, self.path = marker, None
+                return []
+            self.fence = marker
+            self.path = self.path or _fence_path(info) or _fence_path(language)
+            self.state = 'file' if self.path else 'fence'
+            return []
+        self.path = _header_path(stripped) or (self.path if not stripped else None)
+        return []
+
+    def _feed_diff(self, line):
+        hunk = self.hunk
+        marker = line[:1]
+        if hunk and (hunk['old_left'] > 0 or hunk['new_left'] > 0) and marker in (' ', '-', '+', '\n', '\r'):
+            text = line[1:] if marker in (' ', '-', '+') else line
+            hunk['last'] = marker
+            if marker != '+':
+                hunk['old'].append(text)
+                hunk['old_left'] -= 1
+            if marker != '-':
+                hunk['new'].append(text)
+                hunk['new_left'] -= 1
+            return []
+        if marker == '\\':
+            # "\ No newline at end of file" refers to the line before it.
+            if hunk:
+                keys = {'-': ('old',), '+': ('new',)}.get(hunk['last'], ('old', 'new'))
+                for key in keys:
+                    if hunk[key]:
+                        hunk[key][-1] = hunk[key][-1].rstrip('\r\n')
+            return []
+        match = HUNK_PATTERN.match(line)
+        if match:
+            self._end_hunk()
+            old_start, old_count, _, new_count = match.groups()
+            self.hunk = {
+                'start': int(old_start),
+                'old': [],
+                'new': [],
+                'old_left': 1 if old_count is None else int(old_count),
+                'new_left': 1 if new_count is None else int(new_count),
+                'last': None,
+            }
+            return []
+        changes = self._end_diff()
+        self.state = 'text'
+        return changes + self._feed_text(line)
+
+    def close(self):
+        """Ends the response and returns the changes still in progress."""
+        if self.state in ('header', 'single'):
+            if not self.path:
+                logging.warning(f"Could not find target file path in {self.source}")
+                return []
+            return self._end_file()
+        if self.state == 'diff':
+            return self._end_diff()
+        if self.state == 'file':
+            logging.warning(f"Unterminated code block for {self.path} in {self.source}")
+            return self._end_file()
+        if self.state == 'start':
+            logging.warning(f"Result file is empty: {self.source}")
+        elif not self.found:
+            logging.warning(f"Could not find target file path in {self.source}")
+        return []
+
+
+def parse_response(source, lines):
+    """
+    Yields every change in a response from an iterable of lines, such as an
+    open result file, as soon as each one is complete.
+    """
+    parser = ResponseParser(source)
+    for line in lines:
+        yield from parser.feed(line)
+    yield from parser.close()
@@ -0,0 +1,258 @@
+import gzip
+import json
+import os
+import threading
+from src import config
+from src.file_utils import read_file, write_batch_result
+from src.metrics import metrics
+
+INDEX_FILE = "results.idx"
+SEGMENT_PREFIX = "results-"
+COMPRESSION_SUFFIXES = {None: ".jsonl", "gzip": ".jsonl.gz", "zstd": ".jsonl.zst"}
+USAGE_KEYS = ("input_tokens", "output_tokens", "cache_creation_input_tokens", "cache_read_input_tokens")
+
+
+def _codec(compression):
+    """Returns (compress, decompress) functions for one record, or None for plain JSONL."""
+    if compression is None:
+        return None
+    if compression == "gzip":
+        return gzip.compress, gzip.decompress
+    if compression == "zstd":
+        try:
+            import zstandard
+        except ImportError:
+            raise ValueError("zstd result compression needs the 'zstandard' package.") from None
+        return zstandard.ZstdCompressor().compress, zstandard.ZstdDecompressor().decompress
+    raise ValueError(f"Unknown result compression: {compression}")
+
+
+def usage_dict(usage):
+    """Converts SDK usage objects (or dicts) into a plain dict of token counts."""
+    if usage is None:
+        return None
+    if isinstance(usage, dict):
+        return {key: usage[key] for key in USAGE_KEYS if isinstance(usage.get(key), int)}
+    return {key: getattr(usage, key) for key in USAGE_KEYS if isinstance(getattr(usage, key, None), int)}
+
+
+def result_record(result):
+    """Returns the JSON-serializable record stored for a result."""
+    record = {'custom_id': result.get('custom_id', 'unknown_id'), 'status': result['status']}
+    if result['status'] == 'succeeded':
+        record['content'] = result.get('content', '')
+        record['usage'] = usage_dict(result.get('usage'))
+        record['stop_reason'] = result.get('stop_reason')
+    else:
+        record['error'] = result.get('error')
+        record['error_type'] = result.get('error_type')
+    return record
+
+
+class ResultDirectory:
+    """
+    Result sink for the one-file-per-item layout: `succeeded/<custom_id>.txt`
+    and `failed/<custom_id>.json`. A success removes any earlier failure
+    file for the same item.
+    """
+
+    def __init__(self, output_dir):
+        self.output_dir = output_dir
+
+    def write(self, result):
+        write_batch_result(result, self.output_dir, result['status'])
+        if result['status'] == 'succeeded':
+            failed_path = os.path.join(self.output_dir, 'failed', f"{result.get('custom_id', 'unknown_id')}.json")
+            if os.path.exists(failed_path):
+                os.remove(failed_path)
+
+    def get(self, custom_id):
+        """Returns the latest result written for a custom_id, or None."""
+        succeeded_path = os.path.join(self.output_dir, 'succeeded', f"{custom_id}.txt")
+        if os.path.exists(succeeded_path):
+            return {'custom_id': custom_id, 'status': 'succeeded', 'content': read_file(succeeded_path)}
+        if os.path.exists(os.path.join(self.output_dir, 'failed', f"{custom_id}.json")):
+            return {'custom_id': custom_id, 'status': 'failed'}
+        return None
+
+    def close(self):
+        pass
+
+
+def result_sink(output):
+    """Returns `output` if it is already a result sink, or a ResultDirectory for a path."""
+    return output if hasattr(output, 'write') else ResultDirectory(output)
+
+
+class ResultStore:
+    """
+    Consolidated result store: append-only JSONL segments in the output
+    directory with a sidecar index mapping custom_id to the segment, offset
+    and length of its latest record, plus its output tokens and stop reason
+    so usage history can be read without decoding records. Records keep content, usage, stop
+    reason and structured errors, and may be compressed one record at a
+    time (gzip, or zstd if installed) so they stay randomly accessible.
+    A later record for the same custom_id (e.g. a successful retry)
+    supersedes the earlier one. Writes are thread-safe.
+    """
+
+    def __init__(self, output_dir, compression=None, segment_max_bytes=None):
+        self.output_dir = output_dir
+        self.index_path = os.path.join(output_dir, INDEX_FILE)
+        self.segment_max_bytes = segment_max_bytes or config.RESULT_SEGMENT_MAX_BYTES
+        self._lock = threading.Lock()
+        self._index = None
+        self._segment = None
+        self._handle = None
+        self._index_handle = None
+        self.compression = compression
+        self._codec = _codec(compression)
+
+    @staticmethod
+    def exists(output_dir):
+        return os.path.exists(os.path.join(output_dir, INDEX_FILE))
+
+    @property
+    def index(self):
+        if self._index is None:
+            self._index = {}
+            try:
+                with open(self.index_path, 'r', encoding='utf-8') as f:
+                    for line in f:
+                        try:
+                            custom_id, status, segment, offset, length, *output = json.loads(line)
+                        except (json.JSONDecodeError, ValueError):
+                            continue  # A line torn by an interrupted write
+                        # Entries written by older versions lack output_tokens and stop_reason.
+                        output_tokens, stop_reason = (output + [None, None])[:2]
+                        self._index[custom_id] = (status, segment, offset, length, output_tokens, stop_reason)
+            except FileNotFoundError:
+                pass
+        return self._index
+
+    def __len__(self):
+        return len(self.index)
+
+    def _segments(self):
+        try:
+            names = os.listdir(self.output_dir)
+        except FileNotFoundError:
+            return []
+        return sorted(name for name in names if name.startswith(SEGMENT_PREFIX))
+
+    def _open_segment(self):
+        """Opens the segment to append to, starting a new one when the current one is full."""
+        if self._handle and self._handle.tell() < self.segment_max_bytes:
+            return
+        if self._handle:
+            self._handle.close()
+        os.makedirs(self.output_dir, exist_ok=True)
+        segments = self._segments()
+        suffix = COMPRESSION_SUFFIXES[self.compression]
+        last = segments[-1] if segments else None
+        if last and last.endswith(suffix) and os.path.getsize(os.path.join(self.output_dir, last)) < self.segment_max_bytes:
+            self._segment = last
+        else:
+            self._segment = f"{SEGMENT_PREFIX}{len(segments):05d}{suffix}"
+        self._handle = open(os.path.join(self.output_dir, self._segment), 'ab')
+        if self._index_handle is None:
+            self._index_handle = open(self.index_path, 'a+', encoding='utf-8')
+            if self._index_handle.tell():
+                # End a torn last line so the next entry starts on its own line.
+                self._index_handle.seek(self._index_handle.tell() - 1)
+                if self._index_handle.read(1) != '\n':
+                    self._index_handle.write('\n')
+
+    def write(self, result):
+        """Appends a result and points the index at it."""
+        record = result_record(result)
+        data = (json.dumps(record, default=str) + '\n').encode('utf-8')
+        if self._codec:
+            data = self._codec[0](data)
+        with self._lock:
+            self.index  # Load the index before appending to it
+            self._open_segment()
+            offset = self._handle.tell()
+            self._handle.write(data)
+            self._handle.flush()
+            output_tokens = (record.get('usage') or {}).get('output_tokens')
+            entry = (
+                record['custom_id'], record['status'], self._segment, offset, len(data),
+                output_tokens, record.get('stop_reason'),
+            )
+            self._index_handle.write(json.dumps(entry) + '\n')
+            self._index_handle.flush()
+            self._index[record['custom_id']] = entry[1:]
+        metrics.incr('bytes_written_total', len(data), stage='results')
+
+    def close(self):
+        with self._lock:
+            for handle in (self._handle, self._index_handle):
+                if handle:
+                    handle.close()
+            self._handle = self._index_handle = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _decode(self, segment, data):
+        if segment.endswith('.gz'):
+            data = gzip.decompress(data)
+        elif segment.endswith('.zst'):
+            data = _codec('zstd')[1](data)
+        return json.loads(data)
+
+    def get(self, custom_id):
+        """Returns the latest record for a custom_id, or None."""
+        entry = self.index.get(custom_id)
+        if entry is None:
+            return None
+        _, segment, offset, length, _, _ = entry
+        with open(os.path.join(self.output_dir, segment), 'rb') as f:
+            f.seek(offset)
+            return self._decode(segment, f.read(length))
+
+    def iter_results(self, status=None):
+        """
+        Streams the latest record of every result, optionally filtered by
+        status, reading each segment once in file order.
+        """
+        by_segment = {}
+        for custom_id, (record_status, segment, offset, length, _, _) in self.index.items():
+            if status is None or record_status == status:
+                by_segment.setdefault(segment, []).append((offset, length))
+        for segment in sorted(by_segment):
+            with open(os.path.join(self.output_dir, segment), 'rb') as f:
+                for offset, length in sorted(by_segment[segment]):
+                    f.seek(offset)
+                    yield self._decode(segment, f.read(length))
+
+    def output_usage(self):
+        """
+        Returns custom_id -> (output_tokens, stop_reason) for the latest
+        succeeded results, read from the index without decoding records
+        (except those indexed by older versions, which lack the fields).
+        """
+        usage = {}
+        for custom_id, (status, _, _, _, output_tokens, stop_reason) in self.index.items():
+            if status != 'succeeded':
+                continue
+            if output_tokens is None:
+                record = self.get(custom_id)
+                output_tokens = (record.get('usage') or {}).get('output_tokens')
+                stop_reason = record.get('stop_reason')
+            if output_tokens:
+                usage[custom_id] = (output_tokens, stop_reason)
+        return usage
+
+    def export(self, output_dir):
+        """Writes every latest result in the one-file-per-item layout. Returns the count."""
+        directory = ResultDirectory(output_dir)
+        count = 0
+        for record in self.iter_results():
+            directory.write(record)
+            count += 1
+        return count
@@ -0,0 +1,119 @@
+import asyncio
+import logging
+import random
+import re
+from src import config
+from src.batching import run_batches
+from src.metrics import metrics
+
+ERROR_TYPES = {
+    'rate_limit_error': 'rate_limit',
+    'overloaded_error': 'overloaded',
+    'api_error': 'api_error',
+    'timeout_error': 'api_error',
+    'invalid_request_error': 'invalid_request',
+    'request_too_large': 'invalid_request',
+    'authentication_error': 'authentication',
+    'permission_error': 'permission',
+    'not_found_error': 'not_found',
+}
+STATUS_CODES = {
+    400: 'invalid_request',
+    401: 'authentication',
+    403: 'permission',
+    404: 'not_found',
+    413: 'invalid_request',
+    429: 'rate_limit',
+    500: 'api_error',
+    502: 'api_error',
+    503: 'api_error',
+    504: 'api_error',
+    529: 'overloaded',
+}
+RETRYABLE = frozenset({'rate_limit', 'overloaded', 'api_error', 'expired', 'batch_failed', 'results_incomplete'})
+STATUS_CODE_PATTERN = re.compile(r"Error code: (\d{3})")
+
+
+def _error_type(error):
+    """Returns the innermost API error type in a (possibly nested) error dict."""
+    found = None
+    while isinstance(error, dict):
+        if error.get('type') and error['type'] != 'error':
+            found = error['type']
+        error = error.get('error')
+    return found
+
+
+def classify_error(error, result_type=None):
+    """
+    Classifies a failed result's error as rate_limit, overloaded, api_error,
+    expired, canceled, invalid_request, authentication, permission,
+    not_found or unknown. Accepts structured error dicts, SDK error strings
+    such as "Error code: 529 - ..." and batch result types.
+    """
+    if result_type in ('expired', 'canceled'):
+        return result_type
+    error_type = _error_type(error)
+    if error_type:
+        return ERROR_TYPES.get(error_type, error_type if error_type in RETRYABLE else 'unknown')
+    text = str(error)
+    for name, label in ERROR_TYPES.items():
+        if name in text:
+            return label
+    match = STATUS_CODE_PATTERN.search(text)
+    if match:
+        return STATUS_CODES.get(int(match.group(1)), 'unknown')
+    if 'Connection error' in text or 'timed out' in text:
+        return 'api_error'
+    return 'unknown'
+
+
+def is_retryable(failure):
+    """Returns whether a summary failure is worth resubmitting."""
+    return (failure.get('error_type') or classify_error(failure.get('error'))) in RETRYABLE
+
+
+def retry_backoff(attempt):
+    """Returns the jittered delay before retry round `attempt` (starting at 1)."""
+    delay = min(config.RETRY_INITIAL_DELAY * 2 ** (attempt - 1), config.RETRY_MAX_DELAY)
+    return delay * random.uniform(0.5, 1.5)
+
+
+async def retry_failures(provider, requests, summary, output, max_attempts=None, on_result=None, **run_options):
+    """
+    Resubmits only the retryable failures in `summary` in follow-up batches,
+    with jittered backoff between rounds, for at most `max_attempts` rounds.
+    Results go to `output` like in `run_batches`, where they supersede the
+    earlier failures. Returns the summary with the retried items' outcomes
+    folded in.
+    """
+    max_attempts = config.RETRY_MAX_ATTEMPTS if max_attempts is None else max_attempts
+    by_id = {request['custom_id']: request for request in requests}
+
+    for attempt in range(1, max_attempts + 1):
+        retryable = [f for f in summary['failures'] if f['custom_id'] in by_id and is_retryable(f)]
+        if not retryable:
+            break
+        classes = {}
+        for failure in retryable:
+            error_type = failure.get('error_type') or classify_error(failure.get('error'))
+            classes[error_type] = classes.get(error_type, 0) + 1
+        delay = retry_backoff(attempt)
+        logging.info(
+            f"Retrying {len(retryable)} of {summary['failed']} failed requests "
+            f"(attempt {attempt}/{max_attempts}, {classes}) in {delay:.1f}s."
+        )
+        metrics.incr('retried_requests_total', len(retryable))
+        await asyncio.sleep(delay)
+
+        retry_ids = {failure['custom_id'] for failure in retryable}
+        retried = await run_batches(
+            provider, [by_id[custom_id] for custom_id in retry_ids], output, on_result=on_result, **run_options
+        )
+
+        summary['succeeded'] += retried['succeeded']
+        summary['failed'] += retried['failed'] - len(retry_ids)
+        summary['failures'] = [f for f in summary['failures'] if f['custom_id'] not in retry_ids] + retried['failures']
+        for key, value in retried['usage'].items():
+            summary['usage'][key] = summary['usage'].get(key, 0) + value
+    return summary
@@ -0,0 +1,171 @@
+import asyncio
+import json
+import logging
+import time
+from src import config
+from src.context import estimate_tokens
+from src.llm_providers import InProcessBatchProvider
+from src.metrics import metrics
+
+
+class Route:
+    """
+    One provider (optionally pinned to a model) that the router can send
+    requests to, with its concurrency limit (the most requests it runs at
+    once, across every batch the router is running), cost per million
+    input and output tokens, and a smoothed estimate of its latency per
+    request.
+    """
+
+    def __init__(self, name, provider, concurrency=None, input_cost=0.0, output_cost=0.0, model=None, latency=None):
+        self.name = name
+        self.provider = provider
+        self.concurrency = concurrency or 1
+        self.in_flight = 0
+        self._slots = asyncio.Condition()
+        self.input_cost = input_cost
+        self.output_cost = output_cost
+        self.model = model
+        self.latency = latency or config.ROUTER_INITIAL_LATENCY
+        self.load = 0
+
+    def cost(self, input_tokens, output_tokens):
+        """Returns the estimated cost of a request in dollars."""
+        return (input_tokens * self.input_cost + output_tokens * self.output_cost) / 1_000_000
+
+    def expected_seconds(self):
+        """Returns the expected time to finish one more request given the current load."""
+        return self.latency * (self.load + 1) / self.concurrency
+
+    async def acquire(self, wanted):
+        """Waits until the route has a free request slot and takes up to `wanted` of them."""
+        async with self._slots:
+            await self._slots.wait_for(lambda: self.in_flight < self.concurrency)
+            taken = min(wanted, self.concurrency - self.in_flight)
+            self.in_flight += taken
+            return taken
+
+    async def release(self, count):
+        """Frees request slots taken by `acquire`."""
+        async with self._slots:
+            self.in_flight -= count
+            self._slots.notify_all()
+
+    def observe(self, seconds, count):
+        """Folds the per-request latency of a finished sub-batch into the estimate."""
+        sample = seconds / max(count, 1)
+        self.latency += config.ROUTER_LATENCY_SMOOTHING * (sample - self.latency)
+
+
+class ProviderRouter(InProcessBatchProvider):
+    """
+    Spreads each batch across several routes and exposes the combined result
+    through the usual batch interface. Every request goes to the route with
+    the lowest expected completion time plus `cost_weight` seconds per dollar
+    of estimated cost; items that fail are resubmitted to a route they have
+    not tried yet, up to `max_failovers` times.
+    """
+
+    batch_prefix = "routed"
+
+    def __init__(self, routes, cost_weight=None, max_failovers=None):
+        super().__init__()
+        if not routes:
+            raise ValueError("ProviderRouter needs at least one route.")
+        self.routes = routes
+        self.cost_weight = config.ROUTER_COST_WEIGHT if cost_weight is None else cost_weight
+        self.max_failovers = config.ROUTER_MAX_FAILOVERS if max_failovers is None else max_failovers
+
+    def choose(self, input_tokens, output_tokens, exclude=()):
+        """Returns the best route not in `exclude`, or None if every route has been tried."""
+        candidates = [route for route in self.routes if route.name not in exclude]
+        if not candidates:
+            return None
+        return min(
+            candidates,
+            key=lambda route: route.expected_seconds() + self.cost_weight * route.cost(input_tokens, output_tokens),
+        )
+
+    def assign(self, requests, tried):
+        """Groups requests by the route chosen for each, counting them towards its load."""
+        groups = {}
+        for request in requests:
+            params = request.get('params', {})
+            route = self.choose(
+                estimate_tokens(json.dumps(params)), params.get('max_tokens', 0), tried.get(request['custom_id'], ())
+            )
+            if route is None:
+                continue
+            route.load += 1
+            groups.setdefault(route.name, (route, []))[1].append(request)
+        return list(groups.values())
+
+    async def _run(self, requests):
+        by_id = {request['custom_id']: request for request in requests}
+        tried = {}
+        results = {}
+        pending = requests
+        while pending:
+            groups = self.assign(pending, tried)
+            outcomes = await asyncio.gather(*(self._dispatch(route, group) for route, group in groups))
+            pending = []
+            for (route, _), route_results in zip(groups, outcomes):
+                for result in route_results:
+                    custom_id = result['custom_id']
+                    tried.setdefault(custom_id, set()).add(route.name)
+                    results[custom_id] = result
+                    if result['status'] == 'failed' and len(tried[custom_id]) <= self.max_failovers:
+                        pending.append(by_id[custom_id])
+            if pending:
+                metrics.incr('router_failovers_total', len(pending))
+                logging.warning(f"Failing over {len(pending)} failed request(s) to another provider.")
+        return list(results.values())
+
+    async def _dispatch(self, route, requests):
+        """
+        Runs a route's share of a batch as sub-batches sized to its free
+        request slots, so it never has more than `concurrency` requests in
+        flight. Returns a result for every request.
+        """
+        if route.model:
+            requests = [{**request, 'params': {**request['params'], 'model': route.model}} for request in requests]
+        chunks = []
+        remaining = requests
+        while remaining:
+            taken = await route.acquire(len(remaining))
+            chunk, remaining = remaining[:taken], remaining[taken:]
+            chunks.append(asyncio.ensure_future(self._run_sub_batch(route, chunk)))
+        outcomes = await asyncio.gather(*chunks)
+        return [result for results in outcomes for result in results]
+
+    async def _run_sub_batch(self, route, requests):
+        """Runs one sub-batch on a route, whose slots it holds, and returns a result for every request in it."""
+        results = []
+        start = time.perf_counter()
+        try:
+            batch = await route.provider.create_batch(requests=requests)
+            completed = await route.provider.poll_batch(batch.id)
+            if completed:
+                results = [result async for result in route.provider.iter_batch_results(completed.id)]
+        except Exception as e:
+            logging.error(f"Provider {route.name} failed a batch of {len(requests)} requests: {e}")
+        finally:
+            route.load -= len(requests)
+            await route.release(len(requests))
+        elapsed = time.perf_counter() - start
+        route.observe(elapsed, len(requests))
+        metrics.incr('router_requests_total', len(requests), route=route.name)
+        metrics.observe('router_batch_seconds', elapsed, route=route.name)
+
+        returned = {result['custom_id'] for result in results}
+        results += [
+            {
+                'status': 'failed',
+                'custom_id': request['custom_id'],
+                'error': f"No result from provider {route.name}",
+                'error_type': 'results_incomplete',
+            }
+            for request in requests
+            if request['custom_id'] not in returned
+        ]
+        return results
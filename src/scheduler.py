@@ -0,0 +1,103 @@
+import asyncio
+import logging
+from src.planning import task_waves
+
+
+def prerequisites(prompts):
+    """Returns the custom_ids that some prompt depends on."""
+    return {dep for prompt in prompts for dep in prompt.get('depends_on', ())}
+
+
+def dependents(prompts, custom_ids):
+    """Returns the custom_ids of the prompts that depend on `custom_ids`, directly or not."""
+    found = set()
+    frontier = set(custom_ids)
+    while frontier:
+        frontier = {
+            prompt['custom_id'] for prompt in prompts
+            if prompt['custom_id'] not in found and frontier.intersection(prompt.get('depends_on', ()))
+        }
+        found |= frontier
+    return found
+
+
+def branches(prompts):
+    """
+    Maps each custom_id to the branch (connected component of the dependency
+    graph) it belongs to. Tasks without dependencies or dependents share the
+    branch None, so they are submitted together.
+    """
+    parent = {prompt['custom_id']: prompt['custom_id'] for prompt in prompts}
+
+    def find(custom_id):
+        while parent[custom_id] != custom_id:
+            parent[custom_id] = parent[parent[custom_id]]
+            custom_id = parent[custom_id]
+        return custom_id
+
+    linked = set()
+    for prompt in prompts:
+        for dep in prompt.get('depends_on', ()):
+            if dep in parent:
+                parent[find(dep)] = find(prompt['custom_id'])
+                linked.update((dep, prompt['custom_id']))
+    return {custom_id: find(custom_id) if custom_id in linked else None for custom_id in parent}
+
+
+async def run_dependency_waves(prompts, run_wave, apply_results=None, done=()):
+    """
+    Runs prompts in dependency order, as many groups at once as the graph
+    allows. A prompt is submitted as soon as all of its prerequisites have
+    succeeded and been applied with `apply_results` (called in a thread
+    with their custom_ids). Each branch of the dependency graph is submitted
+    separately, so independent branches run concurrently instead of waiting
+    for each other's waves.
+
+    `run_wave(prompts)` submits one group and returns its summary. Returns
+    the summaries and the prompts left blocked by a failed prerequisite.
+    """
+    task_waves(prompts, done)  # Fail early on cycles
+    pending = {prompt['custom_id'] for prompt in prompts}
+    needed = prerequisites(prompts) & pending
+    branch_of = branches(prompts)
+    satisfied = set(done)
+    waiting = list(prompts)
+    running = set()
+    summaries = []
+
+    async def run(group):
+        summary = await run_wave(group)
+        failed = {failure['custom_id'] for failure in summary['failures']}
+        succeeded = {prompt['custom_id'] for prompt in group} - failed
+        to_apply = sorted(succeeded & needed)
+        if to_apply and apply_results:
+            try:
+                await asyncio.to_thread(apply_results, to_apply)
+            except Exception as e:
+                logging.error(f"Could not apply prerequisite results, blocking their dependents: {e}")
+                succeeded -= set(to_apply)
+        return summary, succeeded
+
+    def launch():
+        groups = {}
+        for prompt in list(waiting):
+            if all(dep in satisfied or dep not in pending for dep in prompt.get('depends_on', ())):
+                waiting.remove(prompt)
+                groups.setdefault(branch_of[prompt['custom_id']], []).append(prompt)
+        for group in groups.values():
+            logging.info(f"Submitting {len(group)} task(s) whose prerequisites are complete.")
+            running.add(asyncio.ensure_future(run(group)))
+
+    launch()
+    while running:
+        finished, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+        for task in finished:
+            running.discard(task)
+            summary, succeeded = task.result()
+            summaries.append(summary)
+            satisfied.update(succeeded)
+        launch()
+
+    if waiting:
+        logging.warning(f"{len(waiting)} task(s) were not submitted because a prerequisite failed.")
+    return summaries, waiting
@@ -6,7 +6,6 @@ def mock_anthropic_client():
     """Fixture for mocking the Anthropic client."""
     mock_client = MagicMock()
     mock_client.messages.batches.retrieve = AsyncMock()
-    mock_client.messages.batches.results = MagicMock()
 
     # Mocking the async iterator for results
     async def async_iterator_mock(batch_id):
@@ -28,5 +27,5 @@ def mock_anthropic_client():
             )
         )
 
-    mock_client.messages.batches.results.side_effect = async_iterator_mock
+    mock_client.messages.batches.results = AsyncMock(side_effect=async_iterator_mock)
     return mock_client
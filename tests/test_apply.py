@@ -0,0 +1,133 @@
+import os
+import pytest
+from unittest.mock import patch
+from src.apply import (
+    ApplyError, PatchError, apply_changes, apply_patch, change_digest, group_by_target, load_changes, parse_result,
+    resolve_patches, scan_results, scan_store
+)
+from src.result_store import ResultStore
+
+def change(source, target, content):
+    return {'source': source, 'target': target, 'content': content}
+
+def test_parse_result():
+    assert parse_result('r.txt', '# src/a.py\nline 1\nline 2') == change('r.txt', 'src/a.py', 'line 1\nline 2')
+    assert parse_result('r.txt', 'no header') is None
+    assert parse_result('r.txt', '# /etc/passwd\nx') is None
+    assert parse_result('r.txt', '') is None
+
+def test_scan_results(tmp_path):
+    (tmp_path / "a.txt").write_text('# a.py\nA')
+    (tmp_path / "b.txt").write_text('nothing')
+    (tmp_path / "c.json").write_text('{}')
+    assert scan_results(str(tmp_path)) == [change('a.txt', 'a.py', 'A')]
+
+def test_scan_results_multi_file(tmp_path):
+    (tmp_path / "a.txt").write_text('# a.py\n```\nA\n```\n# b.py\n```\nB\n```\n')
+    assert scan_results(str(tmp_path)) == [change('a.txt', 'a.py', 'A\n'), change('a.txt', 'b.py', 'B\n')]
+
+def test_scan_store_keeps_only_digests_until_loaded(tmp_path):
+    with ResultStore(str(tmp_path)) as store:
+        store.write({'status': 'succeeded', 'custom_id': '1', 'content': '# a.py\n```\nA\n```\n# b.py\n```\nB\n```\n'})
+        store.write({'status': 'succeeded', 'custom_id': '2', 'content': '# a.py\nOTHER'})
+
+    store = ResultStore(str(tmp_path))
+    changes = scan_store(store)
+    assert changes[0] == {'source': '1', 'target': 'a.py', 'digest': change_digest(change('1', 'a.py', 'A\n'))}
+    assert all('content' not in c for c in changes)
+    to_apply, conflicts = group_by_target(changes)
+    assert conflicts == {'a.py': ['1', '2']}
+    assert list(load_changes(store, to_apply)) == [change('1', 'b.py', 'B\n')]
+
+def test_group_by_target_detects_conflicts():
+    changes = [
+        change('1.txt', 'src/a.py', 'A'),
+        change('2.txt', './src/a.py', 'B'),
+        change('3.txt', 'b.py', 'same'),
+        change('4.txt', 'b.py', 'same'),
+    ]
+    to_apply, conflicts = group_by_target(changes)
+    assert conflicts == {os.path.normpath('src/a.py'): ['1.txt', '2.txt']}
+    assert to_apply == [change('3.txt', 'b.py', 'same')]
+
+def test_apply_changes(tmp_path):
+    (tmp_path / "old.py").write_text("old")
+    applied = apply_changes([change('1', 'old.py', 'new'), change('2', 'pkg/new.py', 'created')], str(tmp_path))
+    assert len(applied) == 2
+    assert (tmp_path / "old.py").read_text() == "new"
+    assert (tmp_path / "pkg" / "new.py").read_text() == "created"
+    assert sorted(os.listdir(tmp_path)) == ["old.py", "pkg"]
+
+def test_apply_changes_creates_files_without_touching_the_umask(tmp_path):
+    with patch('src.apply.os.umask') as umask:
+        apply_changes([change('1', 'new.py', 'created')], str(tmp_path))
+    umask.assert_not_called()
+    current = os.umask(0)
+    os.umask(current)
+    assert os.stat(tmp_path / "new.py").st_mode & 0o777 == 0o666 & ~current
+
+def test_apply_changes_streams_and_cleans_up_when_the_source_fails(tmp_path):
+    (tmp_path / "a.py").write_text("original")
+
+    def changes():
+        yield change('1', 'a.py', 'changed')
+        yield change('2', 'b.py', 'new')
+        raise OSError("store unreadable")
+
+    with pytest.raises(ApplyError):
+        apply_changes(changes(), str(tmp_path))
+    assert (tmp_path / "a.py").read_text() == "original"
+    assert sorted(os.listdir(tmp_path)) == ["a.py"]
+
+def test_apply_changes_rolls_back_on_failure(tmp_path):
+    (tmp_path / "a.py").write_text("original")
+    real_replace = os.replace
+    calls = []
+
+    def failing_replace(src, dst):
+        calls.append(dst)
+        if dst.endswith("b.py"):
+            raise OSError("disk full")
+        return real_replace(src, dst)
+
+    with patch('src.apply.os.replace', side_effect=failing_replace):
+        with pytest.raises(ApplyError):
+            apply_changes([change('1', 'a.py', 'changed'), change('2', 'b.py', 'new')], str(tmp_path))
+
+    assert (tmp_path / "a.py").read_text() == "original"
+    assert sorted(os.listdir(tmp_path)) == ["a.py"]
+
+def test_apply_patch():
+    original = "a\nb\nc\nd\ne\n"
+    assert apply_patch(original, [(2, ('b\n', 'c\n'), ('b\n', 'C\n'))]) == "a\nb\nC\nd\ne\n"
+    # Drifted hunks are found near their stated position; pure insertions anchor after a line.
+    assert apply_patch("x\n" + original, [(4, ('d\n',), ('D\n',)), (5, (), ('f\n',))]) == "x\na\nb\nc\nD\ne\nf\n"
+    assert apply_patch("", [(0, (), ('new\n',))]) == "new\n"
+    with pytest.raises(PatchError):
+        apply_patch(original, [(1, ('missing\n',), ('x\n',))])
+
+def test_apply_patch_twice_is_a_no_op():
+    append = [(1, ('a\n', 'b\n', 'c\n'), ('a\n', 'b\n', 'c\n', 'X\n'))]
+    prepend = [(1, ('a\n', 'b\n'), ('import os\n', 'a\n', 'b\n'))]
+    insert = [(1, (), ('new\n',))]
+    for hunks, expected in ((append, "a\nb\nc\nX\n"), (prepend, "import os\na\nb\nc\n"), (insert, "a\nnew\nb\nc\n")):
+        once = apply_patch("a\nb\nc\n", hunks)
+        assert once == expected
+        assert apply_patch(once, hunks) == expected
+
+def test_apply_patch_deletes_lines_at_end_of_file():
+    hunks = [(1, ('a\n', 'b\n', 'c\n', 'd\n'), ('a\n', 'b\n', 'c\n'))]
+    assert apply_patch("a\nb\nc\nd\n", hunks) == "a\nb\nc\n"
+    assert apply_patch("a\nb\nc\n", hunks) == "a\nb\nc\n"
+
+def test_resolve_patches(tmp_path):
+    (tmp_path / "a.py").write_text("a\nb\n")
+    changes = [
+        change('1', 'full.py', 'full'),
+        {'source': '2', 'target': 'a.py', 'hunks': ((2, ('b\n',), ('B\n',)),), 'new_file': False},
+        {'source': '3', 'target': 'a.py', 'hunks': ((0, (), ('x\n',)),), 'new_file': True},
+        {'source': '4', 'target': 'missing.py', 'hunks': ((1, ('x\n',), ()),), 'new_file': False},
+    ]
+    resolved, rejected = resolve_patches(changes, str(tmp_path))
+    assert resolved == [change('1', 'full.py', 'full'), change('2', 'a.py', 'a\nB\n')]
+    assert rejected == ['3', '4']
@@ -0,0 +1,126 @@
+import pytest
+from unittest.mock import MagicMock, AsyncMock
+from src.batching import shard_requests, run_batches, stream_results_to_disk
+from src.journal import BatchJournal
+from src.poller import PollAbandoned
+from src.retry import is_retryable
+
+def results_iter(*results):
+    async def iterator():
+        for result in results:
+            yield result
+    return iterator()
+
+def make_request(custom_id, content="x"):
+    return {"custom_id": custom_id, "params": {"messages": [{"role": "user", "content": content}]}}
+
+def test_shard_requests_by_count():
+    requests = [make_request(str(i)) for i in range(5)]
+    shards = shard_requests(requests, max_requests=2)
+    assert [len(s) for s in shards] == [2, 2, 1]
+
+def test_shard_requests_by_bytes():
+    requests = [make_request(str(i), "a" * 100) for i in range(3)]
+    shards = shard_requests(requests, max_bytes=250)
+    assert [len(s) for s in shards] == [1, 1, 1]
+
+def test_shard_requests_oversized_request():
+    with pytest.raises(ValueError):
+        shard_requests([make_request("1", "a" * 100)], max_bytes=10)
+
+@pytest.mark.asyncio
+async def test_stream_results_to_disk(tmp_path):
+    summary = await stream_results_to_disk(results_iter(
+        {'status': 'succeeded', 'custom_id': 'a', 'content': 'ok', 'usage': MagicMock(input_tokens=3, output_tokens=5, cache_creation_input_tokens=None, cache_read_input_tokens=7)},
+        {'status': 'failed', 'custom_id': 'b', 'error': 'boom'},
+    ), str(tmp_path), queue_size=1)
+
+    assert (tmp_path / "succeeded" / "a.txt").read_text() == "ok"
+    assert (tmp_path / "failed" / "b.json").read_text() == "boom"
+    assert summary['succeeded'] == 1
+    assert summary['failed'] == 1
+    assert summary['failures'] == [{'custom_id': 'b', 'error': 'boom'}]
+    assert summary['usage'] == {
+        'input_tokens': 3, 'output_tokens': 5, 'cache_creation_input_tokens': 0, 'cache_read_input_tokens': 7
+    }
+
+@pytest.mark.asyncio
+async def test_run_batches_merges_results(tmp_path):
+    provider = MagicMock()
+    provider.create_batch = AsyncMock(side_effect=[MagicMock(id='b1'), MagicMock(id='b2')])
+    provider.poll_batch = AsyncMock(side_effect=lambda batch_id: MagicMock(id=batch_id))
+    provider.iter_batch_results = MagicMock(side_effect=[
+        results_iter({'status': 'succeeded', 'custom_id': '0', 'content': 'ok'}),
+        results_iter({'status': 'failed', 'custom_id': '1', 'error': 'boom'}),
+    ])
+
+    summary = await run_batches(provider, [make_request('0'), make_request('1')], str(tmp_path), max_requests=1)
+    assert provider.create_batch.call_count == 2
+    assert summary['succeeded'] == 1
+    assert [f['custom_id'] for f in summary['failures']] == ['1']
+    assert (tmp_path / "succeeded" / "0.txt").exists()
+
+@pytest.mark.asyncio
+async def test_run_batches_marks_failed_shard(tmp_path):
+    provider = MagicMock()
+    provider.create_batch = AsyncMock(return_value=MagicMock(id='b1'))
+    provider.poll_batch = AsyncMock(return_value=None)
+
+    summary = await run_batches(provider, [make_request('0'), make_request('1')], str(tmp_path))
+    assert summary['succeeded'] == 0
+    assert [f['custom_id'] for f in summary['failures']] == ['0', '1']
+    assert (tmp_path / "failed" / "1.json").exists()
+
+@pytest.mark.asyncio
+async def test_run_batches_leaves_abandoned_batch_for_resume(tmp_path):
+    journal = BatchJournal(str(tmp_path / "journal.jsonl"))
+    provider = MagicMock()
+    provider.create_batch = AsyncMock(return_value=MagicMock(id='b1'))
+    provider.poll_batch = AsyncMock(side_effect=PollAbandoned("down"))
+
+    summary = await run_batches(provider, [make_request('0')], str(tmp_path), journal=journal)
+    assert [f['error_type'] for f in summary['failures']] == ['poll_abandoned']
+    assert not is_retryable(summary['failures'][0])
+    state = journal.load()['b1']
+    assert not state['finished'] and state['fetched'] == set()
+
+@pytest.mark.asyncio
+async def test_run_batches_resume_fetches_only_missing(tmp_path):
+    journal = BatchJournal(str(tmp_path / "journal.jsonl"))
+    journal.record_submitted('b1', ['0', '1'])
+    journal.record_result('b1', {'custom_id': '0', 'status': 'succeeded'})
+
+    provider = MagicMock()
+    provider.create_batch = AsyncMock(return_value=MagicMock(id='b2'))
+    provider.retrieve_batch = AsyncMock(return_value=MagicMock(id='b1', processing_status='in_progress'))
+    provider.poll_batch = AsyncMock(side_effect=lambda batch_id: MagicMock(id=batch_id))
+    provider.iter_batch_results = MagicMock(side_effect=lambda batch_id: results_iter(
+        {'status': 'succeeded', 'custom_id': '0', 'content': 'old'},
+        {'status': 'succeeded', 'custom_id': '1', 'content': 'new'},
+    ) if batch_id == 'b1' else results_iter({'status': 'succeeded', 'custom_id': '2', 'content': 'fresh'}))
+
+    requests = [make_request('0'), make_request('1'), make_request('2')]
+    summary = await run_batches(provider, requests, str(tmp_path), journal=journal, resume=True)
+
+    provider.create_batch.assert_called_once_with(requests=[requests[2]])
+    assert summary['succeeded'] == 2
+    assert not (tmp_path / "succeeded" / "0.txt").exists()
+    state = journal.load()
+    assert state['b1']['finished'] and state['b2']['finished']
+    assert state['b1']['fetched'] == {'0', '1'}
+
+@pytest.mark.asyncio
+async def test_run_batches_fails_only_missing_results_when_stream_breaks(tmp_path):
+    async def broken_stream(batch_id):
+        yield {'status': 'succeeded', 'custom_id': '0', 'content': 'ok'}
+        raise ConnectionError("stream reset")
+
+    provider = MagicMock()
+    provider.create_batch = AsyncMock(return_value=MagicMock(id='b1'))
+    provider.poll_batch = AsyncMock(side_effect=lambda batch_id: MagicMock(id=batch_id))
+    provider.iter_batch_results = MagicMock(side_effect=broken_stream)
+
+    summary = await run_batches(provider, [make_request('0'), make_request('1')], str(tmp_path))
+    assert summary['succeeded'] == 1
+    assert [(f['custom_id'], f['error_type']) for f in summary['failures']] == [('1', 'results_incomplete')]
+    assert (tmp_path / "succeeded" / "0.txt").exists()
@@ -0,0 +1,23 @@
+import pytest
+from benchmarks.run_benchmarks import create_parser, run
+from src import config
+
+@pytest.mark.asyncio
+async def test_benchmarks_smoke(monkeypatch):
+    # run() points the SDK at the mock server and speeds up polling; restore both afterwards.
+    monkeypatch.setenv('ANTHROPIC_API_KEY', 'test_api_key')
+    monkeypatch.setenv('ANTHROPIC_BASE_URL', '')
+    monkeypatch.setattr(config, 'POLL_INITIAL_DELAY', config.POLL_INITIAL_DELAY)
+    monkeypatch.setattr(config, 'POLL_MIN_DELAY', config.POLL_MIN_DELAY)
+    args = create_parser().parse_args([
+        '--tasks', '50', '--requests', '20', '--batch-size', '10',
+        '--processing-delay', '0.05', '--failure-rate', '0.2', '--payload-size', '64',
+        '--poll-initial-delay', '0.01',
+    ])
+    report = await run(args)
+
+    names = [entry['name'] for entry in report['benchmarks']]
+    assert 'batch_polling' in names and 'pipeline_update' in names
+    streaming = next(entry for entry in report['benchmarks'] if entry['name'] == 'result_streaming')
+    assert streaming['succeeded'] + streaming['failed'] == 20
+    assert report['server']['create'] == 4
@@ -0,0 +1,60 @@
+import os
+import time
+from src.cache import ResponseCache, request_key
+
+def make_request(custom_id, content):
+    return {"custom_id": custom_id, "params": {"model": "m", "messages": [{"role": "user", "content": content}]}}
+
+def test_request_key_ignores_key_order():
+    assert request_key({"a": 1, "b": 2}) == request_key({"b": 2, "a": 1})
+    assert request_key({"a": 1}) != request_key({"a": 2})
+    assert request_key({"a": 1, "max_tokens": 1024}) == request_key({"a": 1, "max_tokens": 4096})
+
+def test_partition_hits_and_misses(tmp_path):
+    cache = ResponseCache(cache_dir=str(tmp_path))
+    cached = make_request("1", "cached")
+    cache.put(request_key(cached["params"]), "cached response")
+
+    hits, misses, keys = cache.partition([cached, make_request("2", "new")])
+    assert hits == [{'status': 'succeeded', 'custom_id': '1', 'content': 'cached response'}]
+    assert [r["custom_id"] for r in misses] == ["2"]
+    assert list(keys) == ["2"]
+    assert (cache.hits, cache.misses) == (1, 1)
+
+def test_partition_refresh_skips_hits(tmp_path):
+    cache = ResponseCache(cache_dir=str(tmp_path))
+    request = make_request("1", "cached")
+    cache.put(request_key(request["params"]), "cached response")
+
+    hits, misses, _ = cache.partition([request], refresh=True)
+    assert hits == []
+    assert misses == [request]
+
+def test_put_keeps_usage_and_skips_truncated_responses(tmp_path):
+    cache = ResponseCache(cache_dir=str(tmp_path))
+    complete, truncated = make_request("1", "complete"), make_request("2", "truncated")
+    cache.put(request_key(complete["params"]), "done", {"output_tokens": 300}, "end_turn")
+    cache.put(request_key(truncated["params"]), "cut", {"output_tokens": 3000}, "max_tokens")
+
+    hits, misses, _ = cache.partition([complete, truncated])
+    assert hits == [{'status': 'succeeded', 'custom_id': '1', 'content': 'done',
+                     'usage': {'output_tokens': 300}, 'stop_reason': 'end_turn'}]
+    assert misses == [truncated]
+
+def test_get_expired_entry(tmp_path):
+    cache = ResponseCache(cache_dir=str(tmp_path), max_age=60)
+    cache.put("key", "content")
+    old = time.time() - 120
+    os.utime(tmp_path / "key.json", (old, old))
+    assert cache.get("key") is None
+
+def test_evict_by_age_and_size(tmp_path):
+    cache = ResponseCache(cache_dir=str(tmp_path), max_bytes=50, max_age=60)
+    now = time.time()
+    for key in ["expired", "oldest", "newest"]:
+        cache.put(key, "x" * 20)
+    os.utime(tmp_path / "expired.json", (now - 120, now - 120))
+    os.utime(tmp_path / "oldest.json", (now - 30, now - 30))
+
+    assert cache.evict() == 2
+    assert sorted(os.listdir(tmp_path)) == ["newest.json"]
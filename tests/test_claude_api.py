@@ -1,34 +1,68 @@
 import pytest
 from unittest.mock import patch, MagicMock, AsyncMock
-from src.claude_api import get_anthropic_client, poll_batch_completion, process_batch_results
-from anthropic import AsyncAnthropic
+from anthropic import RateLimitError
+from src import config
+from src.claude_api import get_llm_provider
+from src.llm_providers import AnthropicDirectProvider, AnthropicProvider
+
+@pytest.fixture
+def provider(mock_anthropic_client, monkeypatch):
+    monkeypatch.setattr(config, 'POLL_INITIAL_DELAY', 0.01)
+    monkeypatch.setattr(config, 'POLL_MIN_DELAY', 0.01)
+    with patch.dict('os.environ', {'ANTHROPIC_API_KEY': 'test_api_key'}):
+        provider = AnthropicProvider()
+    provider.client = mock_anthropic_client
+    return provider
 
 @patch.dict('os.environ', {'ANTHROPIC_API_KEY': 'test_api_key', 'SSL_CERT_FILE': '/etc/ssl/certs/ca-certificates.crt'})
-def test_get_anthropic_client():
-    client = get_anthropic_client()
-    assert isinstance(client, AsyncAnthropic)
+def test_get_llm_provider():
+    provider = get_llm_provider()
+    assert isinstance(provider, AnthropicProvider)
 
 @patch('os.environ.get', return_value=None)
-def test_get_anthropic_client_no_key(mock_env_get):
+def test_get_llm_provider_no_key(mock_env_get):
     with pytest.raises(ValueError):
-        get_anthropic_client()
+        get_llm_provider()
 
 @pytest.mark.asyncio
-async def test_poll_batch_completion(mock_anthropic_client):
+async def test_poll_batch(provider, mock_anthropic_client):
     mock_anthropic_client.messages.batches.retrieve.side_effect = [
-        MagicMock(processing_status='processing'),
-        MagicMock(processing_status='ended')
+        MagicMock(id='batch_123', processing_status='in_progress'),
+        MagicMock(id='batch_123', processing_status='ended')
     ]
 
-    with patch('asyncio.sleep', new_callable=AsyncMock):
-        result = await poll_batch_completion(mock_anthropic_client, 'batch_123')
-        assert result.processing_status == 'ended'
-        assert mock_anthropic_client.messages.batches.retrieve.call_count == 2
+    result = await provider.poll_batch('batch_123')
+    assert result.processing_status == 'ended'
+    assert mock_anthropic_client.messages.batches.retrieve.call_count == 2
 
 @pytest.mark.asyncio
-async def test_process_batch_results(mock_anthropic_client):
-    results = await process_batch_results(mock_anthropic_client, 'batch_123')
+async def test_process_batch_results(provider):
+    results = await provider.process_batch_results('batch_123')
     assert len(results['succeeded']) == 1
     assert results['succeeded'][0]['content'] == 'Success'
     assert len(results['failed']) == 1
-    assert results['failed'][0]['error'] == 'Failure'
\ No newline at end of file
+    assert results['failed'][0]['error'] == 'Failure'
+
+
+@pytest.mark.asyncio
+async def test_direct_provider_retries_throttled_requests(monkeypatch):
+    monkeypatch.setattr(config, 'DIRECT_RETRY_INITIAL_DELAY', 0)
+    with patch.dict('os.environ', {'ANTHROPIC_API_KEY': 'test_api_key'}):
+        provider = get_llm_provider(mode='direct')
+    assert isinstance(provider, AnthropicDirectProvider)
+
+    throttled = RateLimitError.__new__(RateLimitError)
+    throttled.status_code = 429
+    throttled.response = MagicMock(headers={'retry-after': '0'})
+    response = MagicMock(headers={})
+    response.parse.return_value = MagicMock(content=[MagicMock(text='Success')], usage=MagicMock())
+    provider.client = MagicMock()
+    provider.client.messages.with_raw_response.create = AsyncMock(side_effect=[throttled, response])
+
+    batch = await provider.create_batch([{'custom_id': 'task_1', 'params': {'model': 'm', 'messages': []}}])
+    completed = await provider.poll_batch(batch.id)
+    results = await provider.process_batch_results(completed.id)
+
+    assert completed.processing_status == 'ended'
+    assert results['succeeded'][0]['content'] == 'Success'
+    assert provider.client.messages.with_raw_response.create.call_count == 2
@@ -1,50 +1,339 @@
+import asyncio
 import pytest
 from unittest.mock import patch, MagicMock, AsyncMock
 import argparse
+from src.batching import run_batches
 from src.commands.plan import plan_command
 from src.commands.execute import execute_command
 from src.commands.update import update_command
+from src.journal import BatchJournal
+from src.mock_provider import MockProvider
+from src.planning import task_id
+from src.prompt_store import PromptStore
+from src.result_store import ResultStore
 
 @patch('src.commands.plan.read_file', return_value='### 📋 Remaining Tasks\n- task 1')
 @patch('src.commands.plan.write_file')
-def test_plan_command(mock_write_file, mock_read_file):
-    args = argparse.Namespace(planning_file='plan.md', output_file=None)
+def test_plan_command(mock_write_file, mock_read_file, tmp_path):
+    args = argparse.Namespace(planning_file='plan.md', output_file=None, prompt_store=str(tmp_path / 'prompts.jsonl'))
     plan_command(args)
     mock_read_file.assert_called_once_with('plan.md')
     mock_write_file.assert_called_once()
+    assert '`prompts.jsonl`' in mock_write_file.call_args[0][1]
+
+@patch('src.commands.plan.write_file')
+def test_plan_command_is_incremental(mock_write_file, tmp_path):
+    tasks = '### 📋 Remaining Tasks\n- task 1\n- task 2'
+    store = PromptStore(str(tmp_path / 'prompts.jsonl'))
+    args = argparse.Namespace(planning_file='plan.md', output_file=None, prompt_store=store.path)
+    with patch('src.commands.plan.read_file', return_value=tasks):
+        plan_command(args)
+    assert [p["custom_id"] for p in store.iter_prompts()] == [task_id("task 1"), task_id("task 2")]
+
+    store.set_status([task_id("task 1")], "done")
+    with patch('src.commands.plan.read_file', return_value=tasks + '\n- task 3'):
+        plan_command(args)
+    store = PromptStore(store.path)
+    assert [store.get(task_id(t))["status"] for t in ("task 1", "task 2", "task 3")] == ["done", "pending", "pending"]
+
+@patch('src.commands.plan.write_file')
+def test_plan_command_packs_context(mock_write_file, tmp_path):
+    (tmp_path / 'logger.py').write_text('def setup_logger():\n    pass\n')
+    store = PromptStore(str(tmp_path / 'prompts.jsonl'))
+    args = argparse.Namespace(planning_file='plan.md', output_file=None, prompt_store=store.path,
+                              project_dir=str(tmp_path), context_budget=100)
+    with patch('src.commands.plan.read_file', return_value='### 📋 Remaining Tasks\n- Improve the logger setup'):
+        plan_command(args)
+    assert store.get(task_id('Improve the logger setup'))['context'].startswith('# logger.py\n')
+    assert store.get(task_id('Improve the logger setup'))['context_budget'] == 100
+
+@patch('src.commands.plan.write_file')
+def test_plan_command_records_dependencies(mock_write_file, tmp_path):
+    store = PromptStore(str(tmp_path / 'prompts.jsonl'))
+    args = argparse.Namespace(planning_file='plan.md', output_file=None, prompt_store=store.path)
+    tasks = '### 📋 Remaining Tasks\n- Create module X [id: x]\n- Test module X [after: x]'
+    with patch('src.commands.plan.read_file', return_value=tasks):
+        plan_command(args)
+    assert store.get(task_id('Test module X'))['depends_on'] == [task_id('Create module X')]
+
+    mock_write_file.reset_mock()
+    with patch('src.commands.plan.read_file', return_value='### 📋 Remaining Tasks\n- A [id: a] [after: b]\n- B [id: b] [after: a]'):
+        plan_command(args)
+    mock_write_file.assert_not_called()
 
 @pytest.mark.asyncio
-@patch('src.commands.execute.get_anthropic_client')
-@patch('src.commands.execute.read_file', return_value='## Generated Prompts\n\n```json\n[{"custom_id": "1", "content": "test content"}]\n```')
-@patch('src.commands.execute.poll_batch_completion', new_callable=AsyncMock)
-@patch('src.commands.execute.process_batch_results', new_callable=AsyncMock)
-@patch('src.commands.execute.write_batch_results')
-async def test_execute_command(mock_write_results, mock_process, mock_poll, mock_read_file, mock_get_client):
-    mock_client = MagicMock()
-    mock_client.messages.batches.create = AsyncMock(return_value=MagicMock(id='batch_123'))
-    mock_get_client.return_value = mock_client
-
-    mock_poll.return_value = MagicMock(id='batch_123')
-    mock_process.return_value = {'succeeded': [], 'failed': []}
-
-    args = argparse.Namespace(planning_file='plan.md', output_dir='results')
+@patch('src.commands.execute.get_llm_provider')
+async def test_execute_command_resume_marks_previously_fetched_results_done(mock_get_provider, tmp_path):
+    store = PromptStore(str(tmp_path / 'prompts.jsonl'))
+    store.sync([{'custom_id': c, 'task': c, 'content': c, 'status': 'submitted'} for c in 'abc'])
+    results_dir = tmp_path / 'results'
+    journal = BatchJournal(str(results_dir / 'batch_journal.jsonl'))
+    journal.record_submitted('batch_1', ['a', 'b', 'c'])
+    with ResultStore(str(results_dir)) as results:
+        for custom_id in 'ab':
+            result = {'status': 'succeeded', 'custom_id': custom_id, 'content': f'# {custom_id}.py\n'}
+            results.write(result)
+            journal.record_result('batch_1', result)
+
+    provider = MagicMock()
+    provider.retrieve_batch = AsyncMock(return_value=MagicMock(id='batch_1', processing_status='ended'))
+    provider.poll_batch = AsyncMock(return_value=MagicMock(id='batch_1'))
+
+    async def results(batch_id):
+        for custom_id in 'abc':
+            yield {'status': 'succeeded', 'custom_id': custom_id, 'content': f'# {custom_id}.py\n'}
+
+    provider.iter_batch_results = MagicMock(side_effect=results)
+    mock_get_provider.return_value = provider
+    args = argparse.Namespace(planning_file='plan.md', output_dir=str(results_dir), resume=True, no_cache=True,
+                              prompt_store=store.path, max_retries=0)
+    await execute_command(args)
+
+    provider.create_batch.assert_not_called()
+    store = PromptStore(store.path)
+    assert {c: store.get(c)['status'] for c in 'abc'} == {'a': 'done', 'b': 'done', 'c': 'done'}
+
+@pytest.mark.asyncio
+@patch('src.commands.execute.get_llm_provider')
+async def test_execute_command_resume_reattaches_journaled_batches_once(mock_get_provider, tmp_path):
+    store = PromptStore(str(tmp_path / 'prompts.jsonl'))
+    store.sync([
+        {'custom_id': 'a', 'task': 'a', 'content': 'a'},
+        {'custom_id': 'b', 'task': 'b', 'content': 'b', 'depends_on': ['a']},
+        {'custom_id': 'c', 'task': 'c', 'content': 'c'},
+        {'custom_id': 'd', 'task': 'd', 'content': 'd', 'depends_on': ['c']},
+        {'custom_id': 'x', 'task': 'x', 'content': 'x', 'status': 'submitted'},
+    ])
+    results_dir = tmp_path / 'results'
+    BatchJournal(str(results_dir / 'batch_journal.jsonl')).record_submitted('journaled', ['x'])
+    provider = MockProvider()
+    provider.batches['journaled'] = asyncio.ensure_future(provider._run([{'custom_id': 'x', 'params': {}}]))
+    mock_get_provider.return_value = provider
+    args = argparse.Namespace(planning_file='plan.md', output_dir=str(results_dir), resume=True, no_cache=True,
+                              prompt_store=store.path, project_dir=str(tmp_path / 'project'), max_retries=0)
+    await execute_command(args)
+
+    index_lines = (results_dir / 'results.idx').read_text().splitlines()
+    assert sum(line.startswith('["x"') for line in index_lines) == 1
+    assert PromptStore(store.path).counts() == {'pending': 0, 'submitted': 0, 'done': 5}
+
+@pytest.mark.asyncio
+async def test_execute_command_runs_dependents_after_applying_prerequisites(tmp_path):
+    store = PromptStore(str(tmp_path / 'prompts.jsonl'))
+    store.sync([
+        {'custom_id': 'base', 'task': 'base', 'content': 'base'},
+        {'custom_id': 'child', 'task': 'child', 'content': 'child', 'depends_on': ['base']},
+    ])
+    project_dir = tmp_path / 'project'
+    args = argparse.Namespace(planning_file=str(tmp_path / 'plan.md'), output_dir=str(tmp_path / 'results'),
+                              provider='mock', no_cache=True, prompt_store=store.path, project_dir=str(project_dir))
+    submitted = []
+
+    async def recording_run_batches(provider, requests, output, **kwargs):
+        # The prerequisite's result is on disk before its dependent is submitted.
+        submitted.append(([r['custom_id'] for r in requests], (project_dir / 'results' / 'base.py').exists()))
+        return await run_batches(provider, requests, output, **kwargs)
+
+    with patch('src.commands.execute.run_batches', side_effect=recording_run_batches):
+        await execute_command(args)
+
+    assert submitted == [(['base'], False), (['child'], True)]
+    assert PromptStore(store.path).counts()['done'] == 2
+
+@pytest.mark.asyncio
+@patch('src.commands.execute.get_llm_provider')
+@patch('src.commands.execute.read_file', return_value='## Generated Prompts\n\n```json\n[{"custom_id": "1", "content": "test content"}, {"custom_id": "2", "content": "old", "status": "done"}]\n```')
+async def test_execute_command(mock_read_file, mock_get_provider, tmp_path):
+    mock_provider = MagicMock()
+    mock_provider.create_batch = AsyncMock(return_value=MagicMock(id='batch_123'))
+    mock_provider.poll_batch = AsyncMock(return_value=MagicMock(id='batch_123'))
+
+    async def results(batch_id):
+        yield {'status': 'succeeded', 'custom_id': '1', 'content': 'print("hello")'}
+
+    mock_provider.iter_batch_results = MagicMock(side_effect=results)
+    mock_get_provider.return_value = mock_provider
+
+    store_path = str(tmp_path / 'prompts.jsonl')
+    args = argparse.Namespace(planning_file='plan.md', output_dir=str(tmp_path), batch_size=None, max_in_flight=None,
+                              resume=False, no_cache=True, prompt_store=store_path)
     await execute_command(args)
 
     mock_read_file.assert_called_once_with('plan.md')
-    mock_get_client.assert_called_once()
-    mock_client.messages.batches.create.assert_called_once()
-    mock_poll.assert_called_once()
-    mock_process.assert_called_once()
-    mock_write_results.assert_called_once()
-
-@patch('os.path.isdir', return_value=True)
-@patch('os.listdir', return_value=['result1.txt'])
-@patch('src.commands.update.read_file', return_value='# src/test.py\nprint("hello")')
-@patch('src.commands.update.write_file')
-def test_update_command(mock_write_file, mock_read_file, mock_listdir, mock_isdir):
-    args = argparse.Namespace(project_dir='.', results_dir='results')
+    mock_get_provider.assert_called_once()
+    assert [r['custom_id'] for r in mock_provider.create_batch.call_args.kwargs['requests']] == ['1']
+    mock_provider.poll_batch.assert_called_once_with('batch_123')
+    mock_provider.iter_batch_results.assert_called_once_with('batch_123')
+    assert ResultStore(str(tmp_path)).get('1')['content'] == 'print("hello")'
+    assert PromptStore(store_path).counts() == {'pending': 0, 'submitted': 0, 'done': 2}
+
+@pytest.mark.asyncio
+@patch('src.commands.execute.run_batches', new_callable=AsyncMock)
+@patch('src.commands.execute.get_llm_provider')
+@patch('src.commands.execute.read_file', return_value='## Generated Prompts\n\n```json\n[{"custom_id": "1", "content": "test content"}]\n```')
+async def test_execute_command_auto_mode_picks_direct(mock_read_file, mock_get_provider, mock_run_batches, tmp_path):
+    mock_run_batches.return_value = {'succeeded': 0, 'failed': 0, 'failures': [], 'usage': {'input_tokens': 0, 'output_tokens': 0}}
+    args = argparse.Namespace(planning_file='plan.md', output_dir=str(tmp_path), mode='auto', no_cache=True,
+                              prompt_store=str(tmp_path / 'prompts.jsonl'))
+    await execute_command(args)
+
+    mock_get_provider.assert_called_once_with('anthropic', mode='direct')
+    assert mock_run_batches.call_args.kwargs['journal'] is None
+
+@pytest.mark.asyncio
+async def test_execute_command_routes_across_providers_offline(tmp_path):
+    store = PromptStore(str(tmp_path / 'prompts.jsonl'))
+    store.sync([{'custom_id': str(i), 'task': f'task {i}', 'content': f'task {i}'} for i in range(4)])
+    args = argparse.Namespace(planning_file=str(tmp_path / 'plan.md'), output_dir=str(tmp_path / 'results'),
+                              provider='mock,mock:other-model', no_cache=True, prompt_store=store.path)
+    await execute_command(args)
+
+    assert len(list(ResultStore(str(tmp_path / 'results')).iter_results('succeeded'))) == 4
+    assert not (tmp_path / 'results' / 'batch_journal.jsonl').exists()
+    assert PromptStore(store.path).counts()['done'] == 4
+
+@pytest.mark.asyncio
+async def test_execute_command_enforces_budget(tmp_path):
+    store = PromptStore(str(tmp_path / 'prompts.jsonl'))
+    store.sync([{'custom_id': str(i), 'task': f'task {i}', 'content': f'task {i}'} for i in range(3)])
+    with ResultStore(str(tmp_path / 'results')) as results:
+        for i in range(3):
+            results.write({'status': 'succeeded', 'custom_id': str(i), 'content': 'x',
+                           'usage': {'input_tokens': 10, 'output_tokens': 400}, 'stop_reason': 'max_tokens'})
+    store.set_status(['0', '1', '2'], 'pending')
+    args = argparse.Namespace(planning_file=str(tmp_path / 'plan.md'), output_dir=str(tmp_path / 'results'),
+                              provider='mock', no_cache=True, prompt_store=store.path, max_run_tokens=2000)
+    submitted = []
+
+    async def recording_run_batches(provider, requests, output, **kwargs):
+        submitted.extend(requests)
+        return await run_batches(provider, requests, output, **kwargs)
+
+    with patch('src.commands.execute.run_batches', side_effect=recording_run_batches):
+        await execute_command(args)
+        assert submitted == []
+
+        args.over_budget = 'split'
+        await execute_command(args)
+
+    # Each prompt is estimated at 800 output tokens (doubled after truncation), so two fit.
+    assert [r['custom_id'] for r in submitted] == ['0', '1']
+    assert {r['params']['max_tokens'] for r in submitted} == {1024}
+    assert PromptStore(store.path).counts() == {'pending': 1, 'submitted': 0, 'done': 2}
+
+def test_update_command(tmp_path):
+    succeeded_dir = tmp_path / "results" / "succeeded"
+    succeeded_dir.mkdir(parents=True)
+    (succeeded_dir / "result1.txt").write_text('# src/test.py\nprint("hello")')
+    project_dir = tmp_path / "project"
+
+    args = argparse.Namespace(project_dir=str(project_dir), results_dir=str(tmp_path / "results"))
     update_command(args)
-    mock_isdir.assert_called_with('results/succeeded')
-    mock_listdir.assert_called_with('results/succeeded')
-    mock_read_file.assert_called_with('results/succeeded/result1.txt')
-    mock_write_file.assert_called_with('./src/test.py', 'print("hello")')
\ No newline at end of file
+    assert (project_dir / "src" / "test.py").read_text() == 'print("hello")'
+
+def test_update_command_applies_diffs(tmp_path):
+    succeeded_dir = tmp_path / "results" / "succeeded"
+    succeeded_dir.mkdir(parents=True)
+    (succeeded_dir / "result1.txt").write_text(
+        "```diff\n--- a/src/a.py\n+++ b/src/a.py\n@@ -1,2 +1,2 @@\n keep\n-old\n+new\n```\n"
+        "# src/b.py\n```python\nB = 1\n```\n"
+    )
+    project_dir = tmp_path / "project"
+    (project_dir / "src").mkdir(parents=True)
+    (project_dir / "src" / "a.py").write_text("keep\nold\n")
+
+    update_command(argparse.Namespace(project_dir=str(project_dir), results_dir=str(tmp_path / "results")))
+    assert (project_dir / "src" / "a.py").read_text() == "keep\nnew\n"
+    assert (project_dir / "src" / "b.py").read_text() == "B = 1\n"
+
+def test_update_command_from_result_store(tmp_path):
+    results_dir = tmp_path / "results"
+    with ResultStore(str(results_dir)) as store:
+        store.write({'status': 'succeeded', 'custom_id': 'a', 'content': '# src/a.py\nprint("a")'})
+        store.write({'status': 'failed', 'custom_id': 'b', 'error': 'boom'})
+    project_dir = tmp_path / "project"
+
+    update_command(argparse.Namespace(project_dir=str(project_dir), results_dir=str(results_dir)))
+    assert (project_dir / "src" / "a.py").read_text() == 'print("a")'
+
+    update_command(argparse.Namespace(project_dir=str(project_dir), results_dir=str(results_dir),
+                                      export_dir=str(tmp_path / "exported")))
+    assert (tmp_path / "exported" / "succeeded" / "a.txt").exists()
+
+@pytest.mark.asyncio
+async def test_execute_command_counts_cache_hits_once_per_wave(tmp_path, monkeypatch, caplog):
+    from src import config
+    from src.metrics import metrics
+    monkeypatch.setattr(config, 'CACHE_DIR', str(tmp_path / 'cache'))
+    store = PromptStore(str(tmp_path / 'prompts.jsonl'))
+    store.sync([
+        {'custom_id': 'base', 'task': 'base', 'content': 'base'},
+        {'custom_id': 'child', 'task': 'child', 'content': 'child', 'depends_on': ['base']},
+    ])
+    args = argparse.Namespace(planning_file=str(tmp_path / 'plan.md'), output_dir=str(tmp_path / 'results'),
+                              provider='mock', prompt_store=store.path)
+    await execute_command(args)
+    store.set_status(['base', 'child'], 'pending')
+
+    metrics.reset()
+    with caplog.at_level('INFO'):
+        await execute_command(args)
+
+    lookups = {c['labels']['result']: c['value'] for c in metrics.snapshot()['counters']['cache_lookups_total']}
+    assert lookups == {'hit': 2, 'miss': 0}
+    assert '2 succeeded, 0 failed' in caplog.text
+
+@pytest.mark.asyncio
+@patch('src.commands.execute.get_llm_provider')
+async def test_execute_command_resume_holds_back_abandoned_batches(mock_get_provider, tmp_path):
+    from src.poller import PollAbandoned
+    store = PromptStore(str(tmp_path / 'prompts.jsonl'))
+    store.sync([
+        {'custom_id': 'x', 'task': 'x', 'content': 'x', 'status': 'submitted'},
+        {'custom_id': 'y', 'task': 'y', 'content': 'y', 'depends_on': ['x']},
+        {'custom_id': 'z', 'task': 'z', 'content': 'z'},
+    ])
+    results_dir = tmp_path / 'results'
+    journal = BatchJournal(str(results_dir / 'batch_journal.jsonl'))
+    journal.record_submitted('journaled', ['x'])
+    provider = MockProvider()
+    retrieve_batch, poll_batch = provider.retrieve_batch, provider.poll_batch
+
+    async def retrieve(batch_id):
+        if batch_id == 'journaled':
+            return MagicMock(id=batch_id, processing_status='in_progress')
+        return await retrieve_batch(batch_id)
+
+    async def lose_journaled(batch_id):
+        if batch_id == 'journaled':
+            raise PollAbandoned("down")
+        return await poll_batch(batch_id)
+
+    provider.retrieve_batch, provider.poll_batch = retrieve, lose_journaled
+    provider.create_batch = AsyncMock(side_effect=provider.create_batch)
+    mock_get_provider.return_value = provider
+    args = argparse.Namespace(planning_file='plan.md', output_dir=str(results_dir), resume=True, no_cache=True,
+                              prompt_store=store.path, max_retries=0)
+    await execute_command(args)
+
+    assert [[r['custom_id'] for r in call.kwargs['requests']] for call in provider.create_batch.call_args_list] == [['z']]
+    store = PromptStore(store.path)
+    assert {c: store.get(c).get('status', 'pending') for c in 'xyz'} == {'x': 'pending', 'y': 'pending', 'z': 'done'}
+    assert not journal.load()['journaled']['finished']
+
+@pytest.mark.asyncio
+async def test_execute_command_repacks_dependents_with_the_plan_budget(tmp_path):
+    project_dir = tmp_path / 'project'
+    project_dir.mkdir()
+    store = PromptStore(str(tmp_path / 'prompts.jsonl'))
+    store.sync([
+        {'custom_id': 'base', 'task': 'base', 'content': 'base', 'context': 'x', 'context_budget': 100},
+        {'custom_id': 'child', 'task': 'child', 'content': 'child', 'depends_on': ['base'], 'context': 'x',
+         'context_budget': 100},
+    ])
+    args = argparse.Namespace(planning_file=str(tmp_path / 'plan.md'), output_dir=str(tmp_path / 'results'),
+                              provider='mock', no_cache=True, prompt_store=store.path, project_dir=str(project_dir))
+    with patch('src.commands.execute.ContextIndex') as context_index:
+        context_index.return_value.pack.return_value = ''
+        await execute_command(args)
+    context_index.return_value.pack.assert_called_once_with('child', 100)
@@ -0,0 +1,46 @@
+import os
+from src.context import ContextIndex, estimate_tokens, summarize, terms
+
+def make_project(tmp_path):
+    (tmp_path / "src").mkdir()
+    (tmp_path / "src" / "rate_limit.py").write_text('"""Rate limiting helpers."""\n\ndef retry_delay(headers):\n    pass\n' + '# padding\n' * 50)
+    (tmp_path / "src" / "planning.py").write_text('def parse_tasks(content):\n    pass\n')
+    (tmp_path / "node_modules").mkdir()
+    (tmp_path / "node_modules" / "rate.py").write_text('x = 1\n')
+    return tmp_path
+
+def test_terms_and_summaries():
+    assert terms("parseTasks from rate_limit.py") == {"parse", "tasks", "rate", "limit"}
+    assert summarize("a.py", '"""Docs here."""\nclass A:\n    pass\ndef f():\n    pass\n') == "Docs here.; class A, def f"
+    assert summarize("a.md", "\n\n# Title\nbody") == "# Title"
+    assert summarize("a.py", "def broken(:\n") == "def broken(:"
+    assert estimate_tokens("x" * 9) == 3
+
+def test_refresh_is_incremental(tmp_path):
+    project = make_project(tmp_path)
+    index = ContextIndex(str(project))
+    assert index.refresh() == 2
+    assert sorted(index.files) == ["src/planning.py", "src/rate_limit.py"]
+    assert os.path.exists(index.index_path)
+
+    assert ContextIndex(str(project)).refresh() == 0
+
+    (project / "src" / "planning.py").write_text('def parse_tasks(content):\n    return []\n')
+    (project / "src" / "rate_limit.py").unlink()
+    index = ContextIndex(str(project))
+    assert index.refresh() == 1
+    assert sorted(index.files) == ["src/planning.py"]
+
+def test_pack_picks_relevant_files_within_budget(tmp_path):
+    project = make_project(tmp_path)
+    index = ContextIndex(str(project))
+    index.refresh()
+
+    assert index.rank("Improve the rate limit retry delay")[0][1] == "src/rate_limit.py"
+    context = index.pack("Improve the rate limit retry delay", budget=1000)
+    assert context.startswith("# src/rate_limit.py\n")
+    assert "planning" not in context
+
+    summary_only = index.pack("Improve the rate limit retry delay", budget=20)
+    assert summary_only == "# src/rate_limit.py (summary)\nRate limiting helpers.; def retry_delay"
+    assert index.pack("Unrelated widget", budget=1000) == ""
@@ -0,0 +1,50 @@
+from src import config
+from src.estimator import (
+    UsageHistory, adaptive_max_tokens, estimate_requests, fit_budget, request_input_tokens, token_prices, total
+)
+from src.result_store import ResultStore
+
+def succeeded(custom_id, output_tokens, stop_reason='end_turn'):
+    return {'status': 'succeeded', 'custom_id': custom_id, 'usage': {'output_tokens': output_tokens}, 'stop_reason': stop_reason}
+
+def test_request_input_tokens():
+    params = {
+        'system': [{'type': 'text', 'text': 'x' * 40}, {'type': 'text', 'text': 'y' * 8}],
+        'messages': [{'role': 'user', 'content': 'z' * 4}],
+    }
+    assert request_input_tokens(params) == 10 + 2 + 1
+    assert request_input_tokens({'system': 'abcd', 'messages': []}) == 1
+
+def test_usage_history_predictions(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, 'ESTIMATE_MIN_SAMPLES', 2)
+    with ResultStore(str(tmp_path)) as store:
+        store.write({**succeeded('short', 100), 'content': 'x'})
+        store.write({**succeeded('cut', 900, 'max_tokens'), 'content': 'x'})
+        store.write({'status': 'failed', 'custom_id': 'failed', 'error': 'boom'})
+    history = UsageHistory.from_results(str(tmp_path))
+    assert history.predict('short') == (100, True)
+    assert history.predict('cut') == (1800, True)
+    assert history.predict('new') == (900, True)
+    assert UsageHistory().predict('new') == (config.MAX_TOKENS, False)
+
+def test_adaptive_max_tokens():
+    assert adaptive_max_tokens(100, True) == config.ESTIMATE_MIN_TOKENS
+    assert adaptive_max_tokens(2000, True) == 2500
+    assert adaptive_max_tokens(10 ** 6, True) == config.MAX_OUTPUT_TOKENS
+    assert adaptive_max_tokens(100, False) == config.MAX_TOKENS
+
+def test_estimates_and_budget():
+    requests = [{'custom_id': c, 'params': {'system': 'x' * 400, 'messages': []}} for c in ('a', 'b', 'c')]
+    history = UsageHistory([succeeded('a', 100), succeeded('b', 100), succeeded('c', 100)])
+    estimates = estimate_requests(requests, history, token_prices(['anthropic'], 'batch'))
+    assert estimates['a']['input_tokens'] == 100 and estimates['a']['output_tokens'] == 100
+    assert round(estimates['a']['cost'], 6) == round((100 * 15 + 100 * 75) * 0.5 / 1_000_000, 6)
+    assert total(estimates)['output_tokens'] == 300
+
+    # b depends on c; once c does not fit, b is deferred with it.
+    prompts = [{'custom_id': 'a'}, {'custom_id': 'c'}, {'custom_id': 'b', 'depends_on': ['c']}]
+    selected, deferred = fit_budget(prompts, estimates, max_tokens=300)
+    assert [p['custom_id'] for p in selected] == ['a']
+    assert [p['custom_id'] for p in deferred] == ['c', 'b']
+    assert [p['custom_id'] for p in fit_budget(prompts, estimates, max_tokens=600)[0]] == ['a', 'c', 'b']
+    assert fit_budget(prompts, estimates, max_cost=0.0)[0] == []
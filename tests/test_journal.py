@@ -0,0 +1,25 @@
+from src.journal import BatchJournal
+
+def test_journal_replays_state(tmp_path):
+    journal = BatchJournal(str(tmp_path / "journal.jsonl"))
+    journal.reset()
+    journal.record_submitted('b1', ['a', 'b'])
+    journal.record_result('b1', {'custom_id': 'a', 'status': 'succeeded'})
+    journal.record_submitted('b2', ['c'])
+    journal.record_finished('b2')
+
+    state = journal.load()
+    assert state['b1'] == {'custom_ids': ['a', 'b'], 'fetched': {'a'}, 'succeeded': {'a'}, 'finished': False}
+    assert state['b2']['finished'] is True
+    assert journal.succeeded() == {'a'}
+
+def test_journal_ignores_truncated_line(tmp_path):
+    path = tmp_path / "journal.jsonl"
+    journal = BatchJournal(str(path))
+    journal.record_submitted('b1', ['a'])
+    with open(path, 'a') as f:
+        f.write('{"event": "res')
+    assert journal.load()['b1']['fetched'] == set()
+
+def test_journal_missing_file(tmp_path):
+    assert BatchJournal(str(tmp_path / "missing.jsonl")).load() == {}
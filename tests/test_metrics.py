@@ -0,0 +1,35 @@
+import json
+import pytest
+from src.metrics import Metrics
+
+def test_counters_and_observations():
+    metrics = Metrics()
+    metrics.incr('tokens_total', 10, type='input')
+    metrics.incr('tokens_total', 5, type='input')
+    metrics.observe('batch_polls', 3)
+    metrics.observe('batch_polls', 1)
+    with pytest.raises(ValueError):
+        with metrics.timer('stage_seconds', stage='plan.parse'):
+            raise ValueError()
+
+    snapshot = metrics.snapshot()
+    assert snapshot['counters']['tokens_total'] == [{'labels': {'type': 'input'}, 'value': 15}]
+    assert snapshot['observations']['batch_polls'] == [{'labels': {}, 'count': 2, 'sum': 4, 'max': 3}]
+    assert snapshot['observations']['stage_seconds'][0]['count'] == 1
+
+def test_write_json_and_prometheus(tmp_path):
+    metrics = Metrics()
+    metrics.incr('bytes_written_total', 42, stage='results')
+    metrics.observe('batch_latency_seconds', 1.5, phase='queue')
+
+    metrics.write(str(tmp_path / 'metrics.json'))
+    assert json.loads((tmp_path / 'metrics.json').read_text())['counters']['bytes_written_total'][0]['value'] == 42
+
+    metrics.write(str(tmp_path / 'metrics.prom'))
+    assert (tmp_path / 'metrics.prom').read_text().splitlines() == [
+        '# TYPE bytes_written_total counter',
+        'bytes_written_total{stage="results"} 42',
+        '# TYPE batch_latency_seconds summary',
+        'batch_latency_seconds_count{phase="queue"} 1',
+        'batch_latency_seconds_sum{phase="queue"} 1.5',
+    ]
@@ -3,6 +3,12 @@ from src.planning import (
     parse_tasks_from_planning_md,
     update_planning_md_with_prompts,
     parse_prompts_from_planning_md,
+    task_id,
+    merge_prompts,
+    PlanningIndex,
+    DependencyError,
+    resolve_dependencies,
+    task_waves,
 )
 
 def test_parse_tasks_from_planning_md():
@@ -30,3 +36,82 @@ def test_parse_prompts_from_planning_md():
 ```'''
     prompts = parse_prompts_from_planning_md(content)
     assert prompts == [{"id": 1}]
+
+
+def test_task_id_is_stable():
+    assert task_id("Task 1") == task_id("Task 1")
+    assert task_id("Task 1") != task_id("Task 2")
+
+def test_merge_prompts_marks_only_changes_pending():
+    existing = [
+        {"custom_id": "a", "content": "same", "status": "done"},
+        {"custom_id": "b", "content": "old", "status": "done"},
+        {"custom_id": "gone", "content": "x", "status": "done"},
+    ]
+    prompts = [
+        {"custom_id": "a", "content": "same"},
+        {"custom_id": "b", "content": "new"},
+        {"custom_id": "c", "content": "added"},
+    ]
+    merged, pending = merge_prompts(existing, prompts)
+    assert [p["status"] for p in merged] == ["done", "pending", "pending"]
+    assert pending == 2
+
+def test_planning_index_single_pass():
+    content = """# Plan
+
+### 📋 Remaining Tasks
+
+- Task 1
+- [x] Done task
+* **Feature** - Task 2
+
+## Generated Prompts
+
+```json
+[{"custom_id": "a"}]
+```"""
+    index = PlanningIndex(content)
+    assert index.tasks() == ["Task 1", "Task 2"]
+    assert [line for _, _, line in index.headings] == ["# Plan", "### 📋 Remaining Tasks", "## Generated Prompts"]
+    assert index.prompts() == [{"custom_id": "a"}]
+    assert content[index.prompts_json[0]:index.prompts_json[1]] == '[{"custom_id": "a"}]'
+
+def test_planning_index_replace_prompts_updates_offsets():
+    index = PlanningIndex("### 📋 Remaining Tasks\n- Task 1\n\n## Generated Prompts\n\n```json\n[]\n```\ntrailing")
+    new_content = index.replace_prompts([{"custom_id": "b"}])
+    fresh = PlanningIndex(new_content)
+    assert "trailing" not in new_content
+    assert (index.headings, index.task_items, index.prompts_json) == (fresh.headings, fresh.task_items, fresh.prompts_json)
+    assert index.prompts() == fresh.prompts() == [{"custom_id": "b"}]
+
+
+def test_task_dependency_annotations():
+    content = """### 📋 Remaining Tasks
+
+- Create module X [id: module-x]
+- Write tests for module X [after: module-x]
+- Document it [after: module-x, Write tests for module X, missing]
+"""
+    specs = PlanningIndex(content).task_specs()
+    assert [spec['task'] for spec in specs] == ['Create module X', 'Write tests for module X', 'Document it']
+    assert specs[0]['name'] == 'module-x'
+    assert resolve_dependencies(specs) == [
+        [],
+        [task_id('Create module X')],
+        [task_id('Create module X'), task_id('Write tests for module X')],
+    ]
+
+
+def test_task_waves():
+    prompts = [
+        {'custom_id': 'a'},
+        {'custom_id': 'b', 'depends_on': ['a']},
+        {'custom_id': 'c', 'depends_on': ['a', 'b']},
+        {'custom_id': 'd', 'depends_on': ['done-elsewhere']},
+    ]
+    waves = task_waves(prompts)
+    assert [[p['custom_id'] for p in wave] for wave in waves] == [['a', 'd'], ['b'], ['c']]
+    assert len(task_waves(prompts[1:], done={'a'})) == 2
+    with pytest.raises(DependencyError):
+        task_waves([{'custom_id': 'a', 'depends_on': ['b']}, {'custom_id': 'b', 'depends_on': ['a']}])
@@ -0,0 +1,72 @@
+import pytest
+from unittest.mock import MagicMock, AsyncMock
+from src import config
+from src.poller import BatchPoller, PollAbandoned
+
+@pytest.fixture(autouse=True)
+def fast_polling(monkeypatch):
+    monkeypatch.setattr(config, 'POLL_INITIAL_DELAY', 0.01)
+    monkeypatch.setattr(config, 'POLL_MIN_DELAY', 0.01)
+    monkeypatch.setattr(config, 'POLL_MAX_DELAY', 0.05)
+    monkeypatch.setattr(config, 'POLL_MAX_RETRIES', 2)
+
+def batch(batch_id, status, processing=0, succeeded=0):
+    return MagicMock(
+        id=batch_id,
+        processing_status=status,
+        request_counts=MagicMock(processing=processing, succeeded=succeeded, errored=0, canceled=0, expired=0),
+    )
+
+@pytest.mark.asyncio
+async def test_poller_retries_transient_errors():
+    retrieve = AsyncMock(side_effect=[RuntimeError("503"), batch('b1', 'ended')])
+    poller = BatchPoller(retrieve)
+    result = await poller.wait('b1')
+    assert result.processing_status == 'ended'
+    assert retrieve.call_count == 2
+
+@pytest.mark.asyncio
+async def test_poller_gives_up_after_max_retries():
+    retrieve = AsyncMock(side_effect=RuntimeError("down"))
+    poller = BatchPoller(retrieve)
+    with pytest.raises(PollAbandoned):
+        await poller.wait('b1')
+    assert retrieve.call_count == config.POLL_MAX_RETRIES + 1
+
+@pytest.mark.asyncio
+async def test_poller_gives_up_at_once_on_permanent_errors():
+    retrieve = AsyncMock(side_effect=RuntimeError("Error code: 404 - batch not found"))
+    with pytest.raises(PollAbandoned):
+        await BatchPoller(retrieve).wait('b1')
+    assert retrieve.call_count == 1
+
+@pytest.mark.asyncio
+async def test_poller_tracks_many_batches_and_notifies():
+    statuses = {
+        'b1': [batch('b1', 'in_progress', processing=2), batch('b1', 'in_progress', 1, 1), batch('b1', 'ended', 0, 2)],
+        'b2': [batch('b2', 'ended')],
+    }
+    retrieve = AsyncMock(side_effect=lambda batch_id: statuses[batch_id].pop(0))
+    completed = []
+    poller = BatchPoller(retrieve, on_complete=lambda batch_id, result: completed.append(batch_id))
+
+    poller.track('b1')
+    poller.track('b2')
+    finished = [batch_id async for batch_id, _ in poller.as_completed()]
+
+    assert finished == ['b2', 'b1']
+    assert completed == ['b2', 'b1']
+    assert retrieve.call_count == 4
+
+@pytest.mark.asyncio
+async def test_poller_failed_batch_resolves_none():
+    poller = BatchPoller(AsyncMock(return_value=batch('b1', 'failed')))
+    assert await poller.wait('b1') is None
+
+@pytest.mark.asyncio
+async def test_poller_records_polls_per_batch():
+    from src.metrics import metrics
+    metrics.reset()
+    retrieve = AsyncMock(side_effect=[batch('b1', 'in_progress', processing=1), batch('b1', 'ended')])
+    await BatchPoller(retrieve).wait('b1')
+    assert metrics.snapshot()['observations']['batch_polls'] == [{'labels': {}, 'count': 1, 'sum': 2, 'max': 2}]
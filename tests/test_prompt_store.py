@@ -0,0 +1,49 @@
+import os
+from src.prompt_store import PromptStore
+
+def make_prompt(custom_id, content="c", status="pending"):
+    return {"custom_id": custom_id, "content": content, "status": status}
+
+def test_sync_appends_only_changes(tmp_path):
+    store = PromptStore(str(tmp_path / "prompts.jsonl"))
+    assert store.sync([make_prompt("a"), make_prompt("b")]) == 2
+    assert store.sync([make_prompt("a"), make_prompt("b")]) == 0
+    assert store.sync([make_prompt("a", "changed"), make_prompt("c")]) == 3
+
+    assert store.get("a")["content"] == "changed"
+    assert store.get("b") is None
+    assert [p["custom_id"] for p in store.iter_prompts()] == ["a", "c"]
+
+def test_status_updates_and_filtering(tmp_path):
+    store = PromptStore(str(tmp_path / "prompts.jsonl"))
+    store.sync([make_prompt("a"), make_prompt("b"), make_prompt("c")])
+    size = os.path.getsize(store.path)
+    store.set_status(["a"], "submitted")
+    store.set_status(["b"], "done")
+
+    assert os.path.getsize(store.path) > size
+    assert [p["custom_id"] for p in store.iter_prompts(status="pending")] == ["c"]
+    assert store.counts() == {"pending": 1, "submitted": 1, "done": 1}
+
+def test_index_is_reloaded_and_rebuilt(tmp_path):
+    path = str(tmp_path / "prompts.jsonl")
+    PromptStore(path).sync([make_prompt("a"), make_prompt("b")])
+    assert PromptStore(path).get("b") == make_prompt("b")
+
+    os.remove(path + ".idx")
+    assert PromptStore(path).get("b") == make_prompt("b")
+
+    with open(path, "a") as f:
+        f.write('{"custom_id": "b", "content": "external", "status": "done"}\n')
+    assert PromptStore(path).get("b")["content"] == "external"
+
+def test_compact(tmp_path):
+    store = PromptStore(str(tmp_path / "prompts.jsonl"))
+    store.sync([make_prompt("a")])
+    for status in ("submitted", "done", "pending"):
+        store.set_status(["a"], status)
+    store.compact()
+
+    with open(store.path) as f:
+        assert len(f.readlines()) == 1
+    assert PromptStore(store.path).get("a") == make_prompt("a")
@@ -0,0 +1,30 @@
+import time
+import pytest
+from unittest.mock import patch, AsyncMock
+from src.rate_limit import RateLimiter, retry_delay
+
+def test_retry_delay_prefers_retry_after():
+    assert retry_delay({'retry-after': '7'}, 0) == 7.0
+
+def test_retry_delay_backs_off_without_header():
+    assert retry_delay({}, 3) > retry_delay({}, 0) / 2
+
+@pytest.mark.asyncio
+async def test_rate_limiter_spends_remaining_requests():
+    limiter = RateLimiter()
+    limiter.update({'anthropic-ratelimit-requests-remaining': '2'})
+    with patch('asyncio.sleep', new_callable=AsyncMock) as mock_sleep:
+        await limiter.acquire()
+        await limiter.acquire()
+    assert limiter.remaining['requests'] == 0
+    mock_sleep.assert_not_called()
+
+@pytest.mark.asyncio
+async def test_rate_limiter_waits_for_reset_when_exhausted():
+    limiter = RateLimiter()
+    reset = time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(time.time() + 30))
+    limiter.update({'anthropic-ratelimit-tokens-remaining': '0', 'anthropic-ratelimit-tokens-reset': reset})
+    with patch('asyncio.sleep', new_callable=AsyncMock) as mock_sleep:
+        await limiter.acquire()
+    assert 0 < mock_sleep.call_args[0][0] <= 30
+    assert 'tokens' not in limiter.remaining
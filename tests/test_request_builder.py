@@ -0,0 +1,49 @@
+from src.request_builder import RequestBuilder, SYSTEM_PROMPT, prompt_content
+
+def test_prompt_content_is_self_contained():
+    content = prompt_content("Add logging")
+    assert content.startswith("CONTEXT:")
+    assert "TASK: Add logging" in content
+
+def test_build_with_prompt_caching():
+    digest = "src/main.py: entry point\n" * 200
+    builder = RequestBuilder(prompt_caching=True, repo_digest=digest, model="m", max_tokens=10)
+    request = builder.build({"custom_id": "a", "task": "Add logging", "content": prompt_content("Add logging")})
+
+    params = request["params"]
+    assert request["custom_id"] == "a"
+    assert params["messages"] == [{"role": "user", "content": "TASK: Add logging"}]
+    assert [block.get("cache_control") for block in params["system"]] == [None, None, {"type": "ephemeral"}]
+    assert "src/main.py: entry point" in params["system"][-1]["text"]
+
+def test_short_prefix_gets_no_cache_breakpoint(caplog):
+    with caplog.at_level('INFO'):
+        builder = RequestBuilder(prompt_caching=True)
+    request = builder.build({"custom_id": "a", "task": "Add logging", "content": "x"})
+    assert all("cache_control" not in block for block in request["params"]["system"])
+    assert "Prompt caching is inactive" in caplog.text
+
+def test_shared_prefix_is_identical_across_requests():
+    builder = RequestBuilder(prompt_caching=True)
+    first = builder.build({"custom_id": "a", "task": "one", "content": "x"})
+    second = builder.build({"custom_id": "b", "task": "two", "content": "y"})
+    assert first["params"]["system"] == second["params"]["system"]
+
+def test_build_without_prompt_caching():
+    request = RequestBuilder(prompt_caching=False).build({"custom_id": "a", "task": "t", "content": "full prompt"})
+    assert request["params"]["system"] == SYSTEM_PROMPT
+    assert request["params"]["messages"][0]["content"] == "full prompt"
+
+def test_build_with_per_request_max_tokens():
+    builder = RequestBuilder(max_tokens=4096)
+    assert builder.build({"custom_id": "a", "content": "x"}, max_tokens=1500)["params"]["max_tokens"] == 1500
+    assert builder.build({"custom_id": "a", "content": "x"})["params"]["max_tokens"] == 4096
+
+def test_build_legacy_prompt_without_task():
+    request = RequestBuilder(prompt_caching=True).build({"custom_id": "a", "content": "full prompt"})
+    assert request["params"]["system"] == SYSTEM_PROMPT
+    assert request["params"]["messages"][0]["content"] == "full prompt"
+
+def test_build_places_packed_context_before_task():
+    request = RequestBuilder(prompt_caching=True).build({"custom_id": "a", "task": "t", "content": "x", "context": "# src/a.py\npass"})
+    assert request["params"]["messages"][0]["content"] == "RELEVANT FILES:\n# src/a.py\npass\n\nTASK: t"
@@ -0,0 +1,73 @@
+import io
+from src.response_parser import ResponseParser, parse_response, safe_target
+
+def parse(text):
+    return list(parse_response('r.txt', io.StringIO(text)))
+
+def test_single_file_format():
+    assert parse('# src/a.py\nline 1\nline 2\n') == [{'source': 'r.txt', 'target': 'src/a.py', 'content': 'line 1\nline 2\n'}]
+
+def test_fenced_file_blocks():
+    text = (
+        "Here are the changes.\n\n"
+        "# src/a.py\n```python\nA = 1\n```\n\n"
+        "File: src/b.py\n```\nB = 2\n```\n"
+        "```python path=src/c.py\nC = 3\n```\n"
+        "```\nunlabelled example\n```\n"
+    )
+    assert [(c['target'], c['content']) for c in parse(text)] == [
+        ('src/a.py', 'A = 1\n'),
+        ('src/b.py', 'B = 2\n'),
+        ('src/c.py', 'C = 3\n'),
+    ]
+
+def test_markdown_heading_opener_is_not_a_path():
+    text = "# Changes\n\nHere are the updates.\n\n# src/a.py\n```python\nA = 1\n```\n"
+    assert parse(text) == [{'source': 'r.txt', 'target': 'src/a.py', 'content': 'A = 1\n'}]
+
+def test_prose_between_path_and_code_block():
+    text = '# src/a.py\nThis file does X.\n```python\nprint(1)\n```\n'
+    assert parse(text) == [{'source': 'r.txt', 'target': 'src/a.py', 'content': 'print(1)\n'}]
+
+def test_path_comment_inside_code_block():
+    text = 'Update:\n```python\n# src/a.py\nprint(1)\n```\n```\nno path\n```\n'
+    assert parse(text) == [{'source': 'r.txt', 'target': 'src/a.py', 'content': 'print(1)\n'}]
+
+def test_unified_diffs():
+    text = (
+        "```diff\n"
+        "--- a/src/a.py\n+++ b/src/a.py\n"
+        "@@ -1,2 +1,2 @@\n x = 1\n-y = 2\n+y = 3\n"
+        "@@ -10 +10,2 @@\n z\n+w\n"
+        "--- /dev/null\n+++ b/src/new.py\n@@ -0,0 +1 @@\n+created\n\\ No newline at end of file\n"
+        "--- a/src/gone.py\n+++ /dev/null\n@@ -1 +0,0 @@\n-gone\n"
+        "```\n"
+    )
+    changes = parse(text)
+    assert [c['target'] for c in changes] == ['src/a.py', 'src/new.py']
+    assert changes[0]['hunks'] == (
+        (1, ('x = 1\n', 'y = 2\n'), ('x = 1\n', 'y = 3\n')),
+        (10, ('z\n',), ('z\n', 'w\n')),
+    )
+    assert changes[0]['new_file'] is False
+    assert changes[1]['hunks'] == ((0, (), ('created',)),)
+    assert changes[1]['new_file'] is True
+
+def test_rejects_unsafe_paths():
+    assert parse('# /etc/passwd\nx') == []
+    assert parse('# ../outside.py\nx') == []
+    assert parse('--- a/../x.py\n+++ b/../x.py\n@@ -1 +1 @@\n-a\n+b\n') == []
+    assert safe_target('r.txt', 'src/../a.py') == 'src/../a.py'
+
+def test_incomplete_responses():
+    assert parse('') == []
+    assert parse('no header') == []
+    assert parse('# src/a.py\n```python\ntruncated\n') == [{'source': 'r.txt', 'target': 'src/a.py', 'content': 'truncated\n'}]
+
+def test_feed_yields_changes_as_they_complete():
+    parser = ResponseParser('r.txt')
+    assert parser.feed('# a.py\n') == []
+    assert parser.feed('```\n') == []
+    assert parser.feed('A\n') == []
+    assert parser.feed('```\n') == [{'source': 'r.txt', 'target': 'a.py', 'content': 'A\n'}]
+    assert parser.close() == []
@@ -0,0 +1,98 @@
+import json
+import os
+from types import SimpleNamespace
+import pytest
+from src.result_store import ResultDirectory, ResultStore, result_sink
+
+def succeeded(custom_id, content="x"):
+    usage = SimpleNamespace(input_tokens=3, output_tokens=5, cache_creation_input_tokens=0, cache_read_input_tokens=0)
+    return {'status': 'succeeded', 'custom_id': custom_id, 'content': content, 'usage': usage, 'stop_reason': 'end_turn'}
+
+def failed(custom_id):
+    return {'status': 'failed', 'custom_id': custom_id, 'error': {'type': 'overloaded_error'}, 'error_type': 'overloaded'}
+
+def test_store_keeps_structured_records(tmp_path):
+    with ResultStore(str(tmp_path)) as store:
+        store.write(succeeded('a', '# a.py\nprint(1)'))
+        store.write(failed('b'))
+
+    store = ResultStore(str(tmp_path))
+    assert store.get('a') == {
+        'custom_id': 'a', 'status': 'succeeded', 'content': '# a.py\nprint(1)', 'stop_reason': 'end_turn',
+        'usage': {'input_tokens': 3, 'output_tokens': 5, 'cache_creation_input_tokens': 0, 'cache_read_input_tokens': 0},
+    }
+    assert store.get('b')['error'] == {'type': 'overloaded_error'}
+    assert sorted(os.listdir(tmp_path)) == ['results-00000.jsonl', 'results.idx']
+
+def test_later_records_supersede_earlier_ones(tmp_path):
+    with ResultStore(str(tmp_path)) as store:
+        store.write(failed('a'))
+        store.write(succeeded('b'))
+    with ResultStore(str(tmp_path)) as store:
+        store.write(succeeded('a', 'retried'))
+
+    store = ResultStore(str(tmp_path))
+    assert len(store) == 2
+    assert [r['custom_id'] for r in store.iter_results('succeeded')] == ['b', 'a']
+    assert list(store.iter_results('failed')) == []
+    assert store.get('a')['content'] == 'retried'
+
+def test_torn_index_line_is_skipped(tmp_path):
+    with ResultStore(str(tmp_path)) as store:
+        store.write(succeeded('a'))
+    with open(tmp_path / "results.idx", 'a', encoding='utf-8') as f:
+        f.write('["b", "succ')
+
+    with ResultStore(str(tmp_path)) as store:
+        assert list(store.index) == ['a']
+        store.write(succeeded('c'))
+    assert sorted(ResultStore(str(tmp_path)).index) == ['a', 'c']
+
+def test_output_usage_is_read_from_the_index(tmp_path, monkeypatch):
+    with ResultStore(str(tmp_path)) as store:
+        store.write(succeeded('a'))
+        store.write(failed('b'))
+        store.write(succeeded('c'))
+    # An entry indexed by an older version, without output usage.
+    lines = (tmp_path / "results.idx").read_text().splitlines()
+    lines[-1] = json.dumps(json.loads(lines[-1])[:5])
+    (tmp_path / "results.idx").write_text('\n'.join(lines) + '\n')
+
+    store = ResultStore(str(tmp_path))
+    decode = store._decode
+    decoded = []
+    monkeypatch.setattr(store, '_decode', lambda *a: decoded.append(a) or decode(*a))
+    assert store.output_usage() == {'a': (5, 'end_turn'), 'c': (5, 'end_turn')}
+    assert len(decoded) == 1
+
+@pytest.mark.parametrize('compression', [None, 'gzip'])
+def test_segments_rotate_and_compress(tmp_path, compression):
+    with ResultStore(str(tmp_path), compression=compression, segment_max_bytes=64) as store:
+        for i in range(5):
+            store.write(succeeded(str(i), 'y' * 50))
+
+    segments = sorted(name for name in os.listdir(tmp_path) if name.startswith('results-'))
+    assert len(segments) == 5
+    store = ResultStore(str(tmp_path))
+    assert [r['content'] for r in store.iter_results()] == ['y' * 50] * 5
+
+def test_unknown_compression_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        ResultStore(str(tmp_path), compression='lz4')
+
+def test_export_writes_one_file_per_item(tmp_path):
+    with ResultStore(str(tmp_path / 'store')) as store:
+        store.write(succeeded('a', '# a.py\n'))
+        store.write(failed('b'))
+
+    assert ResultStore(str(tmp_path / 'store')).export(str(tmp_path / 'files')) == 2
+    assert (tmp_path / 'files' / 'succeeded' / 'a.txt').read_text() == '# a.py\n'
+    assert json.loads((tmp_path / 'files' / 'failed' / 'b.json').read_text()) == {'type': 'overloaded_error'}
+
+def test_result_directory_replaces_stale_failure(tmp_path):
+    sink = result_sink(str(tmp_path))
+    assert isinstance(sink, ResultDirectory)
+    sink.write(failed('a'))
+    sink.write(succeeded('a'))
+    assert (tmp_path / 'succeeded' / 'a.txt').exists()
+    assert not (tmp_path / 'failed' / 'a.json').exists()
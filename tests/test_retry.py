@@ -0,0 +1,86 @@
+import pytest
+from unittest.mock import MagicMock, AsyncMock, patch
+from src import config
+from src.llm_providers import AnthropicProvider
+from src.mock_provider import MockProvider
+from src.retry import classify_error, is_retryable, retry_failures
+
+def make_request(custom_id):
+    return {'custom_id': custom_id, 'params': {'model': 'm', 'max_tokens': 10, 'messages': []}}
+
+@pytest.mark.parametrize('error, result_type, expected', [
+    ({'type': 'error', 'error': {'type': 'overloaded_error', 'message': 'busy'}}, 'errored', 'overloaded'),
+    ({'type': 'error', 'error': {'type': 'invalid_request_error', 'message': 'bad'}}, 'errored', 'invalid_request'),
+    ("Error code: 429 - {'type': 'error'}", None, 'rate_limit'),
+    ("Error code: 400 - prompt is too long", None, 'invalid_request'),
+    ("Connection error.", None, 'api_error'),
+    (None, 'expired', 'expired'),
+    (None, 'canceled', 'canceled'),
+    ("boom", None, 'unknown'),
+])
+def test_classify_error(error, result_type, expected):
+    assert classify_error(error, result_type) == expected
+
+def test_is_retryable_prefers_recorded_error_type():
+    assert is_retryable({'custom_id': 'a', 'error': 'boom', 'error_type': 'rate_limit'})
+    assert not is_retryable({'custom_id': 'a', 'error': 'Error code: 400 - bad'})
+
+@pytest.mark.asyncio
+async def test_retry_failures_resubmits_only_retryable_items(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, 'RETRY_INITIAL_DELAY', 0)
+    (tmp_path / 'failed').mkdir()
+    (tmp_path / 'failed' / 'a.json').write_text('overloaded')
+    summary = {
+        'succeeded': 1,
+        'failed': 2,
+        'failures': [
+            {'custom_id': 'a', 'error': 'overloaded', 'error_type': 'overloaded'},
+            {'custom_id': 'b', 'error': 'Error code: 400 - bad'},
+        ],
+        'usage': {'input_tokens': 0, 'output_tokens': 0},
+    }
+    provider = MockProvider()
+    completed = []
+    requests = [make_request('a'), make_request('b'), make_request('c')]
+    summary = await retry_failures(provider, requests, summary, str(tmp_path),
+                                   on_result=lambda result: completed.append(result['custom_id']))
+
+    assert provider.requests_seen == 1
+    assert completed == ['a']
+    assert (summary['succeeded'], summary['failed']) == (2, 1)
+    assert [f['custom_id'] for f in summary['failures']] == ['b']
+    assert (tmp_path / 'succeeded' / 'a.txt').exists()
+    assert not (tmp_path / 'failed' / 'a.json').exists()
+
+@pytest.mark.asyncio
+async def test_retry_failures_stops_after_max_attempts(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, 'RETRY_INITIAL_DELAY', 0)
+    provider = MockProvider(fail_ids={'a'})
+    summary = {'succeeded': 0, 'failed': 1, 'failures': [{'custom_id': 'a', 'error': 'x', 'error_type': 'overloaded'}],
+               'usage': {'input_tokens': 0, 'output_tokens': 0}}
+    summary = await retry_failures(provider, [make_request('a')], summary, str(tmp_path), max_attempts=2)
+    assert provider.requests_seen == 2
+    assert summary['failed'] == 1
+
+@pytest.mark.asyncio
+async def test_iter_batch_results_resumes_broken_stream(monkeypatch):
+    monkeypatch.setattr(config, 'DIRECT_RETRY_INITIAL_DELAY', 0)
+
+    def result(custom_id):
+        return MagicMock(custom_id=custom_id, result=MagicMock(type='succeeded', message=MagicMock(content=[MagicMock(text=custom_id)])))
+
+    async def broken(batch_id):
+        yield result('a')
+        raise ConnectionError("reset")
+
+    async def complete(batch_id):
+        yield result('a')
+        yield result('b')
+
+    with patch.dict('os.environ', {'ANTHROPIC_API_KEY': 'test_api_key'}):
+        provider = AnthropicProvider()
+    provider.client = MagicMock()
+    provider.client.messages.batches.results = AsyncMock(side_effect=[broken('b1'), complete('b1')])
+
+    ids = [r['custom_id'] async for r in provider.iter_batch_results('b1')]
+    assert ids == ['a', 'b']
@@ -0,0 +1,89 @@
+import pytest
+from src import claude_api
+from src.claude_api import build_router, get_llm_provider, load_provider_class, register_provider
+from src.mock_provider import MockProvider
+from src.router import ProviderRouter, Route
+
+def make_requests(count, max_tokens=100):
+    return [{'custom_id': f"task_{i}", 'params': {'model': 'm', 'max_tokens': max_tokens, 'messages': []}} for i in range(count)]
+
+async def run(router, requests):
+    batch = await router.create_batch(requests=requests)
+    completed = await router.poll_batch(batch.id)
+    return await router.process_batch_results(completed.id)
+
+@pytest.mark.asyncio
+async def test_mock_provider_answers_offline():
+    provider = MockProvider(fail_ids={'task_1'})
+    batch = await provider.create_batch(requests=make_requests(2))
+    results = await provider.process_batch_results((await provider.poll_batch(batch.id)).id)
+    assert results['succeeded'][0]['content'].startswith('# results/task_0.py\n')
+    assert results['succeeded'][0]['usage'].output_tokens > 0
+    assert [r['custom_id'] for r in results['failed']] == ['task_1']
+
+@pytest.mark.asyncio
+async def test_router_spreads_load_by_concurrency():
+    fast, slow = MockProvider(), MockProvider()
+    router = ProviderRouter([Route('fast', fast, concurrency=3), Route('slow', slow, concurrency=1)], cost_weight=0)
+    results = await run(router, make_requests(8))
+    assert len(results['succeeded']) == 8
+    assert (fast.requests_seen, slow.requests_seen) == (6, 2)
+
+@pytest.mark.asyncio
+async def test_router_enforces_route_concurrency():
+    provider = MockProvider(latency=0.01)
+    in_flight, peak = [0], [0]
+    run_requests = provider._run
+
+    async def tracking_run(requests):
+        in_flight[0] += len(requests)
+        peak[0] = max(peak[0], in_flight[0])
+        try:
+            return await run_requests(requests)
+        finally:
+            in_flight[0] -= len(requests)
+
+    provider._run = tracking_run
+    router = ProviderRouter([Route('only', provider, concurrency=2)])
+    batches = [await router.create_batch(requests=make_requests(5)) for _ in range(2)]
+    for batch in batches:
+        await router.poll_batch(batch.id)
+    assert provider.requests_seen == 10
+    assert peak[0] == 2
+
+@pytest.mark.asyncio
+async def test_router_prefers_cheaper_route():
+    cheap, expensive = MockProvider(), MockProvider()
+    router = ProviderRouter([Route('expensive', expensive, output_cost=75.0), Route('cheap', cheap, output_cost=1.0)],
+                            cost_weight=1000)
+    await run(router, make_requests(3, max_tokens=4096))
+    assert (cheap.requests_seen, expensive.requests_seen) == (3, 0)
+
+@pytest.mark.asyncio
+async def test_router_fails_over_failed_items():
+    flaky, backup = MockProvider(fail_ids={'task_0'}), MockProvider()
+    router = ProviderRouter([Route('flaky', flaky, concurrency=8), Route('backup', backup, output_cost=75.0)],
+                            cost_weight=1000)
+    results = await run(router, make_requests(2))
+    assert [r['custom_id'] for r in results['succeeded']] == ['task_0', 'task_1']
+    assert backup.requests_seen == 1
+
+@pytest.mark.asyncio
+async def test_router_gives_up_when_every_route_failed():
+    router = ProviderRouter([Route('a', MockProvider(failure_rate=1.0)), Route('b', MockProvider(failure_rate=1.0))])
+    results = await run(router, make_requests(1))
+    assert [r['custom_id'] for r in results['failed']] == ['task_0']
+
+def test_registry_resolves_lazy_references(monkeypatch):
+    monkeypatch.setattr(claude_api, 'PROVIDERS', dict(claude_api.PROVIDERS))
+    register_provider('offline', 'src.mock_provider:MockProvider')
+    assert load_provider_class('offline') is MockProvider
+    assert isinstance(get_llm_provider('mock', mode='direct'), MockProvider)
+    with pytest.raises(ValueError):
+        get_llm_provider('unknown')
+
+def test_build_router_applies_models_and_settings():
+    router = build_router(['mock', 'mock:small-model'])
+    assert [(route.name, route.model, route.concurrency) for route in router.routes] == [
+        ('mock', None, 8), ('mock:small-model', 'small-model', 8)
+    ]
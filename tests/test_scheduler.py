@@ -0,0 +1,62 @@
+import asyncio
+import pytest
+from src.batching import new_summary
+from src.scheduler import branches, prerequisites, run_dependency_waves
+
+def summary_for(prompts, failed=()):
+    summary = new_summary()
+    for prompt in prompts:
+        if prompt['custom_id'] in failed:
+            summary['failed'] += 1
+            summary['failures'].append({'custom_id': prompt['custom_id'], 'error': 'boom'})
+        else:
+            summary['succeeded'] += 1
+    return summary
+
+def test_prerequisites_and_branches():
+    prompts = [{'custom_id': 'a'}, {'custom_id': 'b', 'depends_on': ['a']}, {'custom_id': 'x'}, {'custom_id': 'y'}]
+    assert prerequisites(prompts) == {'a'}
+    branch_of = branches(prompts)
+    assert branch_of['a'] == branch_of['b'] is not None
+    assert branch_of['x'] is branch_of['y'] is None
+
+@pytest.mark.asyncio
+async def test_run_dependency_waves_runs_branches_concurrently():
+    # a -> b, and slow -> c: b must not wait for the slow branch.
+    prompts = [
+        {'custom_id': 'a'},
+        {'custom_id': 'slow'},
+        {'custom_id': 'b', 'depends_on': ['a']},
+        {'custom_id': 'c', 'depends_on': ['slow']},
+    ]
+    events = []
+    applied = []
+
+    async def run_wave(group):
+        ids = [p['custom_id'] for p in group]
+        events.append(('start', ids))
+        await asyncio.sleep(0.05 if 'slow' in ids else 0)
+        events.append(('end', ids))
+        return summary_for(group)
+
+    summaries, blocked = await run_dependency_waves(prompts, run_wave, applied.extend)
+
+    assert events[:2] == [('start', ['a']), ('start', ['slow'])]
+    assert events.index(('start', ['b'])) < events.index(('end', ['slow']))
+    assert sorted(applied) == ['a', 'slow']
+    assert len(summaries) == 4
+    assert blocked == []
+
+@pytest.mark.asyncio
+async def test_run_dependency_waves_blocks_dependents_of_failures():
+    prompts = [{'custom_id': 'a'}, {'custom_id': 'b', 'depends_on': ['a']}, {'custom_id': 'c'}, {'custom_id': 'd'}]
+    groups = []
+
+    async def run_wave(group):
+        groups.append([p['custom_id'] for p in group])
+        return summary_for(group, failed={'a'})
+
+    summaries, blocked = await run_dependency_waves(prompts, run_wave)
+    assert sorted(groups) == [['a'], ['c', 'd']]
+    assert [p['custom_id'] for p in blocked] == ['b']
+    assert len(summaries) == 2
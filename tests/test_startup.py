@@ -0,0 +1,32 @@
+import subprocess
+import sys
+import pytest
+
+# Microseconds of imports `src.main` plus one command module may take; the
+# anthropic SDK alone costs several times this.
+STARTUP_BUDGET_US = 250_000
+HEAVY_MODULES = ('asyncio', 'anthropic', 'httpx', 'pydantic')
+
+def import_time(command):
+    """Returns the cumulative top-level import time (us) and the heavy modules loaded."""
+    code = (
+        "import importlib, sys\n"
+        "from src.main import COMMANDS\n"
+        f"importlib.import_module(COMMANDS[{command!r}][0])\n"
+        f"print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))\n"
+    )
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], capture_output=True, text=True, check=True)
+    total = 0
+    for line in proc.stderr.splitlines():
+        parts = line.split('|')
+        # Top-level imports have a single space before the module name.
+        if line.startswith('import time:') and len(parts) == 3 and parts[2].startswith(' ') and not parts[2].startswith('  '):
+            if parts[1].strip().isdigit():
+                total += int(parts[1])
+    return total, [m for m in proc.stdout.strip().split(',') if m]
+
+@pytest.mark.parametrize('command', ['plan', 'update'])
+def test_offline_commands_start_fast(command):
+    total, heavy = import_time(command)
+    assert heavy == []
+    assert total < STARTUP_BUDGET_US